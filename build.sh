@@ -4,13 +4,17 @@ set -e
 # Default format
 FORMAT="cards"
 INCLUDE_KEYS=0
+JOBS=$(nproc 2>/dev/null || echo 1)
+# Selection and scaling options passed on to mapper.cli
+SELECTION=()
+BATCH_FLAG=""
 
 # Parse arguments
 while [[ $# -gt 0 ]]; do
     case "$1" in
         -h|--help)
             echo "typst-recipe-cards:"
-            echo "Usage: $0 [-f cards|a5] [-k|--include-keys] <input_path>"
+            echo "Usage: $0 [-f cards|a5|cards,a5] [-k|--include-keys] [-j|--jobs N] [--experimental-batch] [--category C] [--grouping G] [--tag T] [--key K] [--changed-since YYYY-MM-DD] [--servings N] <input_path>"
             exit 1
             ;;
         -f|--format)
@@ -21,9 +25,21 @@ while [[ $# -gt 0 ]]; do
             INCLUDE_KEYS=1
             shift 1
             ;;
+        -j|--jobs)
+            JOBS="$2"
+            shift 2
+            ;;
+        --experimental-batch)
+            BATCH_FLAG="--experimental-batch"
+            shift 1
+            ;;
+        --category|--grouping|--tag|--key|--changed-since|--servings)
+            SELECTION+=("$1" "$2")
+            shift 2
+            ;;
         -*)
             echo "Unknown option: $1"
-            echo "Usage: $0 [-f cards|a5] [-k|--include-keys] <input_path>"
+            echo "Usage: $0 [-f cards|a5|cards,a5] [-k|--include-keys] [-j|--jobs N] [--experimental-batch] [--category C] [--grouping G] [--tag T] [--key K] [--changed-since YYYY-MM-DD] [--servings N] <input_path>"
             exit 1
             ;;
         *)
@@ -35,51 +51,50 @@ done
 
 # Check required input path
 if [ -z "$INPUT_PATH" ]; then
-    echo "Usage: $0 [-f cards|a5] <input_path>"
+    echo "Usage: $0 [-f cards|a5|cards,a5] <input_path>"
     exit 1
 fi
 
-# Validate format
-if [[ "$FORMAT" != "cards" && "$FORMAT" != "a5" ]]; then
-    echo "Error: format must be either 'cards' or 'a5'"
-    exit 1
-fi
+# Validate format, several are separated by commas and written to ./out/pdf/<format>
+IFS=',' read -ra FORMATS <<< "$FORMAT"
+for F in "${FORMATS[@]}"; do
+    if [[ "$F" != "cards" && "$F" != "a5" ]]; then
+        echo "Error: format must be 'cards', 'a5' or both separated by a comma"
+        exit 1
+    fi
+done
 
 INPUT_PATH=$(realpath $INPUT_PATH)
 JSON_OUTPUT="./out/json"
 PDF_OUTPUT="./out/pdf"
 
-TYPST_JSON_PATH="./data"
-
 mkdir -p "$JSON_OUTPUT"
 mkdir -p "$PDF_OUTPUT"
-mkdir -p "./typst/$TYPST_JSON_PATH"
-rm -f $JSON_OUTPUT/*.json
-rm -f $PDF_OUTPUT/*.pdf
-rm -f ./typst/$TYPST_JSON_PATH/*.json
 
 JSON_OUTPUT=$(realpath $JSON_OUTPUT)
 PDF_OUTPUT=$(realpath $PDF_OUTPUT)
+# Keys always come from the registry of the full build, so selected cards get the same keys
+KEYS_REGISTRY="$JSON_OUTPUT/.keys.json"
+# Full and selective builds share the PDF cache
+PDF_CACHE="$(realpath ./out)/.pdf-cache"
 
-cd ./scripts
-python3 -m mapper.cli -i "$INPUT_PATH" -o "$JSON_OUTPUT"
-cd ../
-
-cp $JSON_OUTPUT/*.json ./typst/$TYPST_JSON_PATH/
+# A selection or scaled build goes to its own folders and leaves the full build untouched.
+# The json folder starts empty, so only the current selection is compiled and older PDFs there are removed as stale
+if [[ ${#SELECTION[@]} -gt 0 ]]; then
+    rm -rf ./out/selection/json
+    mkdir -p ./out/selection/json ./out/selection/pdf
+    JSON_OUTPUT=$(realpath ./out/selection/json)
+    PDF_OUTPUT=$(realpath ./out/selection/pdf)
+fi
 
-cd ./typst
+KEYS_FLAG=""
+if [[ "$INCLUDE_KEYS" == "1" ]]; then
+    KEYS_FLAG="--include-keys"
+fi
 
-for json_file in "$TYPST_JSON_PATH"/*.json; do
-    filename=$(basename "$json_file" .json)    
-    pdf_file="$PDF_OUTPUT/$filename.pdf"
-    echo $json_file
-    typst compile \
-        --input=jsonPath="$json_file" \
-        --input=format="$FORMAT" \
-        --input=includeKeys="$INCLUDE_KEYS" \
-        ./main.typ "$pdf_file"
-done
-rm -r $TYPST_JSON_PATH
+cd ./scripts
+python3 -m mapper.cli -i "$INPUT_PATH" -o "$JSON_OUTPUT" -j "$JOBS" --keys "$KEYS_REGISTRY" "${SELECTION[@]}"
+python3 -m mapper.build -i "$JSON_OUTPUT" -o "$PDF_OUTPUT" -f "$FORMAT" -j "$JOBS" $KEYS_FLAG $BATCH_FLAG --pdf-cache "$PDF_CACHE"
 cd ..
 
-echo "All PDFs generated in $PDF_OUTPUT"
\ No newline at end of file
+echo "All PDFs generated in $PDF_OUTPUT"
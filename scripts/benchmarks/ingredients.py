@@ -0,0 +1,83 @@
+# Time of scaling a category and summing the ingredients of many recipes, by parsing the ingredient texts for every
+# operation and with one IngredientTable whose columns every operation passes over.
+# Run from the scripts folder: python3 -m benchmarks.ingredients [--recipes 20000] [--keys 200]
+from pathlib import Path
+from typing import Dict, List, Tuple
+import argparse
+import random
+import tempfile
+import time
+
+from mapper.ingredients import IngredientTable, parse_ingredient
+from mapper.io import scan_recipes
+from mapper.models import Recipe
+from mapper.parser import RecipeParser
+
+from .vault import VaultSpec, generate_vault
+
+
+# Both return the total scaled quantity of the category and the number of summed ingredients
+def _parse_each_time(recipes: List[Recipe], category: str, keys: List[str], servings: int) -> Tuple[float, int]:
+    scaled = 0.0
+    for r in recipes:
+        if r.category == category:
+            for t in r.ingredients:
+                i = parse_ingredient(t)
+                if i is not None:
+                    scaled += i.quantity * servings / r.servings
+    wanted = set(keys)
+    sums: Dict[Tuple[str, str], float] = {}
+    for r in recipes:
+        if r.key in wanted:
+            for t in r.ingredients:
+                i = parse_ingredient(t)
+                if i is not None:
+                    sums[(i.name, i.unit)] = sums.get((i.name, i.unit), 0.0) + i.quantity
+    return round(scaled, 3), len(sums)
+
+
+def _columns(table: IngredientTable, category: str, keys: List[str], servings: int) -> Tuple[float, int]:
+    selected = table.select(categories=[category])
+    scaled = table.totals(table.scaled(table.factors(servings, selected)), selected)
+    totals = table.totals(selected=table.select(keys=keys))
+    return round(sum(q for _, q, _ in scaled), 3), len(totals)
+
+
+def _best(func, *args, repeat=3) -> Tuple[float, Tuple[float, int]]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scaling and summing ingredients with and without the columnar table")
+    parser.add_argument("--recipes", default=20000, type=int)
+    parser.add_argument("--keys", default=200, type=int, help="Recipes whose ingredients are summed")
+    parser.add_argument("--servings", default=12, type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generate_vault(Path(tmp), VaultSpec(recipes=args.recipes, categories=8, link_density=0.0, noise_files=0))
+        recipes = [RecipeParser(lines, source=str(p)).parse() for p, lines in scan_recipes(Path(tmp))]
+    # Keys are only needed to select recipes here, so every recipe gets a distinct one
+    for i, r in enumerate(recipes):
+        r.key = f'K{i}'
+    category = recipes[0].category
+    keys = [r.key for r in random.Random(0).sample(recipes, min(args.keys, len(recipes)))]
+
+    start = time.perf_counter()
+    table = IngredientTable.from_recipes(recipes)
+    build = time.perf_counter() - start
+    print(f"{len(recipes)} recipes, {len(table)} ingredients with a quantity, table built in {build * 1000:.1f} ms")
+
+    before, expected = _best(_parse_each_time, recipes, category, keys, args.servings)
+    after, result = _best(_columns, table, category, keys, args.servings)
+    assert result == expected, (result, expected)
+    print(f"parse every time: {before * 1000:8.1f} ms")
+    print(f"columns:          {after * 1000:8.1f} ms  {before / after:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Scaling benchmark for keygen.get_unique_keys_from_set.
+# Run from the scripts folder: python3 -m benchmarks.keygen [--sizes 1000 10000 100000]
+from typing import Dict, Iterable, List
+import argparse
+import random
+import string
+import time
+
+from mapper import keygen
+
+
+# The previous implementation that scans all keys for every prefix. Kept to compare timings and output
+def legacy_get_unique_keys_from_set(items: Iterable[str]) -> Dict[str, str]:
+    key_map: Dict[str, str] = {}
+    items = list(items)
+    max_len = keygen.MAX_KEY_LENGTH
+
+    for item in items:
+        prefix_len = 1
+        while True:
+            if prefix_len > len(item) or (prefix_len > max_len and max_len > 0):
+                break
+            simple_conflict = [k for k in key_map.keys() if k.startswith(item[:prefix_len])]
+            hard_conflict = item[:prefix_len] in key_map.keys()
+            if not simple_conflict and not hard_conflict:
+                break
+            if hard_conflict:
+                old_key = item[:prefix_len]
+                prefix_len += 1
+                old_item = key_map[old_key]
+                if prefix_len > len(old_item):
+                    raise keygen.KeyGenError(f"Cannot get unique key from set. Conflict between '{old_item}' and '{item}'")
+                key_map.pop(old_key)
+                key_map[old_item[:prefix_len]] = old_item
+            else:
+                prefix_len += 1
+        if prefix_len > len(item):
+            raise keygen.KeyGenError(f"Could not choose a key for {item} that is not the whole string and does not collide with other keys. Try renaming values in your key set")
+        if (hard_conflict or simple_conflict) and (prefix_len > max_len and max_len > 0):
+            raise keygen.KeyGenError(f"Could not choose a key for {item} that is a maximum of {max_len} characters long and does not collide with other keys. Try increasing the MAX_KEY_LENGTH or renaming values in your key set")
+        key_map[item[:prefix_len]] = item
+
+    return dict((v, k) for k, v in key_map.items())
+
+
+def generate_items(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    items = set()
+    while len(items) < count:
+        items.add(''.join(rng.choices(string.ascii_letters, k=rng.randint(6, 14))))
+    return sorted(items, key=lambda _: rng.random())
+
+
+def timed(func, items):
+    start = time.perf_counter()
+    result = func(items)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark key generation")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-limit", type=int, default=5000, help="Largest size the quadratic implementation is run for")
+    args = parser.parse_args()
+
+    # Random names quickly exceed three characters of distinct prefix, so the length limit is disabled
+    keygen.MAX_KEY_LENGTH = -1
+
+    print(f"{'items':>8} {'new [s]':>10} {'legacy [s]':>11}")
+    for size in args.sizes:
+        items = generate_items(size)
+        result, seconds = timed(keygen.get_unique_keys_from_set, items)
+        legacy = '-'
+        if size <= args.legacy_limit:
+            expected, legacy_seconds = timed(legacy_get_unique_keys_from_set, items)
+            assert list(result.items()) == list(expected.items()), "output differs from the legacy implementation"
+            legacy = f'{legacy_seconds:.3f}'
+        print(f"{size:>8} {seconds:>10.3f} {legacy:>11}")
+
+if __name__ == "__main__":
+    main()
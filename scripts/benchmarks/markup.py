@@ -0,0 +1,66 @@
+# Typst compile time of one large category, with every ingredient, step and hint evaluated as markup like
+# before and with the plain text items pre-classified by the export.
+# Run from the scripts folder: python3 -m benchmarks.markup [--recipes 2000] [--format cards] [--repeat 3]
+from pathlib import Path
+from typing import List
+import argparse
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+
+from mapper.build import CompileJob, CompileOptions, typst_command
+from mapper.export import classify_markup, write_category
+from mapper.io import scan_recipes
+from mapper.models import Recipe
+from mapper.parser import RecipeParser
+
+from .vault import VaultSpec, generate_vault
+
+
+def _compile(job: CompileJob, options: CompileOptions, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(typst_command(job, options), check=True, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Typst compile time with and without pre-classified markup")
+    parser.add_argument("--recipes", default=2000, type=int, help="Recipes in the category")
+    parser.add_argument("--format", default="cards", choices=("cards", "a5"))
+    parser.add_argument("--repeat", default=3, type=int, help="The best of this many compiles is reported")
+    parser.add_argument("--typst", default="typst", help="Typst executable")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        # Without links, which would stay [[...]] markup as no keys are generated here
+        generate_vault(work / 'vault', VaultSpec(recipes=args.recipes, categories=1, link_density=0.0, noise_files=0))
+        recipes: List[Recipe] = [RecipeParser(lines, source=str(p)).parse() for p, lines in scan_recipes(work / 'vault')]
+
+        texts = [t for r in recipes for t in (*r.ingredients, *r.steps, *r.hints)]
+        start = time.perf_counter()
+        plain = sum(1 for t in texts if not isinstance(classify_markup(t), str))
+        seconds = time.perf_counter() - start
+        print(f"{len(recipes)} recipes, {plain} of {len(texts)} items are plain text ({plain / len(texts):.0%}), classified in {seconds * 1000:.1f} ms")
+
+        legacy = work / 'legacy.json'
+        legacy.write_text(json.dumps([r.to_json() for r in recipes]), encoding='utf-8')
+        classified = work / 'classified.json'
+        write_category(classified, recipes, 'json-compact')
+
+        if shutil.which(args.typst) is None:
+            print(f"{args.typst} not found, skipping the compile times")
+            return
+        options = CompileOptions(format=args.format, typst=args.typst)
+        before = _compile(CompileJob(legacy, work / 'legacy.pdf'), options, args.repeat)
+        after = _compile(CompileJob(classified, work / 'classified.pdf'), options, args.repeat)
+        print(f"eval every item: {before:.3f}s")
+        print(f"pre-classified:  {after:.3f}s  {before / after:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Per-recipe memory footprint and serialization time of models.Recipe compared to the previous plain dataclass.
+# Run from the scripts folder: python3 -m benchmarks.memory [--recipes 100000]
+from __future__ import annotations
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+
+from mapper.io import scan_recipes
+from mapper.models import Recipe
+from mapper.parser import RecipeParser
+
+from .vault import VaultSpec, generate_vault
+
+
+# The previous model without slots and interning, serialized with asdict. Kept to compare footprints
+@dataclass
+class LegacyRecipe:
+    title: str
+    tags: List[str]
+    category: str
+    grouping: str
+    prep_time: str
+    cook_time: str
+    servings: int
+    source_url: str
+    last_modified: str
+    ingredients: List[str] = field(default_factory=list)
+    steps: List[str] = field(default_factory=list)
+    hints: List[str] = field(default_factory=list)
+    key: str | None = None
+
+    def to_json(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _footprint(factory: Callable[[Dict[str, Any]], Any], documents: List[str]) -> tuple:
+    # json.loads creates fresh strings for every document, like parsing separate files does
+    gc.collect()
+    tracemalloc.start()
+    recipes = [factory(json.loads(d)) for d in documents]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return recipes, size
+
+
+def _serialize(recipes: List[Any]) -> float:
+    start = time.perf_counter()
+    for r in recipes:
+        r.to_json()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory footprint of the recipe model")
+    parser.add_argument("--recipes", default=100000, type=int)
+    parser.add_argument("--categories", default=8, type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generate_vault(Path(tmp), VaultSpec(recipes=args.recipes, categories=args.categories, noise_files=0))
+        documents = [json.dumps(RecipeParser(lines, source=str(p)).parse().to_json()) for p, lines in scan_recipes(Path(tmp))]
+
+    for name, factory in (('legacy', lambda d: LegacyRecipe(**d)), ('slotted', Recipe.from_json)):
+        recipes, size = _footprint(factory, documents)
+        seconds = _serialize(recipes)
+        print(f"{name:<8} {size / len(recipes):>8.0f} bytes/recipe {size / 2**20:>9.1f} MiB total, to_json {seconds:.3f}s")
+        del recipes
+
+if __name__ == "__main__":
+    main()
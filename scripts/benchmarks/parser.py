@@ -0,0 +1,78 @@
+# Parse throughput of RecipeParser on a synthetic vault, without any file I/O, compared with the parser of an
+# earlier commit, by default the first one of the repository. That parser is read with git show, not kept in the tree.
+# Run from the scripts folder: python3 -m benchmarks.parser [--recipes 10000] [--baseline REV]
+from pathlib import Path
+import argparse
+import subprocess
+import tempfile
+import time
+import types
+
+import mapper
+from mapper.io import scan_recipes
+from mapper.parser import RecipeParser
+
+from .vault import VaultSpec, generate_vault
+
+
+def _git(*args: str) -> str:
+    root = Path(__file__).resolve().parents[2]
+    return subprocess.run(["git", *args], cwd=root, capture_output=True, text=True, check=True).stdout
+
+
+def load_parser(rev: str):
+    # RecipeParser of mapper/parser.py at rev. It runs as a module of the current mapper package,
+    # so its relative imports use today's models
+    source = _git("show", f"{rev}:scripts/mapper/parser.py")
+    module = types.ModuleType(f"mapper.parser_{rev}")
+    module.__package__ = mapper.__name__
+    exec(compile(source, f"{rev}:scripts/mapper/parser.py", "exec"), module.__dict__)
+    return module.RecipeParser
+
+
+def _parse_all(parser_class, documents) -> float:
+    start = time.perf_counter()
+    for lines, source in documents:
+        parser_class(lines, source=source).parse()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recipe parser")
+    parser.add_argument("--recipes", default=10000, type=int)
+    parser.add_argument("--ingredients", default=8, type=int)
+    parser.add_argument("--steps", default=6, type=int)
+    parser.add_argument("--repeat", default=15, type=int, help="The best of this many runs of each parser is compared")
+    parser.add_argument("--chunk", default=250, type=int, help="Recipes timed in one go")
+    parser.add_argument("--baseline", help="Git revision of the parser to compare with, default the first commit")
+    args = parser.parse_args()
+
+    baseline = args.baseline or _git("rev-list", "--max-parents=0", "HEAD").split()[0]
+    BaselineRecipeParser = load_parser(baseline)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spec = VaultSpec(recipes=args.recipes, ingredients=args.ingredients, steps=args.steps, noise_files=0)
+        generate_vault(Path(tmp), spec)
+        documents = [(lines, str(p)) for p, lines in scan_recipes(Path(tmp))]
+
+    total_lines = sum(len(lines) for lines, _ in documents)
+    # Both have to agree before their timings mean anything
+    for lines, source in documents:
+        assert RecipeParser(lines, source=source).parse() == BaselineRecipeParser(lines, source=source).parse(), source
+
+    # The parsers take turns on short chunks, so a noisy machine slows both alike. The best run of each parser
+    # on a chunk counts, the chunks add up to the time for all recipes
+    chunks = [documents[i:i + args.chunk] for i in range(0, len(documents), args.chunk)]
+    before = [float('inf')] * len(chunks)
+    after = [float('inf')] * len(chunks)
+    for _ in range(args.repeat):
+        for i, chunk in enumerate(chunks):
+            before[i] = min(before[i], _parse_all(BaselineRecipeParser, chunk))
+            after[i] = min(after[i], _parse_all(RecipeParser, chunk))
+    before, after = sum(before), sum(after)
+    print(f"{len(documents)} recipes, {total_lines} lines")
+    print(f"{baseline[:10]}: {before:.3f}s  {len(documents) / before:>9,.0f} recipes/s  {total_lines / before:>11,.0f} lines/s")
+    print(f"{'current':<10}: {after:.3f}s  {len(documents) / after:>9,.0f} recipes/s  {total_lines / after:>11,.0f} lines/s  {before / after:.2f}x")
+
+if __name__ == "__main__":
+    main()
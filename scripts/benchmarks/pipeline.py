@@ -0,0 +1,148 @@
+# Times every stage of the mapper pipeline on synthetic vaults and writes the results as JSON.
+# Run from the scripts folder: python3 -m benchmarks.pipeline [--sizes 1000 10000 100000] [--output results.json]
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mapper.cli import export_categories
+from mapper.io import read_lines, search_recipes
+from mapper.keygen import get_unique_keys_from_set
+from mapper.linker import link_buffer
+from mapper.models import Recipe
+from mapper.parser import RecipeParser
+
+from .vault import VaultSpec, generate_vault
+
+STAGES = ('search', 'parse', 'keygen', 'link', 'export')
+
+
+def _search(ctx: Dict[str, Any]) -> None:
+    ctx['files'] = search_recipes(ctx['vault'])
+
+def _parse(ctx: Dict[str, Any]) -> None:
+    ctx['recipes'] = [(p, RecipeParser(read_lines(p), source=str(p)).parse()) for p in ctx['files']]
+
+def _keygen(ctx: Dict[str, Any]) -> None:
+    categories: Dict[str, List[Recipe]] = {}
+    for _, r in ctx['recipes']:
+        categories.setdefault(r.category, []).append(r)
+    for rs in categories.values():
+        rs.sort(key=lambda r: (r.grouping, r.title))
+    category_keys = get_unique_keys_from_set(categories.keys())
+    for rs in categories.values():
+        grouping_keys = get_unique_keys_from_set(sorted(set(r.grouping for r in rs)))
+        for r in rs:
+            r.set_key(category_keys[r.category], grouping_keys[r.grouping])
+    ctx['categories'] = categories
+
+def _link(ctx: Dict[str, Any]) -> None:
+    file_to_recipe = dict((p.with_suffix('').name, r) for p, r in ctx['recipes'])
+    link_buffer([r for _, r in ctx['recipes'] if r.has_links()], file_to_recipe)
+
+def _export(ctx: Dict[str, Any]) -> None:
+    export_categories(ctx['categories'], ctx['out'])
+
+STAGE_FUNCS: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    'search': _search, 'parse': _parse, 'keygen': _keygen, 'link': _link, 'export': _export,
+}
+
+
+def run_stages(vault: Path, out: Path, trace_memory: bool) -> Dict[str, Dict[str, float]]:
+    ctx: Dict[str, Any] = {'vault': vault, 'out': out}
+    results: Dict[str, Dict[str, float]] = {}
+    for stage in STAGES:
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        STAGE_FUNCS[stage](ctx)
+        seconds = time.perf_counter() - start
+        results[stage] = {'seconds': seconds}
+        if trace_memory:
+            results[stage]['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return results
+
+
+def _quiet(func, *args):
+    # export_categories reports every file, which would drown the benchmark output
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            return func(*args)
+        finally:
+            sys.stdout = stdout
+
+
+def benchmark(size: int, spec: VaultSpec, workdir: Path) -> Dict[str, Any]:
+    spec = VaultSpec(**{**spec.__dict__, 'recipes': size})
+    vault = workdir / f'vault-{size}'
+    generate_vault(vault, spec)
+
+    # Timings are taken without tracemalloc, which slows down allocations considerably
+    timing = _quiet(run_stages, vault, workdir / f'out-{size}-time', False)
+    memory = _quiet(run_stages, vault, workdir / f'out-{size}-memory', True)
+    return {
+        'recipes': size,
+        'spec': spec.__dict__,
+        'stages': dict((s, {'seconds': timing[s]['seconds'], 'peak_bytes': memory[s]['peak_bytes']}) for s in STAGES),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions: List[str] = []
+    base = dict((r['recipes'], r) for r in baseline)
+    for r in results:
+        old = base.get(r['recipes'])
+        if old is None:
+            continue
+        for stage, values in r['stages'].items():
+            for metric in ('seconds', 'peak_bytes'):
+                before = old['stages'].get(stage, {}).get(metric)
+                if before and values[metric] > before * (1 + tolerance):
+                    regressions.append(f"{r['recipes']} recipes, {stage}: {metric} {before:.4g} -> {values[metric]:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mapper pipeline stages")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--categories", default=8, type=int)
+    parser.add_argument("--link-density", default=0.2, type=float)
+    parser.add_argument("--noise-files", default=100, type=int)
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="Results of an earlier run to compare against")
+    parser.add_argument("--tolerance", default=0.2, type=float, help="Allowed relative slowdown before a stage counts as regression")
+    args = parser.parse_args()
+
+    spec = VaultSpec(categories=args.categories, link_density=args.link_density, noise_files=args.noise_files)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            r = benchmark(size, spec, Path(tmp))
+            results.append(r)
+            print(f"{size} recipes:")
+            for stage, values in r['stages'].items():
+                print(f"\t{stage:<8} {values['seconds']:>8.3f}s {values['peak_bytes'] / 2**20:>9.1f} MiB")
+
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding='utf-8'))['results'], args.tolerance)
+        for line in regressions:
+            print(f'Regression: {line}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Vault scan time with injected per-access latency, like on an NFS or SMB mount.
+# Run from the scripts folder: python3 -m benchmarks.scanner [--recipes 2000] [--latency-ms 2] [--jobs 1 8 32]
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+import argparse
+import functools
+import io
+import os
+import tempfile
+import time
+
+from mapper import io as mapper_io
+from mapper.io import ScannedRecipe, scan_recipes
+
+from .vault import VaultSpec, generate_vault
+
+
+# The previous scanner: rglob, then stat, marker check and read of one file after the other.
+# Kept to compare timings and output
+def legacy_scan_recipes(parent: Path) -> List[ScannedRecipe]:
+    found: List[ScannedRecipe] = []
+    for p in parent.rglob('*.md'):
+        stat = p.stat()
+        data = mapper_io.read_if_recipe(p, stat.st_size)
+        if data is not None:
+            found.append(ScannedRecipe(p, data.decode('utf-8').splitlines()))
+    return found
+
+
+@contextmanager
+def injected_latency(seconds: float) -> Iterator[None]:
+    # Delays every directory listing, stat and open. time.sleep releases the GIL like a blocking network call
+    def slow(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            time.sleep(seconds)
+            return func(*args, **kwargs)
+        return wrapper
+
+    originals = (os.scandir, os.stat, io.open)
+    os.scandir, os.stat, io.open = (slow(f) for f in originals)
+    try:
+        yield
+    finally:
+        os.scandir, os.stat, io.open = originals
+
+
+def _add_ignored_folders(vault: Path, files: int) -> None:
+    # Obsidian settings and deleted notes, which the new scanner skips without listing them
+    for folder in ('.obsidian/plugins', '.trash'):
+        (vault / folder).mkdir(parents=True, exist_ok=True)
+        for i in range(files):
+            (vault / folder / f'note-{i}.md').write_text('# Note\n', encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vault scanner with injected I/O latency")
+    parser.add_argument("--recipes", default=2000, type=int)
+    parser.add_argument("--noise-files", default=500, type=int)
+    parser.add_argument("--ignored-files", default=200, type=int, help="Notes in .obsidian and .trash")
+    parser.add_argument("--latency-ms", default=2.0, type=float, help="Delay of every listing, stat and open")
+    parser.add_argument("--jobs", nargs="+", default=[1, 8, 32], type=int, help="Thread counts of the new scanner")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = Path(tmp)
+        generate_vault(vault, VaultSpec(recipes=args.recipes, noise_files=args.noise_files))
+        _add_ignored_folders(vault, args.ignored_files)
+        expected = len(scan_recipes(vault))
+        print(f"{args.recipes} recipes, {args.noise_files} notes and {2 * args.ignored_files} ignored notes, {args.latency_ms} ms latency")
+
+        with injected_latency(args.latency_ms / 1000):
+            start = time.perf_counter()
+            legacy = legacy_scan_recipes(vault)
+            baseline = time.perf_counter() - start
+            print(f"{'legacy':>10}: {baseline:8.3f}s  {len(legacy)} recipes")
+            for jobs in args.jobs:
+                start = time.perf_counter()
+                found = scan_recipes(vault, jobs=jobs)
+                seconds = time.perf_counter() - start
+                assert len(found) == expected
+                print(f"{f'{jobs} jobs':>10}: {seconds:8.3f}s  {len(found)} recipes  {baseline / seconds:6.1f}x")
+
+if __name__ == "__main__":
+    main()
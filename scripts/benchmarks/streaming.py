@@ -0,0 +1,44 @@
+# Peak memory and time of a full build with cli.convert and with the two-pass convert_streaming.
+# Run from the scripts folder: python3 -m benchmarks.streaming [--sizes 1000 10000] [--categories 8]
+from pathlib import Path
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+import tracemalloc
+
+from mapper.cli import convert
+from mapper.stream import convert_streaming
+
+from .vault import VaultSpec, generate_vault
+
+
+def _measure(func, *args):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        tracemalloc.start()
+        start = time.perf_counter()
+        func(*args)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the peak memory of the in-memory and the streaming build")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--categories", default=8, type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            vault = Path(tmp) / f'vault-{size}'
+            generate_vault(vault, VaultSpec(recipes=size, categories=args.categories))
+            print(f"{size} recipes in {args.categories} categories (seconds include tracemalloc):")
+            for name, func in (('convert', convert), ('streaming', convert_streaming)):
+                seconds, peak = _measure(func, vault, Path(tmp) / f'out-{size}-{name}')
+                print(f"\t{name:<10} {seconds:>8.3f}s {peak / 2**20:>9.1f} MiB peak")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# Compile time and PDF size of the Typst templates for synthetic categories of increasing size and text length.
+# Every compile runs offline against a pinned package cache, so results only depend on the templates and typst.
+# Run from the scripts folder: python3 -m benchmarks.templates [--sizes 10 100 1000] [--text 1 4] [--formats cards a5]
+# Fill the package cache once with --fetch, which is the only run allowed to download @preview packages.
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from mapper.build import FORMATS, TYPST_DIR, CompileJob, CompileOptions, sources_digest, typst_command
+from mapper.export import write_category
+from mapper.models import Recipe
+
+from .vault import UNITS, WORDS
+
+DEFAULT_PACKAGE_CACHE = TYPST_DIR.parent / 'out' / 'typst-packages'
+# Any download attempt fails right away instead of reaching the network
+_NO_NETWORK = {'HTTPS_PROXY': 'http://127.0.0.1:9', 'HTTP_PROXY': 'http://127.0.0.1:9', 'https_proxy': 'http://127.0.0.1:9',
+               'http_proxy': 'http://127.0.0.1:9', 'NO_PROXY': '', 'no_proxy': ''}
+_PACKAGE_PATTERN = re.compile(r'import "@(\w+)/([\w-]+):([\d.]+)"')
+
+
+def synthetic_recipes(count: int, text: int, seed: int = 0) -> List[Recipe]:
+    # Recipes of one category with 4 to 12 ingredients and steps, every step text is repeated text times.
+    # A few items contain markup, like in a real vault, so eval runs as well
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(count):
+        ingredients = [f'- {rng.randint(1, 500)} {rng.choice(UNITS)} {rng.choice(WORDS)}' for _ in range(rng.randint(4, 12))]
+        steps = []
+        for s in range(rng.randint(4, 12)):
+            words = ' '.join(rng.choices(WORDS, k=rng.randint(6, 14) * text))
+            steps.append(f'+ {"*" + words + "*" if rng.random() < 0.1 else words}.')
+        recipes.append(Recipe(
+            title=f'{rng.choice(WORDS)} {i}', tags=[], category='Benchmark', grouping=f'Gruppe {i % 6}',
+            prep_time=f'{rng.randint(5, 60)} min', cook_time=f'{rng.randint(0, 120)} min', servings=rng.randint(1, 8),
+            source_url='', last_modified='', ingredients=ingredients, steps=steps,
+            hints=[f'- {" ".join(rng.choices(WORDS, k=6 * text))}'] if rng.random() < 0.5 else [],
+            key=f'Be-Gr-{i}',
+        ))
+    return recipes
+
+
+def required_packages(typst_dir: Path = TYPST_DIR) -> List[Path]:
+    # Relative paths of the imported packages in a package cache, e.g. preview/quick-cards/0.1.0
+    found = set()
+    for f in [typst_dir / 'main.typ', *(typst_dir / 'template').rglob('*.typ')]:
+        found.update(_PACKAGE_PATTERN.findall(f.read_text(encoding='utf-8')))
+    return [Path(namespace, name, version) for namespace, name, version in sorted(found)]
+
+
+def typst_version(typst: str) -> str:
+    return subprocess.run([typst, '--version'], check=True, capture_output=True, text=True).stdout.strip()
+
+
+def compile_once(job: CompileJob, options: CompileOptions, package_cache: Path, offline: bool) -> float:
+    command = typst_command(job, options)
+    # No local packages either, only the pinned cache
+    command[2:2] = ['--package-cache-path', str(package_cache), '--package-path', str(package_cache / '.local')]
+    env = {**os.environ, **_NO_NETWORK} if offline else None
+    start = time.perf_counter()
+    proc = subprocess.run(command, capture_output=True, text=True, env=env)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f'typst failed for {job.json_file.name} ({options.format}): {(proc.stdout + proc.stderr).strip()}')
+    return seconds
+
+
+def benchmark(fmt: str, size: int, text: int, workdir: Path, typst: str, package_cache: Path, repeat: int, offline: bool = True) -> Dict[str, Any]:
+    name = f'{fmt}-{size}-x{text}'
+    data = workdir / f'{size}-x{text}.json'
+    if not data.exists():
+        write_category(data, synthetic_recipes(size, text), 'json-compact')
+    job = CompileJob(data, workdir / f'{name}.pdf')
+    options = CompileOptions(format=fmt, include_keys=fmt == 'a5', typst=typst)
+    times = [compile_once(job, options, package_cache, offline) for _ in range(repeat)]
+    return {
+        'format': fmt,
+        'recipes': size,
+        'text': text,
+        'data_bytes': data.stat().st_size,
+        'seconds': min(times),
+        'mean_seconds': sum(times) / len(times),
+        'pdf_bytes': job.pdf_file.stat().st_size,
+    }
+
+
+def _config(r: Dict[str, Any]) -> str:
+    return f"{r['format']}, {r['recipes']} recipes, text x{r['text']}"
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float, size_tolerance: float) -> List[str]:
+    # A configuration regresses if its best time or its PDF grew by more than the tolerance
+    regressions: List[str] = []
+    base = dict(((r['format'], r['recipes'], r['text']), r) for r in baseline)
+    for r in results:
+        old = base.get((r['format'], r['recipes'], r['text']))
+        if old is None:
+            continue
+        for metric, allowed in (('seconds', tolerance), ('pdf_bytes', size_tolerance)):
+            before = old.get(metric)
+            if before and r[metric] > before * (1 + allowed):
+                regressions.append(f"{_config(r)}: {metric} {before:.4g} -> {r[metric]:.4g} (+{r[metric] / before - 1:.0%})")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the compile time and PDF size of the Typst templates")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000], help="Recipes per category")
+    parser.add_argument("--text", nargs="+", type=int, default=[1, 4], help="Length multipliers of the step and hint texts")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--repeat", default=3, type=int, help="The best of this many compiles is compared")
+    parser.add_argument("--typst", default="typst", help="Typst executable")
+    parser.add_argument("--package-cache", default=DEFAULT_PACKAGE_CACHE, type=Path, help="Pinned Typst package cache")
+    parser.add_argument("--fetch", action="store_true", help="Download missing packages into the package cache and exit")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file, e.g. to use it as baseline")
+    parser.add_argument("--baseline", type=Path, help="Results of an earlier run to compare against")
+    parser.add_argument("--tolerance", default=0.15, type=float, help="Allowed relative slowdown before a configuration counts as regression")
+    parser.add_argument("--size-tolerance", default=0.05, type=float, help="Allowed relative growth of the PDF size")
+    args = parser.parse_args(argv)
+
+    try:
+        version = typst_version(args.typst)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Cannot run {args.typst}: {e}", file=sys.stderr)
+        return 1
+
+    package_cache = args.package_cache.resolve()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fetch:
+            # One small compile per format with network access fills the cache
+            for fmt in args.formats:
+                benchmark(fmt, 1, 1, Path(tmp), args.typst, package_cache, 1, offline=False)
+            print(f"Package cache {package_cache} is ready")
+            return 0
+
+        missing = [p for p in required_packages() if not (package_cache / p).is_dir()]
+        if missing:
+            print(f"Missing {', '.join(p.as_posix() for p in missing)} in {package_cache}, run once with --fetch", file=sys.stderr)
+            return 1
+
+        print(f"{version}, package cache {package_cache}")
+        results = []
+        for fmt in args.formats:
+            for text in args.text:
+                for size in args.sizes:
+                    r = benchmark(fmt, size, text, Path(tmp), args.typst, package_cache, args.repeat)
+                    results.append(r)
+                    print(f"\t{fmt:<6} {size:>6} recipes  x{text:<3} {r['seconds']:>8.3f}s  {r['seconds'] / size * 1000:>7.2f} ms/recipe"
+                          f"  {r['pdf_bytes'] / 1024:>9.1f} KiB")
+
+    report = {
+        'typst': version,
+        'templates': sources_digest(TYPST_DIR),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if baseline.get('typst') != version:
+            print(f"Baseline was recorded with {baseline.get('typst')}, differences may come from typst itself")
+        if baseline.get('platform') != report['platform']:
+            print(f"Baseline was recorded on {baseline.get('platform')}, times are only comparable on the same machine")
+        regressions = compare(results, baseline['results'], args.tolerance, args.size_tolerance)
+        for line in regressions:
+            print(f'Regression: {line}')
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# Deterministic generator for synthetic recipe vaults in the format of docs/templates/recipe-template.md.
+# Run from the scripts folder: python3 -m benchmarks.vault <output> [--recipes 1000]
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+import argparse
+import random
+import string
+
+from mapper.io import MARKER
+
+SYLLABLES = ['ka', 'to', 'mi', 'ra', 'lo', 'be', 'su', 'ne', 'gu', 'fa', 'di', 'po', 'we', 'hu', 'sa', 'ri']
+UNITS = ['g', 'kg', 'ml', 'l', 'EL', 'TL', 'Prise', 'Stück']
+WORDS = ['Mehl', 'Zucker', 'Milch', 'Eier', 'Butter', 'Salz', 'Pfeffer', 'Zwiebel', 'Knoblauch', 'Tomaten', 'Reis', 'Nudeln']
+
+
+@dataclass
+class VaultSpec:
+    recipes: int = 1000
+    categories: int = 8
+    groupings: int = 6
+    # Probability of a recipe to link to another recipe
+    link_density: float = 0.2
+    # Number of markdown files without the marker
+    noise_files: int = 100
+    ingredients: int = 8
+    steps: int = 6
+    seed: int = 0
+
+
+def _unique_names(rng: random.Random, count: int, suffix: str) -> List[str]:
+    # Names with distinct three letter prefixes, so key generation with MAX_KEY_LENGTH = 3 always succeeds
+    prefixes = set()
+    while len(prefixes) < count:
+        prefixes.add(rng.choice(string.ascii_uppercase) + ''.join(rng.choices(string.ascii_lowercase, k=2)))
+    return [p + suffix for p in sorted(prefixes)]
+
+
+def _title(rng: random.Random, i: int) -> str:
+    word = ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+    return f'{word} {i}'
+
+
+def _recipe(rng: random.Random, spec: VaultSpec, title: str, category: str, grouping: str, titles: List[str]) -> str:
+    ingredients = []
+    for i in range(rng.randint(max(1, spec.ingredients // 2), spec.ingredients)):
+        if i == 0 and rng.random() < 0.3:
+            ingredients.append('### Teig')
+        ingredients.append(f'- {rng.randint(1, 500)} {rng.choice(UNITS)} {rng.choice(WORDS)}')
+    steps = []
+    for i in range(rng.randint(max(1, spec.steps // 2), spec.steps)):
+        steps.append(f'{i + 1}. ' + ' '.join(rng.choices(WORDS, k=rng.randint(4, 12))) + '.')
+        if rng.random() < 0.2:
+            steps.append('   ' + ' '.join(rng.choices(WORDS, k=rng.randint(3, 8))) + '.')
+    if rng.random() < spec.link_density:
+        ingredients.append(f'- [[{rng.choice(titles)}]]')
+
+    return '\n'.join([
+        '---',
+        f'title: "{title}"',
+        'tags:',
+        f'- {rng.choice(WORDS).lower()}',
+        f'category: {category}',
+        f'grouping: {grouping}',
+        f'prep_time: {rng.randint(5, 60)} min',
+        f'cook_time: {rng.randint(0, 120)} min',
+        f'servings: "{rng.randint(1, 8)}"',
+        'source_url:',
+        f'last_modified: "2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"',
+        '---',
+        f'# {title}',
+        '',
+        '## Zutaten',
+        *ingredients,
+        '',
+        '## Schritte',
+        *steps,
+        '',
+        '## Hinweise',
+        f'- {" ".join(rng.choices(WORDS, k=5))}',
+        '',
+        '## Versionshistory',
+        '- 2025-01-01: Erstellt',
+        '',
+        '<!-- Ende der Vorlage -->',
+        MARKER,
+    ])
+
+
+def generate_vault(path: Path, spec: VaultSpec) -> None:
+    rng = random.Random(spec.seed)
+    categories = _unique_names(rng, spec.categories, 'kategorie')
+    groupings = _unique_names(rng, spec.groupings, 'gruppe')
+    titles = [_title(rng, i) for i in range(spec.recipes)]
+
+    for i, title in enumerate(titles):
+        category = categories[i % len(categories)]
+        folder = path / category
+        folder.mkdir(parents=True, exist_ok=True)
+        content = _recipe(rng, spec, title, category, rng.choice(groupings), titles)
+        (folder / f'{title}.md').write_text(content, encoding='utf-8')
+
+    notes = path / 'Notizen'
+    notes.mkdir(parents=True, exist_ok=True)
+    for i in range(spec.noise_files):
+        # Mostly small notes with the occasional large one
+        size = rng.choice([200, 2000, 20000, 200000]) if i % 10 == 0 else rng.randint(100, 3000)
+        text = ' '.join(rng.choices(WORDS, k=size // 6))
+        (notes / f'Notiz {i}.md').write_text(f'# Notiz {i}\n\n{text}\n', encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic recipe vault")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--recipes", default=1000, type=int)
+    parser.add_argument("--categories", default=8, type=int)
+    parser.add_argument("--groupings", default=6, type=int)
+    parser.add_argument("--link-density", default=0.2, type=float)
+    parser.add_argument("--noise-files", default=100, type=int)
+    parser.add_argument("--seed", default=0, type=int)
+    args = parser.parse_args()
+
+    spec = VaultSpec(recipes=args.recipes, categories=args.categories, groupings=args.groupings,
+                     link_density=args.link_density, noise_files=args.noise_files, seed=args.seed)
+    generate_vault(args.output, spec)
+    print(f'Generated {spec.recipes} recipes and {spec.noise_files} notes in {args.output}')
+
+if __name__ == "__main__":
+    main()
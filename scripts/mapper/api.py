@@ -0,0 +1,122 @@
+from __future__ import annotations
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+import io
+import os
+import threading
+import time
+
+from .build import TYPST_DIR, CompileOptions, compile_pdfs, parse_formats, sources_digest
+from .cache import BuildManifest, MANIFEST_NAME
+from .cli import convert
+from .keygen import KeyGenError, KeyRegistry, REGISTRY_NAME
+from .parser import RecipeParserError
+from .pdfcache import PdfCache, PDF_CACHE_NAME
+from .timing import Timings
+
+# Layout of the output folder, the same as the one of build.sh
+JSON_DIR = 'json'
+PDF_DIR = 'pdf'
+
+
+@dataclass
+class BuildResult:
+    ok: bool
+    # Parser or key generation error that stopped the build
+    error: Optional[str] = None
+    # Categories whose data file was written or removed
+    changed: List[str] = field(default_factory=list)
+    compiled: List[str] = field(default_factory=list)
+    # Categories whose PDF was copied from the PDF cache
+    restored: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    # Wall and CPU time of every stage, see Timings.to_json
+    stages: List[Dict[str, Any]] = field(default_factory=list)
+    # Everything the build printed
+    log: str = ''
+
+    def to_json(self) -> Dict[str, Any]:
+        return vars(self).copy()
+
+
+class Builder:
+    # Keeps the build manifest with the parsed recipes, the key registry and the link graph in memory,
+    # so repeated builds of the same vault skip loading them and only parse what changed
+    def __init__(self, vault: Path, out: Path, format: Union[str, Sequence[str]] = 'cards', include_keys: bool = False, export_format: str = 'json',
+                 jobs: int = os.cpu_count() or 1, typst: str = 'typst', pdf: bool = True):
+        self.vault = vault
+        self.json_dir = out / JSON_DIR
+        self.pdf_dir = out / PDF_DIR
+        self.export_format = export_format
+        self.jobs = jobs
+        self.pdf = pdf
+        # One format or several, as a list or comma separated like -f of build.py
+        formats = parse_formats(format) if isinstance(format, str) else list(format)
+        self.options = [CompileOptions(format=f, include_keys=include_keys, typst=typst) for f in formats]
+        self.cache = PdfCache(out / PDF_CACHE_NAME)
+        self.manifest = BuildManifest.load(self.json_dir / MANIFEST_NAME)
+        self.registry = KeyRegistry.load(self.json_dir / REGISTRY_NAME)
+        self.lock = threading.Lock()
+        # Template digest of the last build that succeeded, None if there was none or the last one failed
+        self._clean_sources: Optional[str] = None
+
+    def build(self, changed: Optional[Iterable[Path]] = None, quiet: bool = True) -> BuildResult:
+        # One build at a time. With quiet, the output is only returned in BuildResult.log.
+        # changed lists the vault files that changed since the last build, e.g. from a file watcher.
+        # Only those are stat'ed and read again, an empty list makes a build without changes nearly free.
+        # None scans the whole vault
+        with self.lock:
+            log = io.StringIO()
+            if quiet:
+                with redirect_stdout(log):
+                    result = self._build(changed)
+            else:
+                result = self._build(changed)
+            result.log = log.getvalue()
+            return result
+
+    def _build(self, changed_files: Optional[Iterable[Path]]) -> BuildResult:
+        start = time.perf_counter()
+        timings = Timings()
+        # Templates may change while the builder lives, so their digest is taken for every build
+        sources = sources_digest(TYPST_DIR) if self.pdf else ''
+        # The hint is only safe on top of a complete build, the manifest has to know every other file
+        if self._clean_sources is None:
+            changed_files = None
+        elif changed_files is not None:
+            changed_files = [Path(p) for p in changed_files]
+            if not changed_files and self._clean_sources == sources:
+                return BuildResult(True, seconds=time.perf_counter() - start)
+
+        self._clean_sources = None
+        self.registry.conflicts = []
+        try:
+            changed = convert(self.vault, self.json_dir, self.manifest, self.jobs, self.registry, self.export_format, timings=timings,
+                              changed_files=changed_files)
+        except (RecipeParserError, KeyGenError) as e:
+            return BuildResult(False, str(e), seconds=time.perf_counter() - start, stages=timings.to_json()['stages'])
+
+        result = BuildResult(True, changed=changed)
+        if self.pdf:
+            for options in self.options:
+                options.sources = sources
+            report = compile_pdfs(self.json_dir, self.pdf_dir, self.options, self.jobs, cache=self.cache, timings=timings)
+            result.compiled = [r.job.label for r in report.results if r.ok]
+            result.restored = report.restored
+            result.failed = [r.job.label for r in report.failed]
+            result.ok = not result.failed
+        if result.ok:
+            self._clean_sources = sources
+        result.seconds = time.perf_counter() - start
+        result.stages = timings.to_json()['stages']
+        return result
+
+
+def build(vault: Path, out: Path, format: Union[str, Sequence[str]] = 'cards', include_keys: bool = False, export_format: str = 'json',
+          jobs: int = os.cpu_count() or 1, typst: str = 'typst', pdf: bool = True, quiet: bool = True) -> BuildResult:
+    # Builds the category files to <out>/json and the PDFs to <out>/pdf, like build.sh.
+    # With several formats, the PDFs of each go to <out>/pdf/<format>
+    return Builder(Path(vault), Path(out), format, include_keys, export_format, jobs, typst, pdf).build(quiet=quiet)
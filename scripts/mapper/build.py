@@ -0,0 +1,424 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .pdfcache import PdfCache, PDF_CACHE_NAME, DEFAULT_MAX_BYTES, compile_key, sources_digest
+from .timing import Timings, add_timing_arguments
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.errors import PyPdfError
+except ImportError:
+    PdfReader = PdfWriter = None
+    PyPdfError = OSError
+
+TYPST_DIR = Path(__file__).resolve().parents[2] / 'typst'
+FORMATS = ('cards', 'a5')
+# Category files exported by mapper.cli, main.typ picks the decoder by suffix
+DATA_SUFFIXES = ('.json', '.cbor')
+# Remembers the options the PDFs in the output folder were compiled with
+OPTIONS_FILE = '.build-options'
+# Batch mode: the category index passed to main.typ and the combined PDF, which is removed once it is split
+BATCH_INDEX = '.batch-index.json'
+BATCH_PDF = 'all-categories.pdf'
+
+
+@dataclass
+class CompileOptions:
+    format: str = 'cards'
+    include_keys: bool = False
+    typst: str = 'typst'
+    typst_dir: Path = TYPST_DIR
+    # Digest of main.typ and the templates, see pdfcache.sources_digest. Empty if unknown
+    sources: str = ''
+
+    def stamp(self) -> str:
+        stamp = f"format={self.format} includeKeys={int(self.include_keys)}"
+        return f"{stamp} sources={self.sources}" if self.sources else stamp
+
+
+@dataclass
+class CompileJob:
+    json_file: Path
+    pdf_file: Path
+    # PDF cache key of the compile inputs, set by restore_cached
+    key: Optional[str] = None
+    # Options of this job if a build compiles several formats, instead of the ones passed to compile_categories
+    options: Optional[CompileOptions] = None
+
+    @property
+    def label(self) -> str:
+        # The category, prefixed with the format if a build compiles several
+        return f'{self.options.format}/{self.pdf_file.stem}' if self.options is not None else self.pdf_file.stem
+
+
+@dataclass
+class CompileResult:
+    job: CompileJob
+    returncode: int
+    seconds: float
+    output: str
+    # time.perf_counter() when typst was started
+    start: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+@dataclass
+class CompileReport:
+    results: List[CompileResult] = field(default_factory=list)
+    # Categories whose PDF was copied from the cache instead of compiled
+    restored: List[str] = field(default_factory=list)
+
+    @property
+    def failed(self) -> List[CompileResult]:
+        return [r for r in self.results if not r.ok]
+
+
+def parse_formats(text: str) -> List[str]:
+    formats = list(dict.fromkeys(f.strip() for f in text.split(',') if f.strip()))
+    unknown = [f for f in formats if f not in FORMATS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(f"Invalid format '{text}', expected one or more of {', '.join(FORMATS)} separated by commas")
+    return formats
+
+
+def format_dir(pdf_dir: Path, options: CompileOptions, multiple: bool) -> Path:
+    # A single format writes to the output folder itself, several ones to a folder per format
+    return pdf_dir / options.format if multiple else pdf_dir
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compile recipe json files to PDFs with Typst")
+    parser.add_argument("-i", "--input", required=True, help="Path of the category json or cbor files", type=Path)
+    parser.add_argument("-o", "--output", required=True, help="Output path for the PDF files", type=Path)
+    parser.add_argument("-f", "--format", default=["cards"], type=parse_formats, help=f"Layout of the PDFs, one of {', '.join(FORMATS)} or several separated by commas. Several formats share one compile pool and write to <output>/<format>")
+    parser.add_argument("-k", "--include-keys", action="store_true", help="Print the recipe keys on the a5 sheets")
+    parser.add_argument("-j", "--jobs", default=os.cpu_count() or 1, help="Number of parallel typst processes", type=int)
+    parser.add_argument("--force", action="store_true", help="Compile every category even if its PDF is up to date")
+    parser.add_argument("--category", action="append", default=[], help="Only compile this category. Can be given multiple times")
+    parser.add_argument("--typst", default="typst", help="Typst executable")
+    # Opt-in until the <batch-page> markers of main.typ are checked against PDFs of a real typst compile
+    parser.add_argument("--experimental-batch", dest="batch", action="store_true", help="Experimental, the page markers it splits by are not yet verified with real typst output. Render all outdated categories in a single typst process and split the PDF by category. Needs pypdf, without it every category is compiled on its own")
+    parser.add_argument("--pdf-cache", help=f"Path of the PDF cache, defaults to <output>/{PDF_CACHE_NAME}", type=Path)
+    parser.add_argument("--pdf-cache-size", default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Maximum size of the PDF cache in MiB", type=int)
+    parser.add_argument("--no-pdf-cache", action="store_true", help="Always compile and do not store the PDFs in the cache")
+    add_timing_arguments(parser, profile=False)
+
+    return parser.parse_args(argv)
+
+
+def _project_root(main_file: Path, files: Sequence[Path]) -> Path:
+    # The project root has to contain main.typ and every data file, which can then be passed as absolute paths
+    return Path(os.path.commonpath([main_file.parent, *files]))
+
+
+def typst_command(job: CompileJob, options: CompileOptions) -> List[str]:
+    main_file = (options.typst_dir / 'main.typ').resolve()
+    json_file = job.json_file.resolve()
+    root = _project_root(main_file, [json_file])
+
+    return [
+        options.typst, 'compile',
+        '--root', str(root),
+        f'--input=jsonPath=/{json_file.relative_to(root).as_posix()}',
+        f'--input=format={options.format}',
+        f'--input=includeKeys={int(options.include_keys)}',
+        str(main_file), str(job.pdf_file.resolve()),
+    ]
+
+
+def compile_category(job: CompileJob, options: CompileOptions) -> CompileResult:
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(typst_command(job, job.options or options), capture_output=True, text=True)
+    except OSError as e:
+        return CompileResult(job, 127, time.perf_counter() - start, str(e), start)
+    return CompileResult(job, proc.returncode, time.perf_counter() - start, (proc.stdout + proc.stderr).strip(), start)
+
+
+def compile_categories(jobs: Sequence[CompileJob], options: CompileOptions, workers: int = 1) -> List[CompileResult]:
+    results: List[CompileResult] = []
+    # Typst does the work in its own process, so threads are enough to keep all workers busy
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(compile_category, job, options) for job in jobs]
+        for future in as_completed(futures):
+            r = future.result()
+            status = 'ok' if r.ok else f'FAILED ({r.returncode})'
+            print(f'{r.job.label}.pdf: {status} in {r.seconds:.2f}s', flush=True)
+            if not r.ok and r.output:
+                print(r.output, flush=True)
+            results.append(r)
+    return results
+
+
+def batch_commands(index_file: Path, pdf_file: Path, root: Path, options: CompileOptions) -> Tuple[List[str], List[str]]:
+    main_file = (options.typst_dir / 'main.typ').resolve()
+    inputs = [
+        '--root', str(root),
+        f'--input=batchPath=/{index_file.resolve().relative_to(root).as_posix()}',
+        f'--input=format={options.format}',
+        f'--input=includeKeys={int(options.include_keys)}',
+    ]
+    compile_cmd = [options.typst, 'compile', *inputs, str(main_file), str(pdf_file.resolve())]
+    # Reads the first page of every category from the <batch-page> metadata of main.typ
+    query_cmd = [options.typst, 'query', *inputs, '--field', 'value', str(main_file), '<batch-page>']
+    return compile_cmd, query_cmd
+
+
+def page_ranges(starts: Sequence[Dict[str, object]], page_count: Optional[int]) -> Dict[str, Tuple[int, Optional[int]]]:
+    # First and last page of every category, 1-based and inclusive. The last one ends at page_count
+    ranges: Dict[str, Tuple[int, Optional[int]]] = {}
+    starts = sorted(starts, key=lambda s: s['page'])
+    for i, s in enumerate(starts):
+        end = starts[i + 1]['page'] - 1 if i + 1 < len(starts) else page_count
+        ranges[s['category']] = (s['page'], end)
+    return ranges
+
+
+def split_pdf(pdf_file: Path, ranges: Dict[str, Tuple[int, Optional[int]]], pdf_dir: Path) -> None:
+    reader = PdfReader(str(pdf_file))
+    for category, (first, last) in ranges.items():
+        writer = PdfWriter()
+        for page in reader.pages[first - 1:last]:
+            writer.add_page(page)
+        with (pdf_dir / f'{category}.pdf').open('wb') as f:
+            writer.write(f)
+
+
+def compile_batch(jobs: Sequence[CompileJob], options: CompileOptions, pdf_dir: Path) -> List[CompileResult]:
+    # One typst compile for all categories and one typst query for their page ranges, instead of one compile
+    # per category that loads main.typ, the fonts and the packages again every time. Needs pypdf to split the result
+    start = time.perf_counter()
+    main_file = (options.typst_dir / 'main.typ').resolve()
+    index_file = pdf_dir / BATCH_INDEX
+    batch_pdf = pdf_dir / BATCH_PDF
+    root = _project_root(main_file, [index_file.resolve(), *(j.json_file.resolve() for j in jobs)])
+    index = [{'category': j.json_file.stem, 'path': f'/{j.json_file.resolve().relative_to(root).as_posix()}'} for j in jobs]
+    index_file.write_text(json.dumps(index, indent=2), encoding='utf-8')
+
+    compile_cmd, query_cmd = batch_commands(index_file, batch_pdf, root, options)
+    returncode, output = 0, ''
+    try:
+        for cmd in (compile_cmd, query_cmd):
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            returncode = proc.returncode
+            if returncode != 0:
+                output = (proc.stdout + proc.stderr).strip()
+                break
+    except OSError as e:
+        returncode, output = 127, str(e)
+
+    categories = set(j.json_file.stem for j in jobs)
+    ranges: Dict[str, Tuple[int, Optional[int]]] = {}
+    if returncode == 0:
+        # A broken query result or PDF fails the jobs like a failed compile instead of stopping the build
+        try:
+            ranges = page_ranges(json.loads(proc.stdout), len(PdfReader(str(batch_pdf)).pages))
+            ranges = dict((c, r) for c, r in ranges.items() if c in categories)
+            split_pdf(batch_pdf, ranges, pdf_dir)
+            batch_pdf.unlink()
+        except (OSError, ValueError, KeyError, TypeError, PyPdfError) as e:
+            returncode, output = 1, f'Could not split {batch_pdf}: {e!r}'
+
+    seconds = time.perf_counter() - start
+    status = 'ok' if returncode == 0 else f'FAILED ({returncode})'
+    print(f'{len(jobs)} categories in one batch: {status} in {seconds:.2f}s', flush=True)
+    if output:
+        print(output, flush=True)
+    results = []
+    for j in jobs:
+        if returncode == 0 and j.json_file.stem not in ranges:
+            results.append(CompileResult(j, 1, seconds, f'{j.json_file.stem} has no pages in {batch_pdf.name}', start))
+        else:
+            results.append(CompileResult(j, returncode, seconds, output, start))
+    return results
+
+
+def category_data_files(json_dir: Path) -> List[Path]:
+    # Hidden files like the build manifest and the key registry are no categories
+    return sorted(f for f in json_dir.iterdir() if f.suffix in DATA_SUFFIXES and not f.name.startswith('.'))
+
+
+def plan_jobs(json_dir: Path, pdf_dir: Path, options: CompileOptions, force: bool = False, only: Sequence[str] = ()) -> List[CompileJob]:
+    pdf_dir.mkdir(parents=True, exist_ok=True)
+
+    # PDFs are only reusable if they were compiled with the same options. An outdated stamp is removed before
+    # anything is compiled, see stamp_options
+    stamp_file = pdf_dir / OPTIONS_FILE
+    options_changed = not stamp_file.exists() or stamp_file.read_text(encoding='utf-8').strip() != options.stamp()
+    if options_changed:
+        force = True
+        stamp_file.unlink(missing_ok=True)
+
+    json_files = category_data_files(json_dir)
+    categories = set(f.stem for f in json_files)
+    for pdf in pdf_dir.glob('*.pdf'):
+        if pdf.name == BATCH_PDF:
+            continue
+        # With other options, PDFs of categories that are not compiled now are outdated as well
+        if pdf.stem not in categories or (options_changed and only and pdf.stem not in only):
+            print(f'Removing stale {pdf}')
+            pdf.unlink()
+
+    jobs: List[CompileJob] = []
+    for json_file in json_files:
+        if only and json_file.stem not in only:
+            continue
+        pdf_file = pdf_dir / f'{json_file.stem}.pdf'
+        if not force and pdf_file.exists() and pdf_file.stat().st_mtime_ns >= json_file.stat().st_mtime_ns:
+            print(f'{pdf_file.name} is up to date')
+            continue
+        jobs.append(CompileJob(json_file, pdf_file))
+    return jobs
+
+
+def stamp_options(pdf_dir: Path, options: CompileOptions) -> None:
+    # Written once every PDF in pdf_dir was compiled with options. A build that fails or is interrupted leaves
+    # no stamp, so PDFs of the old options are not taken as up to date and the next build compiles everything
+    (pdf_dir / OPTIONS_FILE).write_text(options.stamp(), encoding='utf-8')
+
+
+def remove_other_layout(pdf_dir: Path, formats: Sequence[str], multiple: bool) -> None:
+    # Switching between one format (PDFs in pdf_dir) and several ones (PDFs in pdf_dir/<format>) leaves the PDFs
+    # of the other layout behind, which are never updated again
+    if not pdf_dir.is_dir():
+        return
+    leftovers: List[Path] = []
+    if multiple:
+        leftovers.extend(pdf_dir.glob('*.pdf'))
+        leftovers.append(pdf_dir / OPTIONS_FILE)
+    for fmt in FORMATS:
+        folder = pdf_dir / fmt
+        if folder.is_dir() and not (multiple and fmt in formats):
+            leftovers.extend(folder.glob('*.pdf'))
+            leftovers.extend((folder / OPTIONS_FILE, folder / BATCH_INDEX))
+    for f in leftovers:
+        if f.exists():
+            print(f'Removing stale {f}')
+            f.unlink()
+    for fmt in FORMATS:
+        folder = pdf_dir / fmt
+        if folder.is_dir() and not any(folder.iterdir()):
+            folder.rmdir()
+
+
+def restore_cached(jobs: Sequence[CompileJob], options: CompileOptions, cache: PdfCache) -> List[CompileJob]:
+    # Copies the PDFs of all jobs whose exact compile inputs were compiled before and returns the remaining jobs
+    remaining: List[CompileJob] = []
+    for job in jobs:
+        job.key = compile_key(job.json_file, (job.options or options).stamp())
+        if cache.fetch(job.key, job.pdf_file):
+            print(f'{job.pdf_file.name}: restored from the PDF cache')
+        else:
+            remaining.append(job)
+    return remaining
+
+
+def store_compiled(results: Sequence[CompileResult], cache: PdfCache) -> None:
+    for r in results:
+        if r.ok and r.job.key is not None and r.job.pdf_file.exists():
+            cache.store(r.job.key, r.job.pdf_file)
+    removed = cache.evict()
+    if removed:
+        print(f'Evicted {removed} PDFs from the cache')
+
+
+def compile_pdfs(json_dir: Path, pdf_dir: Path, options: Sequence[CompileOptions], workers: int = 1, force: bool = False, only: Sequence[str] = (),
+                 cache: Optional[PdfCache] = None, batch: bool = False, timings: Optional[Timings] = None) -> CompileReport:
+    # Plans, restores from the cache, compiles and stores the PDFs of all outdated categories in every format.
+    # The jobs of all formats share one pool of typst processes
+    timings = timings if timings is not None else Timings()
+    report = CompileReport()
+    multiple = len(options) > 1
+    with timings.stage('plan') as stage:
+        remove_other_layout(pdf_dir, [o.format for o in options], multiple)
+        jobs: List[CompileJob] = []
+        for o in options:
+            planned = plan_jobs(json_dir, format_dir(pdf_dir, o, multiple), o, force, only)
+            if multiple:
+                for job in planned:
+                    job.options = o
+            jobs.extend(planned)
+        stage.files = len(jobs)
+    if cache is not None:
+        with timings.stage('restore') as stage:
+            remaining = restore_cached(jobs, options[0], cache)
+            report.restored = [j.label for j in jobs if j not in remaining]
+            jobs = remaining
+            stage.files = len(report.restored)
+    if batch and PdfReader is None:
+        print('pypdf is not installed, so the batch cannot be split. Compiling every category on its own')
+        batch = False
+    with timings.stage('compile') as stage:
+        if batch:
+            # One batch per format, the layouts cannot share a document
+            for o in options:
+                batch_jobs = [j for j in jobs if (j.options or o) is o]
+                if not batch_jobs:
+                    continue
+                print(f'Compiling {len(batch_jobs)} categories in one batch...')
+                results = compile_batch(batch_jobs, o, format_dir(pdf_dir, o, multiple))
+                name = Path(BATCH_PDF).stem + (f'-{o.format}' if multiple else '')
+                timings.file('compile', name, results[0].start, results[0].seconds)
+                report.results.extend(results)
+        else:
+            print(f'Compiling {len(jobs)} categories with {workers} workers...')
+            report.results = compile_categories(jobs, options[0], workers)
+            for r in report.results:
+                timings.file('compile', r.job.label, r.start, r.seconds)
+        stage.files = len(report.results)
+        stage.bytes = sum(r.job.pdf_file.stat().st_size for r in report.results if r.ok and r.job.pdf_file.exists())
+    if cache is not None:
+        with timings.stage('store') as stage:
+            store_compiled(report.results, cache)
+            stage.files = len(report.results)
+
+    # A failed compile may leave a broken PDF behind. Remove it so the next build retries
+    for r in report.failed:
+        r.job.pdf_file.unlink(missing_ok=True)
+    for o in options:
+        if not any((r.job.options or o) is o for r in report.failed):
+            stamp_options(format_dir(pdf_dir, o, multiple), o)
+    return report
+
+
+def compile_options(formats: Sequence[str], include_keys: bool = False, typst: str = 'typst') -> List[CompileOptions]:
+    # Options of every format, stamped with the current digest of the templates. Long running callers
+    # build them again for every compile, as the templates may have been edited in the meantime
+    sources = sources_digest(TYPST_DIR)
+    return [CompileOptions(format=f, include_keys=include_keys, typst=typst, sources=sources) for f in formats]
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    options = compile_options(args.format, args.include_keys, args.typst)
+    cache = None if args.no_pdf_cache else PdfCache(args.pdf_cache or args.output / PDF_CACHE_NAME, args.pdf_cache_size * 1024 * 1024)
+
+    timings = Timings()
+    start = time.perf_counter()
+    report = compile_pdfs(args.input, args.output, options, args.jobs, args.force, args.category, cache, args.batch, timings)
+
+    if args.timings:
+        print(timings.summary())
+        timings.write(args.timings, args.timings_format)
+
+    results, failed = report.results, report.failed
+    print(f'Compiled {len(results) - len(failed)} of {len(results)} categories in {time.perf_counter() - start:.2f}s')
+    if failed:
+        print(f'Failed: {", ".join(r.job.label for r in failed)}')
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+import hashlib
+import json
+import os
+
+from .models import Recipe
+
+# Bump whenever the parser output or the manifest layout changes.
+# Manifests with a different version are discarded and everything is rebuilt.
+MANIFEST_VERSION = 2
+MANIFEST_NAME = '.manifest.json'
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class FileEntry:
+    mtime_ns: int
+    size: int
+    # Only recipes are read in full, so other files have no digest
+    digest: Optional[str]
+    is_recipe: bool
+    # Parsed recipe as returned by Recipe.to_json() before keys and links are applied
+    recipe: Optional[Dict[str, Any]] = None
+    # Key the recipe was exported with
+    key: Optional[str] = None
+
+
+class BuildManifest:
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: Dict[str, FileEntry] = {}
+        # Digest of the exported file of every category
+        self.categories: Dict[str, str] = {}
+        self.export_format: Optional[str] = None
+        # Servings every recipe was scaled to, None if they were exported as written
+        self.servings: Optional[int] = None
+        # Recipe file names of every category in export order
+        self.members: Dict[str, List[str]] = {}
+        # Reverse link index (see linker.build_link_index) and the text every target was replaced with
+        self.links: Dict[str, List[str]] = {}
+        self.link_texts: Dict[str, Optional[str]] = {}
+        # Set by every change, save skips the write of an unchanged manifest
+        self.dirty = True
+        # Cached recipes already built from their entry. A long lived manifest hands out copies of them
+        # instead of building every recipe again
+        self._recipes: Dict[str, Recipe] = {}
+        # Path of every file name, so repeated scans do not parse the same names again
+        self._paths: Dict[str, Path] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> BuildManifest:
+        manifest = cls(path)
+        try:
+            raw = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return manifest
+        if raw.get('version') != MANIFEST_VERSION:
+            return manifest
+
+        manifest.files = {k: FileEntry(**v) for k, v in raw.get('files', {}).items()}
+        manifest.categories = dict(raw.get('categories', {}))
+        manifest.export_format = raw.get('export_format')
+        manifest.servings = raw.get('servings')
+        manifest.members = dict(raw.get('members', {}))
+        manifest.links = dict(raw.get('links', {}))
+        manifest.link_texts = dict(raw.get('link_texts', {}))
+        manifest.dirty = False
+        return manifest
+
+    def update(self, **values: Any) -> None:
+        # Sets the given attributes, like categories=... or members=...
+        for name, value in values.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                self.dirty = True
+
+    def save(self) -> None:
+        # A no-op build changes nothing, so it does not rewrite the whole manifest
+        if not self.dirty and self.path.exists():
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        content = json.dumps({
+            'version': MANIFEST_VERSION,
+            # vars instead of asdict, which would deep copy every cached recipe
+            'files': {k: vars(v) for k, v in self.files.items()},
+            'categories': self.categories,
+            'export_format': self.export_format,
+            'servings': self.servings,
+            'members': self.members,
+            'links': self.links,
+            'link_texts': self.link_texts,
+        }, separators=(',', ':'))
+        # Write to a temp file first so an interrupted build never leaves a corrupt manifest
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(content, encoding='utf-8')
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def paths(self) -> Iterable[Path]:
+        # The paths of all files in the manifest
+        for name in self.files:
+            p = self._paths.get(name)
+            if p is None:
+                p = self._paths[name] = Path(name)
+            yield p
+
+    def lookup(self, path: Path, stat: os.stat_result) -> Optional[FileEntry]:
+        # Cheap check: an entry is fresh if neither mtime nor size changed
+        entry = self.files.get(str(path))
+        if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+            return None
+        return entry
+
+    def record(self, path: Path, stat: os.stat_result, data: Optional[bytes], is_recipe: bool) -> FileEntry:
+        digest = content_digest(data) if data is not None else None
+        old = self.files.get(str(path))
+        # Touched but unchanged files keep their parsed recipe
+        recipe = old.recipe if old is not None and digest is not None and old.digest == digest else None
+        key = old.key if recipe is not None else None
+        entry = FileEntry(stat.st_mtime_ns, stat.st_size, digest, is_recipe, recipe, key)
+        self.files[str(path)] = entry
+        if recipe is None:
+            self._recipes.pop(str(path), None)
+        self.dirty = True
+        return entry
+
+    def cached_recipe(self, path: Path) -> Optional[Recipe]:
+        entry = self.files.get(str(path))
+        if entry is None or entry.recipe is None:
+            return None
+        recipe = self._recipes.get(str(path))
+        if recipe is None:
+            recipe = self._recipes[str(path)] = Recipe.from_json(entry.recipe)
+        return recipe.copy()
+
+    def store_recipe(self, path: Path, recipe: Recipe) -> None:
+        entry = self.files.get(str(path))
+        if entry is not None:
+            entry.recipe = recipe.to_json()
+            entry.key = None
+            self._recipes[str(path)] = recipe.copy()
+            self.dirty = True
+
+    def recipe_key(self, path: Path) -> Optional[str]:
+        entry = self.files.get(str(path))
+        return entry.key if entry is not None else None
+
+    def store_key(self, path: Path, key: Optional[str]) -> None:
+        entry = self.files.get(str(path))
+        if entry is not None and entry.key != key:
+            entry.key = key
+            self.dirty = True
+
+    def prune(self, seen: Iterable[Path]) -> None:
+        keep = set(str(p) for p in seen)
+        if len(keep) != len(self.files) or any(k not in keep for k in self.files):
+            self.files = {k: v for k, v in self.files.items() if k in keep}
+            self._recipes = {k: v for k, v in self._recipes.items() if k in keep}
+            self._paths = {k: v for k, v in self._paths.items() if k in keep}
+            self.dirty = True
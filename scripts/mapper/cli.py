@@ -1,88 +1,302 @@
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
 from pathlib import Path
 import argparse
+import cProfile
 import json
 
-from .io import search_recipes, read_lines
-from .parser import RecipeParser, RecipeParserError
+from .cache import BuildManifest, MANIFEST_NAME
+from .export import EXPORT_FORMATS, EXPORT_SUFFIXES, category_files, write_category
+from .io import DEFAULT_IGNORE, ScanStats, scan_recipes
+from .parser import RecipeParserError
+from .pipeline import LazyRecipe, assign_keys, parse_recipes, scan_headers, dirty_categories
 from .models import Recipe
-from .linker import link_buffer
-from .keygen import get_unique_keys_from_set, KeyGenError
+from .linker import link_buffer, build_link_index, resolve_link_texts, dangling_links
+from .keygen import KeyRegistry, KeyGenError, REGISTRY_NAME
+from .index import RecipeIndex, INDEX_NAME
+from .ingredients import scale_recipes, shopping_list
+from .select import RecipeFilter, add_filter_arguments
+from .stream import convert_streaming
+from .timing import Timings, add_timing_arguments
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Obsidian Recipe to JSON converter")
     parser.add_argument("-i", "--input", required=True, help="Parent path where the recipe markdown files are located", type=Path)
     parser.add_argument("-o", "--output", required=True, help="Output path for recipe json files", type=Path)
+    parser.add_argument("--cache", help=f"Path of the incremental build manifest (default: <output>/{MANIFEST_NAME})", type=Path)
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the build manifest and parse every recipe again")
+    parser.add_argument("--keys", help=f"Path of the key registry that keeps recipe keys stable between builds (default: <output>/{REGISTRY_NAME})", type=Path)
+    parser.add_argument("--export-format", default="json", choices=EXPORT_FORMATS, help="Encoding of the category files. json is indented, json-compact has no whitespace and cbor is binary")
+    parser.add_argument("-j", "--jobs", default=1, help="Number of worker processes parsing recipes. Files are read with --io-threads threads", type=int)
+    parser.add_argument("--io-threads", default=1, help="Number of threads listing folders and reading files (default: 1), independent of --jobs. Raise it for vaults on network mounts, where the latency of every access dominates", type=int)
+    parser.add_argument("--list", action="store_true", help="Only print the key, title, category and grouping of the recipes matching the selection options. Reads just the frontmatter and title of every recipe and writes nothing")
+    parser.add_argument("--stream", action="store_true", help="Read the vault twice and write every category while parsing it, so memory is bounded by the largest category instead of the whole vault. Always parses every recipe and does not update the search index")
+    parser.add_argument("--ignore", action="append", default=[], help=f"Skip files and folders whose name or vault relative path matches this glob, in addition to {', '.join(DEFAULT_IGNORE)}. Can be given multiple times")
+    parser.add_argument("--servings", help="Scale the ingredients of every exported recipe to this many servings. Ingredients without a leading quantity are left as they are", type=int)
+    parser.add_argument("--shopping-list", help="Also write the summed ingredients of the exported recipes to this JSON file, scaled with --servings", type=Path)
+    parser.add_argument("--index", nargs="?", const=True, help=f"Also update the SQLite search index for mapper.query (default path: <output>/{INDEX_NAME})")
+    add_filter_arguments(parser)
+    add_timing_arguments(parser)
 
     return parser.parse_args()
 
 
-def export_categories(categories: Dict[str, List[Recipe]], out_path: Path) -> None:
+# Returns the categories whose file was written or removed
+# Categories not in only are known to be unchanged and are not serialized at all
+def export_categories(categories: Dict[str, List[Recipe]], out_path: Path, manifest: Optional[BuildManifest] = None, fmt: str = 'json', only: Optional[Set[str]] = None,
+                      remove_stale: bool = True) -> List[str]:
+    # Files of categories in the manifest but not in categories are removed. A build of selected recipes
+    # only has some of the categories, so it passes remove_stale=False and the others keep file and digest
     out_path.mkdir(parents=True, exist_ok=True)
+    changed: List[str] = []
+    digests: Dict[str, str] = {}
     for category, recipes in categories.items():
-        filename = out_path / f"{category}.json"
+        filename = out_path / f"{category}{EXPORT_SUFFIXES[fmt]}"
+        previous = manifest.categories.get(category) if manifest is not None else None
+        if only is not None and category not in only and previous is not None:
+            digests[category] = previous
+            print(f'Unchanged {category}')
+            continue
+
+        digest, written = write_category(filename, recipes, fmt, previous)
+        digests[category] = digest
+
+        # Unchanged files are left untouched so their mtime keeps the PDF up to date
+        if not written:
+            print(f'Unchanged {category}')
+            continue
+
         print(f'Writing {category} to {filename}')
-        
-        json_content = json.dumps([f.to_json() for f in recipes], indent=2)
-        filename.write_text(json_content, encoding='utf-8')
+        # Only one encoding of a category may exist, otherwise it would be compiled twice
+        for other in category_files(out_path, category):
+            if other != filename:
+                other.unlink(missing_ok=True)
+        changed.append(category)
 
-def main():
-    args = parse_args()
+    if manifest is not None:
+        for category in manifest.categories.keys() - digests.keys():
+            if not remove_stale:
+                digests[category] = manifest.categories[category]
+                continue
+            for filename in category_files(out_path, category):
+                if filename.exists():
+                    print(f'Removing stale {filename}')
+                    filename.unlink()
+            changed.append(category)
+        manifest.update(categories=digests)
+    return changed
+
+# Reads the frontmatter and title of every recipe and gives them the same keys a full build assigns.
+# The lazy recipes are enough to list and select recipes and to resolve links into the rest of the vault
+def read_headers(input_path: Path, keys: KeyRegistry, ignore: Sequence[str] = DEFAULT_IGNORE, io_threads: int = 1) -> List[Tuple[Path, LazyRecipe]]:
+    headers, errors = scan_headers(input_path, ignore, io_threads)
+    if errors:
+        for _, e in errors:
+            print(f"Failed parsing recipe {e}")
+        raise RecipeParserError(f"Failed parsing {len(errors)} of {len(headers) + len(errors)} recipes")
+
+    by_category: Dict[str, List[LazyRecipe]] = {}
+    for _, h in headers:
+        by_category.setdefault(h.category, []).append(h)
+    for rs in by_category.values():
+        rs.sort(key=lambda r: (r.grouping, r.title))
+    try:
+        assign_keys(keys, by_category)
+    except KeyGenError as e:
+        print(f"Failed generating Keys! {e}")
+        raise
+    return headers
+
+def convert(input_path: Path, output_path: Path, manifest: Optional[BuildManifest] = None, jobs: int = 1, registry: Optional[KeyRegistry] = None, fmt: str = 'json', index_path: Optional[Path] = None, selection: Optional[RecipeFilter] = None, timings: Optional[Timings] = None,
+            ignore: Sequence[str] = DEFAULT_IGNORE, io_threads: int = 1, servings: Optional[int] = None,
+            shopping_list_path: Optional[Path] = None, changed_files: Optional[Iterable[Path]] = None) -> List[str]:
+    # With a manifest, changed_files lists the only vault files that may have changed since the last build,
+    # so no other file is listed, stat'ed or read. None scans the whole vault
+    timings = timings if timings is not None else Timings()
+
+    # Without a registry every build starts from scratch and keys depend on the current categories only
+    keys = registry if registry is not None else KeyRegistry(output_path / REGISTRY_NAME)
+
+    # Links resolve through this map. For a selection it also holds the headers of the unselected recipes
+    link_targets: Dict[str, Union[Recipe, LazyRecipe]] = {}
+    selected: Optional[Set[Path]] = None
+    selective = selection is not None and selection.active()
+    if selective:
+        # Only the headers of all recipes are read, the selected ones are read in full by the scan below
+        print('Selecting recipes...')
+        with timings.stage('select') as stage:
+            headers = read_headers(input_path, keys, ignore, io_threads)
+            selected = set(p for p, h in headers if selection.matches(h))
+            link_targets = dict((p.with_suffix('').name, h) for p, h in headers)
+            stage.files = len(headers)
+        print(f'Selected {len(selected)} of {len(headers)} recipes')
 
-    print('Welcome to the Obsidian to Typst Recipe converter!')
     print('Searching for recipes...')
-    recipe_files = search_recipes(args.input)
+    with timings.stage('scan') as stage:
+        stats = ScanStats()
+        recipe_files = scan_recipes(input_path, manifest, io_threads, stats, ignore, selected, changed_files)
+        stage.files, stage.bytes = stats.files, stats.bytes_read
 
     print(f'Found {len(recipe_files)} recipe files!')
     for recipe in recipe_files:
-        print(f'\t{recipe.with_suffix('').name}')
-    
+        print(f'\t{recipe.path.stem}')
+
     print('Parsing the recipes...')
 
     file_to_recipe: Dict[str, Recipe] = {}
-    recipes: List[Recipe] = []
-    buffer_with_links: List[Recipe] = []
 
-    for p in recipe_files:
-        try:
-            lines = read_lines(p)
-            parser = RecipeParser(lines, source=str(p))
-            r = parser.parse()
-            recipes.append(r)
-            file_to_recipe[p.with_suffix('').name] = r
-            if r.has_links():
-                buffer_with_links.append(r)
-        except RecipeParserError as e:
-            print(f"Failed parsing recipe in {p}: {e}")
-            raise
+    with timings.stage('parse') as stage, timings.profile():
+        parsed = parse_recipes(recipe_files, manifest, jobs, timings)
+        stage.files = len(parsed.fresh)
+    if parsed.errors:
+        for _, e in parsed.errors:
+            print(f"Failed parsing recipe {e}")
+        raise RecipeParserError(f"Failed parsing {len(parsed.errors)} of {len(recipe_files)} recipes")
 
-    categories: Dict[str, List[Recipe]] = {}
-    for r in recipes:
-        categories.setdefault(r.category, []).append(r)
-    for cat, rs in categories.items():
-        rs.sort(key=lambda r: (r.grouping, r.title))
+    with timings.stage('group') as stage:
+        # Recipes are grouped together with their file name, which links and the manifest refer to
+        grouped: Dict[str, List[Tuple[str, Recipe]]] = {}
+        for p, r in parsed.recipes:
+            name = p.stem
+            file_to_recipe[name] = r
+            grouped.setdefault(r.category, []).append((name, r))
+        for cat, entries in grouped.items():
+            entries.sort(key=lambda e: (e[1].grouping, e[1].title))
+        categories: Dict[str, List[Recipe]] = dict((cat, [r for _, r in entries]) for cat, entries in grouped.items())
+        members: Dict[str, List[str]] = dict((cat, [n for n, _ in entries]) for cat, entries in grouped.items())
+        stage.files = len(parsed.recipes)
 
+    if parsed.reused:
+        print(f'Reused {parsed.reused} unchanged recipes from the build cache')
     print(f'Parsed and grouped by {len(categories.keys())} categories!')
     print('Generating Keys...')
 
-    try:
-        category_keys = get_unique_keys_from_set(categories.keys())
-        for cat, rs in categories.items():
-            unique_groupings = set([r.grouping for r in rs])
-            grouping_keys = get_unique_keys_from_set(unique_groupings)
-
-            for r in rs:
-                r.set_key(category_keys[r.category], grouping_keys[r.grouping])
-        
-    except KeyGenError as e:
-        print(f"Failed generating Keys! {e}")
-        raise
+    with timings.stage('keygen'):
+        try:
+            assign_keys(keys, categories)
+        except KeyGenError as e:
+            print(f"Failed generating Keys! {e}")
+            raise
+
+    if keys.conflicts:
+        print('Some new keys differ from a fresh build to keep the registered keys stable:')
+        print(keys.conflict_report())
+
+    if index_path is not None and selective:
+        print('Not updating the search index, it always covers the whole vault')
+    elif index_path is not None:
+        # Indexed before linking, so every recipe is stored with its [[links]] whether it was cached or not
+        print(f'Updating search index {index_path}...')
+        with timings.stage('index') as stage:
+            index = RecipeIndex.open(index_path)
+            try:
+                update = index.update((p.with_suffix('').name, r) for p, r in parsed.recipes)
+            finally:
+                index.close()
+            stage.files = update.added + update.updated + update.removed
+        print(f'Indexed {update.added} new and {update.updated} changed recipes, removed {update.removed}')
 
     print("Linking recipes...")
-    link_buffer(buffer_with_links, file_to_recipe)
+    with timings.stage('link') as stage:
+        link_targets.update(file_to_recipe)
+        link_index = build_link_index(file_to_recipe)
+        link_texts = resolve_link_texts(link_index, link_targets)
+        dangling = dangling_links(link_index, link_targets)
+        if dangling:
+            print(f'Found {len(dangling)} links without a matching recipe:')
+            for target, sources in dangling.items():
+                print(f'\t[[{target}]] in {", ".join(sources)}')
+
+        dirty: Optional[Set[str]] = None
+        if manifest is not None:
+            existing = set()
+            # Files scaled to other servings are outdated like files in another format
+            if manifest.export_format == fmt and manifest.servings == servings:
+                existing = set(c for c in manifest.categories if (output_path / f"{c}{EXPORT_SUFFIXES[fmt]}").exists())
+            dirty = dirty_categories(manifest, parsed, members, link_index, link_texts, existing)
+
+        # Only recipes of categories that are exported again have to be linked. The shopping list reads every
+        # recipe, so all of them are linked then, otherwise cached recipes would list raw [[links]]
+        linked = None if shopping_list_path is not None else dirty
+        buffer_with_links = [r for cat, rs in categories.items() if linked is None or cat in linked for r in rs if r.has_links()]
+        link_buffer(buffer_with_links, link_targets)
+        stage.files = len(buffer_with_links)
+
+    if shopping_list_path is not None:
+        print(f'Writing shopping list to {shopping_list_path}...')
+        with timings.stage('shopping') as stage:
+            recipes = [r for rs in categories.values() for r in rs]
+            shopping_list_path.write_text(json.dumps(shopping_list(recipes, servings), indent=2, ensure_ascii=False), encoding='utf-8')
+            stage.files = len(recipes)
+
+    if servings is not None:
+        print(f'Scaling recipes to {servings} servings...')
+        with timings.stage('scale') as stage:
+            # Scaled copies are exported, the parsed recipes stay as written
+            categories = dict((cat, scale_recipes(rs, servings) if dirty is None or cat in dirty else rs) for cat, rs in categories.items())
+            stage.files = sum(len(rs) for cat, rs in categories.items() if dirty is None or cat in dirty)
+
+    print(f'Exporting {fmt} files to {output_path}...')
+    with timings.stage('export') as stage:
+        changed = export_categories(categories, output_path, manifest, fmt, dirty, remove_stale=not selective)
+        written = [f for c in changed for f in category_files(output_path, c) if f.exists()]
+        stage.files, stage.bytes = len(written), sum(f.stat().st_size for f in written)
+
+    with timings.stage('save'):
+        if manifest is not None:
+            for p, r in parsed.recipes:
+                manifest.store_key(p, r.key)
+            manifest.update(export_format=fmt, servings=servings, members=members, links=link_index, link_texts=link_texts)
+            manifest.save()
+        if registry is not None:
+            registry.save()
+    return changed
+
+def main():
+    args = parse_args()
+
+    print('Welcome to the Obsidian to Typst Recipe converter!')
+    manifest: Optional[BuildManifest] = None
+    if not args.no_cache:
+        manifest = BuildManifest.load(args.cache or args.output / MANIFEST_NAME)
+
+    registry = KeyRegistry.load(args.keys or args.output / REGISTRY_NAME)
+    ignore = DEFAULT_IGNORE + tuple(args.ignore)
+
+    if args.list:
+        selection = RecipeFilter.from_args(args)
+        headers = read_headers(args.input, registry, ignore, args.io_threads)
+        listed = [h for _, h in headers if selection.matches(h)]
+        for h in listed:
+            print(f'{h.key or "-":<12} {h.title}\t{h.category} / {h.grouping}')
+        print(f'{len(listed)} of {len(headers)} recipes')
+        return
+
+    index_path = None
+    if args.index is not None:
+        index_path = args.output / INDEX_NAME if args.index is True else Path(args.index)
+
+    # The profile has to see the parser loop, which only runs in this process without workers
+    jobs = 1 if args.profile else args.jobs
+    timings = Timings(cProfile.Profile() if args.profile else None)
+
+    if args.stream:
+        if index_path is not None:
+            print('Not updating the search index in streaming mode, build without --stream to update it')
+        if args.servings is not None or args.shopping_list is not None:
+            print('Not scaling recipes or writing a shopping list in streaming mode, build without --stream to use them')
+        convert_streaming(args.input, args.output, manifest, jobs, registry, args.export_format, RecipeFilter.from_args(args), timings,
+                          ignore, args.io_threads)
+    else:
+        convert(args.input, args.output, manifest, jobs, registry, args.export_format, index_path, RecipeFilter.from_args(args), timings,
+                ignore, args.io_threads, args.servings, args.shopping_list)
 
-    print(f'Exporting json files to {args.output}...')
-    export_categories(categories, args.output)
+    if args.timings:
+        print(timings.summary())
+        timings.write(args.timings, args.timings_format)
+        print(f'Wrote timings to {args.timings}')
+    if args.profile:
+        timings.profiler.dump_stats(args.profile)
+        print(f'Wrote parser profile to {args.profile}, inspect it with: python3 -m pstats {args.profile}')
 
     print("All done!")
 
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Sequence, Tuple, Union
+import hashlib
+import json
+import os
+import re
+import struct
+
+from .models import Recipe
+
+# Output encodings of the category files. Typst reads json with json() and cbor with cbor()
+EXPORT_FORMATS = ('json', 'json-compact', 'cbor')
+EXPORT_SUFFIXES = {'json': '.json', 'json-compact': '.json', 'cbor': '.cbor'}
+
+# Anything in the text of an item that Typst markup would turn into something else than the same text:
+# escapes, strong, emph, raw, code, math, labels, references, nbsp, smart quotes, brackets, dashes,
+# minus signs, soft hyphens, ellipses, comments, URLs and whitespace that markup collapses
+_MARKUP_PATTERN = re.compile(r'[\\*_`#$<>@~\'"\[\]{}]|--|-[\d?]|\.\.\.|//|/\*|://|\s\s|[\t\n\r]')
+# Text at the start of an item that would start another block like a heading, a list or a term
+_BLOCK_START_PATTERN = re.compile(r'[-+=/]|\d+\.|\s')
+# Items are exported as '- text' and '+ text' by the parser
+_ITEM_MARKERS = ('-', '+')
+
+MarkupEntry = Union[str, Dict[str, str]]
+
+
+def classify_markup(text: str) -> MarkupEntry:
+    # Lines that are a list or enum item of plain text become {'item': marker, 'text': text}, which
+    # main.typ turns into list.item or enum.item directly. Everything else stays a string for eval
+    marker, space, body = text.partition(' ')
+    if marker not in _ITEM_MARKERS or not space or not body:
+        return text
+    if _BLOCK_START_PATTERN.match(body) or body[-1].isspace() or _MARKUP_PATTERN.search(body):
+        return text
+    return {'item': marker, 'text': body}
+
+
+def typst_json(recipe: Recipe) -> Dict[str, Any]:
+    # Recipe.to_json with the ingredients, steps and hints classified, see classify_markup
+    data = recipe.to_json()
+    for field in ('ingredients', 'steps', 'hints'):
+        data[field] = [classify_markup(t) for t in data[field]]
+    return data
+
+
+class _HashingWriter:
+    # Writes to a file and hashes everything written, so the digest needs no second pass over the file
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.hash = hashlib.sha256()
+
+    def write(self, data: bytes) -> None:
+        self.f.write(data)
+        self.hash.update(data)
+
+
+def _cbor_head(major: int, value: int) -> bytes:
+    if value < 24:
+        return bytes([major << 5 | value])
+    if value < 0x100:
+        return bytes([major << 5 | 24, value])
+    if value < 0x10000:
+        return bytes([major << 5 | 25]) + struct.pack('>H', value)
+    if value < 0x100000000:
+        return bytes([major << 5 | 26]) + struct.pack('>I', value)
+    return bytes([major << 5 | 27]) + struct.pack('>Q', value)
+
+
+def cbor_encode(obj: Any) -> bytes:
+    # Minimal encoder for the types of typst_json()
+    if obj is None:
+        return b'\xf6'
+    if obj is True:
+        return b'\xf5'
+    if obj is False:
+        return b'\xf4'
+    if isinstance(obj, int):
+        return _cbor_head(0, obj) if obj >= 0 else _cbor_head(1, -1 - obj)
+    if isinstance(obj, float):
+        return b'\xfb' + struct.pack('>d', obj)
+    if isinstance(obj, str):
+        data = obj.encode('utf-8')
+        return _cbor_head(3, len(data)) + data
+    if isinstance(obj, (list, tuple)):
+        return _cbor_head(4, len(obj)) + b''.join(cbor_encode(o) for o in obj)
+    if isinstance(obj, dict):
+        return _cbor_head(5, len(obj)) + b''.join(cbor_encode(k) + cbor_encode(v) for k, v in obj.items())
+    raise TypeError(f"Cannot encode {type(obj).__name__} as cbor")
+
+
+class CategoryWriter:
+    # Appends recipes to a category file one at a time, so only the current recipe has to be in memory.
+    # Produces the same bytes as json.dumps(list, indent=2), or the compact or cbor variant, of all recipes.
+    # cbor starts with the length of the array, so it has to be known up front
+    def __init__(self, path: Path, fmt: str = 'json', count: Optional[int] = None):
+        if fmt == 'cbor' and count is None:
+            raise ValueError('cbor needs the number of recipes up front')
+        self.path = path
+        self.fmt = fmt
+        self.count = 0
+        self.tmp = path.with_name(path.name + '.tmp')
+        self.f = self.tmp.open('wb')
+        self.out = _HashingWriter(self.f)
+        if fmt == 'cbor':
+            self.out.write(_cbor_head(4, count))
+
+    def append(self, recipe: Recipe) -> None:
+        data = typst_json(recipe)
+        if self.fmt == 'cbor':
+            self.out.write(cbor_encode(data))
+        elif self.fmt == 'json-compact':
+            self.out.write((b',' if self.count else b'[') + json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        else:
+            item = '\n'.join('  ' + line for line in json.dumps(data, indent=2).split('\n'))
+            self.out.write((b',\n' if self.count else b'[\n') + item.encode('utf-8'))
+        self.count += 1
+
+    def close(self, previous_digest: Optional[str] = None) -> Tuple[str, bool]:
+        # Returns the digest of the content and whether path was written.
+        # The file is only replaced if the content changed, so unchanged files keep their mtime
+        if self.fmt != 'cbor':
+            if not self.count:
+                self.out.write(b'[]')
+            else:
+                self.out.write(b']' if self.fmt == 'json-compact' else b'\n]')
+        self.f.close()
+        digest = self.out.hash.hexdigest()
+
+        if digest == previous_digest and self.path.exists():
+            self.tmp.unlink()
+            return digest, False
+        os.replace(self.tmp, self.path)
+        return digest, True
+
+    def abort(self) -> None:
+        self.f.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+def write_category(path: Path, recipes: Sequence[Recipe], fmt: str = 'json', previous_digest: Optional[str] = None) -> Tuple[str, bool]:
+    # Streams the recipes into a temp file next to path and returns the digest of the content and whether path was written
+    writer = CategoryWriter(path, fmt, len(recipes))
+    try:
+        for r in recipes:
+            writer.append(r)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close(previous_digest)
+
+
+def category_files(out_path: Path, category: str) -> Iterable[Path]:
+    for suffix in set(EXPORT_SUFFIXES.values()):
+        yield out_path / f"{category}{suffix}"
@@ -0,0 +1,213 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import re
+import sqlite3
+
+from .cache import content_digest
+from .models import Recipe
+
+# Bump whenever the schema or the indexed values change. Indexes with a different version are rebuilt
+INDEX_VERSION = 1
+INDEX_NAME = '.index.sqlite'
+
+SCHEMA = '''
+CREATE TABLE recipes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    fingerprint TEXT NOT NULL,
+    title TEXT NOT NULL,
+    category TEXT NOT NULL,
+    grouping TEXT NOT NULL,
+    key TEXT,
+    servings INTEGER,
+    prep_time TEXT,
+    cook_time TEXT,
+    prep_minutes INTEGER,
+    cook_minutes INTEGER
+);
+CREATE INDEX recipes_category ON recipes (category, grouping);
+CREATE INDEX recipes_prep ON recipes (prep_minutes);
+CREATE INDEX recipes_cook ON recipes (cook_minutes);
+CREATE TABLE tags (
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL COLLATE NOCASE
+);
+CREATE INDEX tags_tag ON tags (tag, recipe_id);
+CREATE INDEX tags_recipe ON tags (recipe_id);
+CREATE VIRTUAL TABLE recipes_fts USING fts5 (title, tags, ingredients, steps, hints);
+'''
+
+_DURATION_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*([a-zA-Zä]*)')
+_TIME_OF_DAY_PATTERN = re.compile(r'^\s*(\d+):(\d{2})\s*(?:h|std)?\s*$', re.IGNORECASE)
+_UNIT_MINUTES = {
+    '': 1, 'm': 1, 'min': 1, 'mins': 1, 'minute': 1, 'minuten': 1, 'minutes': 1,
+    'h': 60, 'std': 60, 'stunde': 60, 'stunden': 60, 'hour': 60, 'hours': 60,
+    'd': 1440, 'tag': 1440, 'tage': 1440, 'day': 1440, 'days': 1440,
+}
+
+
+class RecipeIndexError(Exception):
+    pass
+
+
+def parse_minutes(text: str) -> Optional[int]:
+    # '10 min', '1 h 30 min', '1,5 Std', '1:30' and plain numbers. None if nothing in text looks like a duration
+    m = _TIME_OF_DAY_PATTERN.match(text)
+    if m:
+        return int(m.group(1)) * 60 + int(m.group(2))
+    total = 0.0
+    found = False
+    for number, unit in _DURATION_PATTERN.findall(text):
+        factor = _UNIT_MINUTES.get(unit.lower())
+        if factor is None:
+            continue
+        total += float(number.replace(',', '.')) * factor
+        found = True
+    return round(total) if found else None
+
+
+def fingerprint(recipe: Recipe) -> str:
+    return content_digest(json.dumps(recipe.to_json(), separators=(',', ':')).encode('utf-8'))
+
+
+@dataclass
+class IndexUpdate:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
+@dataclass
+class QueryResult:
+    name: str
+    title: str
+    category: str
+    grouping: str
+    key: Optional[str]
+    prep_minutes: Optional[int]
+    cook_minutes: Optional[int]
+
+
+class RecipeIndex:
+    def __init__(self, path: Path, connection: sqlite3.Connection):
+        self.path = path
+        self.db = connection
+
+    @classmethod
+    def open(cls, path: Path) -> RecipeIndex:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path)
+        db.execute('PRAGMA foreign_keys = ON')
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version != INDEX_VERSION:
+            # Empty or outdated index, start over
+            db.close()
+            path.unlink(missing_ok=True)
+            db = sqlite3.connect(path)
+            db.execute('PRAGMA foreign_keys = ON')
+            db.executescript(SCHEMA)
+            db.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+            db.commit()
+        return cls(path, db)
+
+    @classmethod
+    def open_existing(cls, path: Path) -> RecipeIndex:
+        if not path.exists():
+            raise RecipeIndexError(f"No index at {path}. Build one with: python3 -m mapper.cli ... --index {path}")
+        db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version != INDEX_VERSION:
+            db.close()
+            raise RecipeIndexError(f"Index at {path} has version {version}, expected {INDEX_VERSION}. Build it again")
+        return cls(path, db)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def update(self, recipes: Iterable[Tuple[str, Recipe]]) -> IndexUpdate:
+        # Recipes are identified by their file name. Rows are only written if the recipe changed
+        # and rows of recipes that are gone are removed, all in one transaction
+        result = IndexUpdate()
+        existing: Dict[str, Tuple[int, str]] = dict((name, (rid, fp)) for rid, name, fp in self.db.execute('SELECT id, name, fingerprint FROM recipes'))
+        seen = set()
+        with self.db:
+            for name, r in recipes:
+                seen.add(name)
+                fp = fingerprint(r)
+                old = existing.get(name)
+                if old is not None and old[1] == fp:
+                    result.unchanged += 1
+                    continue
+                if old is not None:
+                    self._delete(old[0])
+                    result.updated += 1
+                else:
+                    result.added += 1
+                self._insert(name, fp, r)
+            for name in existing.keys() - seen:
+                self._delete(existing[name][0])
+                result.removed += 1
+        return result
+
+    def _insert(self, name: str, fp: str, r: Recipe) -> None:
+        cur = self.db.execute(
+            'INSERT INTO recipes (name, fingerprint, title, category, grouping, key, servings, prep_time, cook_time, prep_minutes, cook_minutes) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (name, fp, r.title, r.category, r.grouping, r.key, r.servings, r.prep_time, r.cook_time, parse_minutes(r.prep_time), parse_minutes(r.cook_time)))
+        rid = cur.lastrowid
+        self.db.executemany('INSERT INTO tags (recipe_id, tag) VALUES (?, ?)', [(rid, t) for t in r.tags])
+        self.db.execute('INSERT INTO recipes_fts (rowid, title, tags, ingredients, steps, hints) VALUES (?, ?, ?, ?, ?, ?)',
+                        (rid, r.title, ' '.join(r.tags), '\n'.join(r.ingredients), '\n'.join(r.steps), '\n'.join(r.hints)))
+
+    def _delete(self, rid: int) -> None:
+        self.db.execute('DELETE FROM recipes_fts WHERE rowid = ?', (rid,))
+        self.db.execute('DELETE FROM recipes WHERE id = ?', (rid,))
+
+    def search(self, tags: Sequence[str] = (), ingredients: Sequence[str] = (), text: Optional[str] = None,
+               category: Optional[str] = None, grouping: Optional[str] = None, max_prep: Optional[int] = None,
+               max_cook: Optional[int] = None, max_total: Optional[int] = None, limit: Optional[int] = None) -> List[QueryResult]:
+        # All filters have to match. Tags compare case insensitive, ingredients match word prefixes
+        where: List[str] = []
+        params: List[object] = []
+        for tag in tags:
+            where.append('r.id IN (SELECT recipe_id FROM tags WHERE tag = ?)')
+            params.append(tag)
+        match = [f'ingredients : {_fts_phrase(i)}*' for i in ingredients]
+        if text:
+            match.append(_fts_phrase(text))
+        if match:
+            where.append('r.id IN (SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH ?)')
+            params.append(' AND '.join(match))
+        if category is not None:
+            where.append('r.category = ?')
+            params.append(category)
+        if grouping is not None:
+            where.append('r.grouping = ?')
+            params.append(grouping)
+        if max_prep is not None:
+            where.append('r.prep_minutes <= ?')
+            params.append(max_prep)
+        if max_cook is not None:
+            where.append('r.cook_minutes <= ?')
+            params.append(max_cook)
+        if max_total is not None:
+            where.append('r.prep_minutes + r.cook_minutes <= ?')
+            params.append(max_total)
+
+        sql = 'SELECT name, title, category, grouping, key, prep_minutes, cook_minutes FROM recipes r'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY category, grouping, title'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [QueryResult(*row) for row in self.db.execute(sql, params)]
+
+
+def _fts_phrase(text: str) -> str:
+    # Quoted as one FTS5 phrase so user input cannot use the query syntax
+    return '"' + text.replace('"', '""') + '"'
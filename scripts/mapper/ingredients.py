@@ -0,0 +1,219 @@
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass, replace
+from itertools import compress, repeat
+from operator import mul
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import re
+
+from .models import Recipe
+
+# '- 200 g Mehl', '- 1,5 kg Kartoffeln', '- 1/2 TL Salz', '- 1 1/2 l Milch', '- ½ Bund Petersilie', '- 3 Eier'.
+# The quantity has to come first, ranges like '2-3 EL' and items without a number are left as they are
+_INGREDIENT_PATTERN = re.compile(
+    r'- (?:(?P<whole>\d+)\s+)?(?:(?P<num>\d+)/(?P<den>\d+)|(?P<number>\d+(?:[.,]\d+)?)?(?P<fraction>[½⅓⅔¼¾⅛])|(?P<decimal>\d+(?:[.,]\d+)?))'
+    r'(?![\d/.,\-–])\s*(?P<rest>.*)$')
+_UNIT_WORD_PATTERN = re.compile(r'([^\W\d_]+\.?)(?:\s+|$)')
+_FRACTIONS = {'½': 1 / 2, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 1 / 4, '¾': 3 / 4, '⅛': 1 / 8}
+
+# Lower case spelling -> unit the quantity is stored in and the factor to get there.
+# Words that are not listed here are part of the name, '3 Eier' has no unit
+_UNITS = {
+    'mg': ('g', 0.001), 'g': ('g', 1), 'gr': ('g', 1), 'gr.': ('g', 1), 'gramm': ('g', 1), 'kg': ('g', 1000),
+    'ml': ('ml', 1), 'cl': ('ml', 10), 'dl': ('ml', 100), 'l': ('ml', 1000), 'liter': ('ml', 1000),
+    'el': ('EL', 1), 'tl': ('TL', 1), 'msp': ('Msp.', 1), 'msp.': ('Msp.', 1),
+    'prise': ('Prise', 1), 'prisen': ('Prise', 1), 'stück': ('Stück', 1), 'stk': ('Stück', 1), 'stk.': ('Stück', 1),
+    'pck': ('Pck.', 1), 'pck.': ('Pck.', 1), 'päckchen': ('Pck.', 1), 'dose': ('Dose', 1), 'dosen': ('Dose', 1),
+    'bund': ('Bund', 1), 'zehe': ('Zehe', 1), 'zehen': ('Zehe', 1), 'becher': ('Becher', 1),
+    'tasse': ('Tasse', 1), 'tassen': ('Tasse', 1), 'scheibe': ('Scheibe', 1), 'scheiben': ('Scheibe', 1),
+}
+# Large amounts are printed in the bigger unit
+_DISPLAY_UNITS = {'g': ('kg', 1000), 'ml': ('l', 1000)}
+
+
+@dataclass(frozen=True)
+class Ingredient:
+    quantity: float
+    # Empty for counted ingredients like '3 Eier'
+    unit: str
+    name: str
+
+
+def parse_ingredient(text: str) -> Optional[Ingredient]:
+    # None for headings, links and items without a leading quantity
+    m = _INGREDIENT_PATTERN.match(text)
+    if m is None:
+        return None
+    if m['den'] is not None:
+        if int(m['den']) == 0:
+            return None
+        quantity = int(m['num']) / int(m['den'])
+    elif m['fraction'] is not None:
+        quantity = _FRACTIONS[m['fraction']] + (float(m['number'].replace(',', '.')) if m['number'] else 0)
+    else:
+        quantity = float(m['decimal'].replace(',', '.'))
+    if m['whole'] is not None:
+        if m['decimal'] is not None or m['number'] is not None:
+            return None
+        quantity += int(m['whole'])
+
+    rest = m['rest']
+    unit, factor = '', 1
+    u = _UNIT_WORD_PATTERN.match(rest)
+    if u is not None and u.group(1).lower() in _UNITS:
+        unit, factor = _UNITS[u.group(1).lower()]
+        rest = rest[u.end():]
+    name = rest.strip()
+    if not name:
+        return None
+    return Ingredient(quantity * factor, unit, name)
+
+
+def format_quantity(quantity: float, unit: str) -> Tuple[str, str]:
+    # German decimal comma, two decimals below 10 and whole numbers above
+    display, factor = _DISPLAY_UNITS.get(unit, (unit, 1))
+    if quantity >= factor and factor != 1:
+        quantity, unit = quantity / factor, display
+    text = f'{quantity:.2f}'.rstrip('0').rstrip('.') if quantity < 10 else f'{round(quantity)}'
+    return text.replace('.', ','), unit
+
+
+def format_ingredient(quantity: float, unit: str, name: str) -> str:
+    amount, unit = format_quantity(quantity, unit)
+    return f'- {amount} {unit} {name}' if unit else f'- {amount} {name}'
+
+
+class IngredientTable:
+    # The structured ingredients of many recipes in columns. Row i is ingredient item[i] of recipe recipe[i],
+    # quantity[i] of units[unit[i]] of names[name[i]]. Ingredients without a quantity have no row.
+    # The rows of a recipe are contiguous, from offsets[r] to offsets[r + 1], so scaling and summing only pass over
+    # the column slices of the selected recipes instead of parsing the ingredient texts again
+    def __init__(self):
+        self.recipe = array('I')
+        self.item = array('I')
+        self.quantity = array('d')
+        self.unit = array('I')
+        self.name = array('I')
+        # Index into groups, the distinct (name, unit) pairs that are summed together
+        self.group = array('I')
+        self.units: List[str] = []
+        self.names: List[str] = []
+        self.groups: List[Tuple[int, int]] = []
+        self._ids: Dict[object, int] = {}
+        # One entry per recipe, in the order they were added
+        self.keys: List[Optional[str]] = []
+        self.categories: List[str] = []
+        self.servings = array('I')
+        self.offsets = array('I', [0])
+
+    @classmethod
+    def from_recipes(cls, recipes: Iterable[Recipe]) -> IngredientTable:
+        table = cls()
+        for r in recipes:
+            table.add(r)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.quantity)
+
+    @property
+    def recipes(self) -> int:
+        return len(self.keys)
+
+    def _id(self, values: List, value, kind: str) -> int:
+        i = self._ids.get((kind, value))
+        if i is None:
+            i = self._ids[(kind, value)] = len(values)
+            values.append(value)
+        return i
+
+    def add(self, recipe: Recipe) -> int:
+        # Returns the index of the recipe
+        index = len(self.keys)
+        self.keys.append(recipe.key)
+        self.categories.append(recipe.category)
+        self.servings.append(max(recipe.servings, 0))
+        for i, text in enumerate(recipe.ingredients):
+            ingredient = parse_ingredient(text)
+            if ingredient is None:
+                continue
+            unit = self._id(self.units, ingredient.unit, 'unit')
+            name = self._id(self.names, ingredient.name, 'name')
+            self.recipe.append(index)
+            self.item.append(i)
+            self.quantity.append(ingredient.quantity)
+            self.unit.append(unit)
+            self.name.append(name)
+            self.group.append(self._id(self.groups, (name, unit), 'group'))
+        self.offsets.append(len(self.quantity))
+        return index
+
+    def select(self, keys: Optional[Iterable[str]] = None, categories: Optional[Iterable[str]] = None) -> array:
+        # One flag per recipe, set if it has one of the keys and is in one of the categories. None matches everything
+        wanted_keys = set(keys) if keys is not None else None
+        wanted_categories = set(categories) if categories is not None else None
+        return array('B', ((wanted_keys is None or k in wanted_keys) and (wanted_categories is None or c in wanted_categories)
+                           for k, c in zip(self.keys, self.categories)))
+
+    def factors(self, servings: int, selected: Optional[Sequence[int]] = None) -> array:
+        # One factor per recipe that scales it to servings. Unselected recipes and recipes without servings keep theirs
+        if selected is None:
+            selected = array('B', [1]) * self.recipes
+        return array('d', (servings / s if flag and s else 1.0 for s, flag in zip(self.servings, selected)))
+
+    def scaled(self, factors: Sequence[float]) -> array:
+        # A copy of the quantity column with the rows of every recipe multiplied by its factor
+        quantities = array('d', self.quantity)
+        offsets = self.offsets
+        for r, f in enumerate(factors):
+            if f != 1.0:
+                start, end = offsets[r], offsets[r + 1]
+                quantities[start:end] = array('d', map(mul, quantities[start:end], repeat(f, end - start)))
+        return quantities
+
+    def totals(self, quantities: Optional[Sequence[float]] = None, selected: Optional[Sequence[int]] = None) -> List[Tuple[str, float, str]]:
+        # (name, quantity, unit) summed over the rows of the selected recipes, sorted by name and unit
+        quantities = quantities if quantities is not None else self.quantity
+        offsets = self.offsets
+        if selected is None:
+            spans = [(0, len(self))]
+        else:
+            spans = [(offsets[r], offsets[r + 1]) for r in compress(range(self.recipes), selected)]
+        sums: Dict[int, float] = {}
+        for start, end in spans:
+            for group, q in zip(self.group[start:end], quantities[start:end]):
+                sums[group] = sums.get(group, 0.0) + q
+        totals = [(self.names[self.groups[g][0]], q, self.units[self.groups[g][1]]) for g, q in sums.items()]
+        totals.sort(key=lambda t: (t[0].casefold(), t[2]))
+        return totals
+
+    def rewrite(self, recipes: Sequence[Recipe], quantities: Sequence[float], factors: Sequence[float]) -> List[Recipe]:
+        # Copies of the recipes, which have to be the ones the table was built from, with the ingredients of every
+        # scaled recipe written with their new quantity. Recipes with a factor of 1 are returned as they are
+        result = list(recipes)
+        for r, recipe in enumerate(recipes):
+            if factors[r] == 1.0:
+                continue
+            ingredients = list(recipe.ingredients)
+            for row in range(self.offsets[r], self.offsets[r + 1]):
+                ingredients[self.item[row]] = format_ingredient(quantities[row], self.units[self.unit[row]], self.names[self.name[row]])
+            result[r] = replace(recipe, ingredients=ingredients, servings=round(recipe.servings * factors[r]))
+        return result
+
+
+def scale_recipes(recipes: Sequence[Recipe], servings: int) -> List[Recipe]:
+    # Copies of the recipes with their ingredients scaled to servings, ready for export.write_category
+    table = IngredientTable.from_recipes(recipes)
+    factors = table.factors(servings)
+    return table.rewrite(recipes, table.scaled(factors), factors)
+
+
+def shopping_list(recipes: Sequence[Recipe], servings: Optional[int] = None) -> List[Dict[str, object]]:
+    # The summed ingredients of the recipes, each scaled to servings first if given
+    table = IngredientTable.from_recipes(recipes)
+    quantities = table.scaled(table.factors(servings)) if servings is not None else None
+    items = []
+    for name, quantity, unit in table.totals(quantities):
+        amount, display = format_quantity(quantity, unit)
+        items.append({'name': name, 'quantity': quantity, 'unit': unit, 'text': f'{amount} {display} {name}' if display else f'{amount} {name}'})
+    return items
@@ -1,21 +1,272 @@
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
 from pathlib import Path
-from typing import List
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, TYPE_CHECKING
+import os
+
+if TYPE_CHECKING:
+    from .cache import BuildManifest, FileEntry
 
 MARKER = '<!-- MARKER FOR MAPPER SCRIPT -->'
 
-def search_recipes(parent: Path) -> List[Path]:
-    found: List[Path] = []
-    for p in parent.rglob('*.md'):
+# Number of bytes read from the end of a file to look for the marker.
+# Only the last line matters, so this just needs to fit the marker plus trailing whitespace.
+TAIL_SIZE = 256
+
+# Skipped before anything inside is listed or opened. Matched against the name and the vault relative path
+# of every file and folder with fnmatch, where * also matches '/'. '.trash' skips every folder of that name,
+# 'Archive/*' everything below the Archive folder at the top of the vault
+DEFAULT_IGNORE = ('.obsidian', '.trash', '.git')
+
+
+class ScannedRecipe(NamedTuple):
+    path: Path
+    # Decoded lines of the file or None if the manifest holds an up to date parse of it
+    lines: Optional[List[str]]
+
+
+@dataclass
+class ScanStats:
+    # Markdown files found in the vault
+    files: int = 0
+    # Recipe files that were read in full and their total size
+    read: int = 0
+    bytes_read: int = 0
+
+
+def _tail_has_marker(f: BinaryIO, size: int) -> bool:
+    f.seek(max(0, size - TAIL_SIZE))
+    # The tail may start in the middle of a multi-byte character, which can only affect the first line
+    lines = f.read().decode('utf-8', errors='replace').splitlines()
+    return bool(lines) and lines[-1].strip() == MARKER
+
+def has_marker(path: Path) -> bool:
+    with path.open('rb') as f:
+        return _tail_has_marker(f, path.stat().st_size)
+
+def read_if_recipe(path: Path, size: int) -> Optional[bytes]:
+    # Opens the file once: checks the tail for the marker and only loads the whole file for recipes
+    with path.open('rb') as f:
+        if not _tail_has_marker(f, size):
+            return None
+        f.seek(0)
+        return f.read()
+
+def read_header_lines(path: Path, size: int) -> Optional[List[str]]:
+    # Like read_if_recipe, but stops at the first non-blank line after the frontmatter, where the title is expected.
+    # The body of the recipe, usually most of the file, is never read
+    with path.open('rb') as f:
+        if not _tail_has_marker(f, size):
+            return None
+        f.seek(0)
+        lines: List[str] = []
+        fences = 0
+        for raw in f:
+            line = raw.decode('utf-8').rstrip('\r\n')
+            lines.append(line)
+            stripped = line.strip()
+            if stripped == '---' and fences < 2:
+                fences += 1
+            elif stripped and fences != 1:
+                # The title, or the first line of a file without frontmatter, which the parser reports
+                break
+        return lines
+
+def is_ignored(name: str, rel: str, ignore: Sequence[str]) -> bool:
+    return any(fnmatchcase(name, pattern) or fnmatchcase(rel, pattern) for pattern in ignore)
+
+def _list_dir(directory: Path, rel: str, ignore: Sequence[str]) -> Tuple[List[Tuple[Path, str]], List[Path]]:
+    # Sub folders (with their vault relative path) and markdown files of one folder. scandir knows the type
+    # of most entries from the listing itself, so this needs no stat call per entry
+    dirs: List[Tuple[Path, str]] = []
+    files: List[Path] = []
+    with os.scandir(directory) as it:
+        for e in it:
+            erel = f'{rel}{e.name}'
+            if is_ignored(e.name, erel, ignore):
+                continue
+            # Like rglob, symlinked folders are not followed
+            if e.is_dir(follow_symlinks=False):
+                dirs.append((directory / e.name, f'{erel}/'))
+            elif e.name.endswith('.md'):
+                files.append(directory / e.name)
+    return dirs, files
+
+# Files of one folder that one task of walk_vault visits
+_VISIT_BATCH = 32
+
+def walk_vault(parent: Path, visit: Callable[[Path], object], ignore: Sequence[str] = DEFAULT_IGNORE, jobs: int = 1) -> Dict[Path, object]:
+    # Calls visit for every markdown file below parent that is not ignored and returns the results by path.
+    # With jobs > 1, folders are listed and their files visited in batches on one pool of at most that many threads,
+    # so a slow network mount is accessed by several requests at once instead of one file after the other.
+    # On a local disk the threads only add overhead, which is why the callers default to one.
+    # Exceptions of visit are returned as results, a folder that cannot be listed is reported and skipped
+    results: Dict[Path, object] = {}
+
+    def visit_safe(p: Path):
         try:
-            text = p.read_text(encoding='utf-8')
+            return visit(p)
         except Exception as e:
+            return e
+
+    if jobs <= 1:
+        pending = [(parent, '')]
+        while pending:
+            directory, rel = pending.pop()
+            try:
+                dirs, files = _list_dir(directory, rel, ignore)
+            except OSError as e:
+                print(f"Could not read {directory}: {e}")
+                continue
+            pending.extend(dirs)
+            for p in files:
+                results[p] = visit_safe(p)
+        return results
+
+    def visit_files(files: List[Path]):
+        return [(p, visit_safe(p)) for p in files]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        listings: Dict[Future, Path] = {executor.submit(_list_dir, parent, '', ignore): parent}
+        visits: Set[Future] = set()
+        waiting: Set[Future] = set(listings)
+        while waiting:
+            done, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in visits:
+                    visits.discard(future)
+                    results.update(future.result())
+                    continue
+                directory = listings.pop(future)
+                try:
+                    dirs, files = future.result()
+                except OSError as e:
+                    print(f"Could not read {directory}: {e}")
+                    continue
+                for d, rel in dirs:
+                    f = executor.submit(_list_dir, d, rel, ignore)
+                    listings[f] = d
+                    waiting.add(f)
+                # The files of a folder are visited in batches, one task per file costs more than a local stat
+                for i in range(0, len(files), _VISIT_BATCH):
+                    f = executor.submit(visit_files, files[i:i + _VISIT_BATCH])
+                    visits.add(f)
+                    waiting.add(f)
+    return results
+
+def search_recipes(parent: Path, ignore: Sequence[str] = DEFAULT_IGNORE, jobs: int = 1) -> List[Path]:
+    found: List[Path] = []
+    for p, res in sorted(walk_vault(parent, has_marker, ignore, jobs).items()):
+        if isinstance(res, Exception):
+            print(f"Could not read {p}: {res}")
+        elif res:
+            found.append(p)
+
+    return found
+
+def _scan_file(p: Path, manifest: Optional[BuildManifest]) -> Tuple[os.stat_result, Optional[FileEntry], Optional[bytes]]:
+    stat = p.stat()
+    if manifest is not None:
+        entry = manifest.lookup(p, stat)
+        if entry is not None and (not entry.is_recipe or entry.recipe is not None):
+            return stat, entry, None
+    return stat, None, read_if_recipe(p, stat.st_size)
+
+def is_ignored_path(parent: Path, path: Path, ignore: Sequence[str]) -> bool:
+    # Whether walk_vault skips path or one of the folders above it
+    try:
+        parts = path.relative_to(parent).parts
+    except ValueError:
+        return True
+    rel = ''
+    for i, name in enumerate(parts):
+        rel += name
+        if is_ignored(name, rel, ignore):
+            return True
+        rel += '/'
+    return False
+
+def _vault_paths(parent: Path, paths: Iterable[Path]) -> Iterator[Path]:
+    # The given paths, absolute or relative to the working directory, written like the ones walk_vault finds
+    # below parent, which are the keys of the manifest. Only the folders are resolved, the file may be gone
+    root = parent.resolve()
+    for p in map(Path, paths):
+        try:
+            yield parent / (p.parent.resolve() / p.name).relative_to(root)
+        except ValueError:
+            print(f"Ignoring change of {p}, it is not in {parent}")
+
+def scan_recipes(parent: Path, manifest: Optional[BuildManifest] = None, jobs: int = 1, stats: Optional[ScanStats] = None,
+                 ignore: Sequence[str] = DEFAULT_IGNORE, only: Optional[Set[Path]] = None,
+                 changed: Optional[Iterable[Path]] = None) -> List[ScannedRecipe]:
+    # Reading is I/O bound, so threads are enough to overlap the file accesses.
+    # Results are sorted by path, which makes the output independent of the number of jobs.
+    # Files not in only are neither opened nor returned, but keep their manifest entries.
+    # With a manifest, changed lists the only files that may differ from it, e.g. as reported by a file watcher
+    def scan(p: Path):
+        return _scan_file(p, manifest) if only is None or p in only else None
+
+    if changed is not None and manifest is not None:
+        # Every other file is taken from the manifest as it is, without listing or stat'ing it.
+        # Recipes that failed to parse last time are read again. Removed and ignored files are dropped
+        changed = set(_vault_paths(parent, changed))
+        scanned: Dict[Path, object] = {}
+        for p, entry in zip(manifest.paths(), manifest.files.values()):
+            if p in changed:
+                continue
+            if entry.is_recipe and entry.recipe is None:
+                changed.add(p)
+            else:
+                scanned[p] = (None, entry, None) if only is None or p in only else None
+        for p in changed:
+            if p.suffix == '.md' and p.is_file() and not is_ignored_path(parent, p, ignore):
+                try:
+                    scanned[p] = scan(p)
+                except OSError as e:
+                    scanned[p] = e
+    else:
+        scanned = walk_vault(parent, scan, ignore, jobs)
+    # Sorting the parts is the same order as sorting the paths, without the slow Path comparison
+    paths = sorted(scanned, key=lambda p: p.parts)
+    if stats is not None:
+        stats.files += len(paths)
+
+    found: List[ScannedRecipe] = []
+    for p in paths:
+        res = scanned[p]
+        if res is None:
+            continue
+        if isinstance(res, Exception):
+            print(f"Could not read {p}: {res}")
+            continue
+        stat, entry, data = res
+        if stats is not None and data is not None:
+            stats.read += 1
+            stats.bytes_read += len(data)
+        if entry is not None:
+            if entry.is_recipe:
+                found.append(ScannedRecipe(p, None))
+            continue
+
+        try:
+            lines = data.decode('utf-8').splitlines() if data is not None else None
+        except UnicodeDecodeError as e:
             print(f"Could not read {p}: {e}")
             continue
-        lines = text.splitlines()
-        if lines and lines[-1].strip() == MARKER:
-            found.append(p)
-    
+
+        if manifest is not None:
+            entry = manifest.record(p, stat, data, data is not None)
+            if entry.recipe is not None:
+                # Only touched, the content is the same as in the last build
+                lines = None
+        if data is not None:
+            found.append(ScannedRecipe(p, lines))
+
+    if manifest is not None:
+        manifest.prune(paths)
     return found
 
 def read_lines(path: Path) -> List[str]:
-    return path.read_text(encoding='utf-8').splitlines()
\ No newline at end of file
+    return path.read_text(encoding='utf-8').splitlines()
@@ -1,4 +1,9 @@
-from typing import Dict, Iterable, List
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import os
 
 # Maximum length of any generated Key. Lower numbers may cause more collisions. 
 # Choose a value < 0 to disable an upper limit!
@@ -8,9 +13,35 @@ class KeyGenError(Exception):
     pass
 
 
+class _PrefixIndex:
+    # Key map that also counts how many keys start with each prefix.
+    # Replaces the scan over all keys per prefix with a dict lookup
+    def __init__(self):
+        self.key_map: Dict[str, str] = {}
+        self.prefix_counts: Dict[str, int] = {}
+
+    def add(self, key: str, item: str) -> None:
+        self.key_map[key] = item
+        for i in range(1, len(key) + 1):
+            prefix = key[:i]
+            self.prefix_counts[prefix] = self.prefix_counts.get(prefix, 0) + 1
+
+    def pop(self, key: str) -> str:
+        for i in range(1, len(key) + 1):
+            prefix = key[:i]
+            self.prefix_counts[prefix] -= 1
+            if not self.prefix_counts[prefix]:
+                del self.prefix_counts[prefix]
+        return self.key_map.pop(key)
+
+    def has_key_starting_with(self, prefix: str) -> bool:
+        return prefix in self.prefix_counts
+
+
 # Maps full strings to a shortend key 
 def get_unique_keys_from_set(items: Iterable[str]) -> Dict[str, str]:
-    key_map: Dict[str, str] = {}
+    index = _PrefixIndex()
+    key_map = index.key_map
     
     # Sort items to get deterministic output
     items = list(items)
@@ -22,8 +53,8 @@ def get_unique_keys_from_set(items: Iterable[str]) -> Dict[str, str]:
             if prefix_len > len(item) or (prefix_len > MAX_KEY_LENGTH and MAX_KEY_LENGTH > 0):
                 break
 
-            simple_conflict = [k for k in key_map.keys() if k.startswith(item[:prefix_len])]
-            hard_conflict = item[:prefix_len] in key_map.keys()
+            simple_conflict = index.has_key_starting_with(item[:prefix_len])
+            hard_conflict = item[:prefix_len] in key_map
 
             if not simple_conflict and not hard_conflict:
                 break
@@ -36,8 +67,8 @@ def get_unique_keys_from_set(items: Iterable[str]) -> Dict[str, str]:
                     raise KeyGenError(f"Cannot get unique key from set. Conflict between '{old_item}' and '{item}'")
                 
                 new_key = old_item[:prefix_len]
-                key_map.pop(old_key)
-                key_map[new_key] = old_item
+                index.pop(old_key)
+                index.add(new_key, old_item)
             else:
                 # only a simple conflict
                 prefix_len += 1
@@ -48,7 +79,7 @@ def get_unique_keys_from_set(items: Iterable[str]) -> Dict[str, str]:
         if (hard_conflict or simple_conflict) and (prefix_len > MAX_KEY_LENGTH and MAX_KEY_LENGTH > 0):
             raise KeyGenError(f"Could not choose a key for {item} that is a maximum of {MAX_KEY_LENGTH} characters long and does not collide with other keys. Try increasing the MAX_KEY_LENGTH or renaming values in your key set")
         
-        key_map[item[:prefix_len]] = item
+        index.add(item[:prefix_len], item)
 
     name_map = dict((v, k) for k, v in key_map.items())
 
@@ -56,4 +87,126 @@ def get_unique_keys_from_set(items: Iterable[str]) -> Dict[str, str]:
         missing = [k for k in items if k not in name_map.keys()]
         raise KeyGenError(f"Failed generating unique keymap! Following entities did not receive a key: {missing}")
     
-    return name_map
\ No newline at end of file
+    return name_map
+
+
+@dataclass
+class KeyConflict:
+    scope: str
+    item: str
+    # Key the item would have received without the registry
+    wanted: str
+    # Registered item that already owns the wanted key
+    holder: str
+    assigned: str
+
+    def __str__(self) -> str:
+        return f"{self.scope}: '{self.item}' got key '{self.assigned}' because '{self.wanted}' belongs to '{self.holder}'"
+
+
+# Like get_unique_keys_from_set, but items in reserved keep their key and new items never get a reserved key
+def get_stable_keys_from_set(items: Iterable[str], reserved: Dict[str, str], scope: str = "") -> Tuple[Dict[str, str], List[KeyConflict]]:
+    items = list(items)
+    new = [i for i in items if i not in reserved]
+    if len(new) == len(items) and not reserved:
+        return get_unique_keys_from_set(items), []
+
+    key_map = {i: reserved[i] for i in items if i in reserved}
+    conflicts: List[KeyConflict] = []
+    if not new:
+        return key_map, conflicts
+
+    owners = dict((k, v) for v, k in reserved.items())
+    for item, key in get_unique_keys_from_set(new).items():
+        if key not in owners:
+            key_map[item] = key
+            owners[key] = item
+            continue
+
+        # Keys of new items are prefix free among each other, so extending one can only collide with a reserved key
+        prefix_len = len(key) + 1
+        while prefix_len <= len(item) and item[:prefix_len] in owners:
+            prefix_len += 1
+        if prefix_len > len(item) or (prefix_len > MAX_KEY_LENGTH and MAX_KEY_LENGTH > 0):
+            raise KeyGenError(f"Could not choose a key for {item} that does not collide with the registered key '{key}' of '{owners[key]}'. Try increasing the MAX_KEY_LENGTH or renaming values in your key set")
+
+        conflicts.append(KeyConflict(scope, item, key, owners[key], item[:prefix_len]))
+        key_map[item] = item[:prefix_len]
+        owners[item[:prefix_len]] = item
+
+    return key_map, conflicts
+
+
+# Bump whenever the layout of the registry file changes
+REGISTRY_VERSION = 1
+REGISTRY_NAME = '.keys.json'
+
+
+class KeyRegistry:
+    # Persists the keys of categories and groupings between builds, so printed keys never change.
+    # Items are never removed, a deleted category or grouping keeps its key reserved
+    def __init__(self, path: Path):
+        self.path = path
+        self.categories: Dict[str, str] = {}
+        self.groupings: Dict[str, Dict[str, str]] = {}
+        self.conflicts: List[KeyConflict] = []
+
+    @classmethod
+    def load(cls, path: Path) -> KeyRegistry:
+        registry = cls(path)
+        try:
+            raw = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return registry
+        if raw.get('version') != REGISTRY_VERSION:
+            raise KeyGenError(f"Unsupported key registry version in {path}: {raw.get('version')}")
+
+        registry.categories = dict(raw.get('categories', {}))
+        registry.groupings = {k: dict(v) for k, v in raw.get('groupings', {}).items()}
+        return registry
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        content = json.dumps({
+            'version': REGISTRY_VERSION,
+            'categories': self.categories,
+            'groupings': self.groupings,
+        }, indent=2, ensure_ascii=False)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(content, encoding='utf-8')
+        os.replace(tmp, self.path)
+
+    def category_keys(self, categories: Iterable[str]) -> Dict[str, str]:
+        keys, conflicts = get_stable_keys_from_set(categories, self.categories, "categories")
+        self.categories.update(keys)
+        self.conflicts.extend(conflicts)
+        return keys
+
+    def grouping_keys(self, category: str, groupings: Iterable[str]) -> Dict[str, str]:
+        registered = self.groupings.setdefault(category, {})
+        keys, conflicts = get_stable_keys_from_set(groupings, registered, category)
+        registered.update(keys)
+        self.conflicts.extend(conflicts)
+        return keys
+
+    def index(self) -> Dict[str, Tuple[str, Optional[str]]]:
+        # Maps printed key prefixes like 'Br' or 'Br-Sw' to the category and grouping
+        index: Dict[str, Tuple[str, Optional[str]]] = {}
+        for category, cat_key in self.categories.items():
+            index[cat_key.capitalize()] = (category, None)
+            for grouping, grp_key in self.groupings.get(category, {}).items():
+                index[f'{cat_key.capitalize()}-{grp_key.capitalize()}'] = (category, grouping)
+        return index
+
+    def lookup(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        # Accepts full recipe keys like 'Br-Sw-P' as well
+        index = self.index()
+        parts = key.split('-')
+        for n in range(min(len(parts), 2), 0, -1):
+            found = index.get('-'.join(parts[:n]))
+            if found is not None:
+                return found
+        return None
+
+    def conflict_report(self) -> str:
+        return '\n'.join(str(c) for c in self.conflicts)
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Set
 from .models import Recipe, LINK_PATTERN
 import re
 
@@ -20,4 +20,29 @@ def replace_links(recipe: Recipe, file_to_recipe_mapper: Dict[str, Recipe]) -> N
 
 def link_buffer(buffer: List[Recipe], file_to_recipe_mapper: Dict[str, Recipe]) -> None:
     for r in buffer:
-        replace_links(r, file_to_recipe_mapper)
\ No newline at end of file
+        replace_links(r, file_to_recipe_mapper)
+
+# Reverse dependencies: link target file name -> file names of the recipes linking to it
+def build_link_index(file_to_recipe_mapper: Dict[str, Recipe]) -> Dict[str, List[str]]:
+    index: Dict[str, List[str]] = {}
+    for name, r in file_to_recipe_mapper.items():
+        for target in sorted(set(r.link_targets())):
+            index.setdefault(target, []).append(name)
+    return index
+
+# Text every link target is replaced with, None for targets without a recipe
+def resolve_link_texts(index: Dict[str, List[str]], file_to_recipe_mapper: Dict[str, Recipe]) -> Dict[str, Optional[str]]:
+    texts: Dict[str, Optional[str]] = {}
+    for target in index:
+        r = file_to_recipe_mapper.get(target)
+        texts[target] = format_link(r.title, r.key) if r is not None else None
+    return texts
+
+def dangling_links(index: Dict[str, List[str]], file_to_recipe_mapper: Dict[str, Recipe]) -> Dict[str, List[str]]:
+    return dict((t, sources) for t, sources in index.items() if t not in file_to_recipe_mapper)
+
+def dependents(index: Dict[str, List[str]], targets: Iterable[str]) -> Set[str]:
+    found: Set[str] = set()
+    for t in targets:
+        found.update(index.get(t, []))
+    return found
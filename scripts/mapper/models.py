@@ -1,12 +1,18 @@
 from __future__ import annotations
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields
 from typing import List, Dict, Any
 import re
+import sys
 
 
 LINK_PATTERN = re.compile(r"\[\[([^\[\]]+)\]\]")
 
-@dataclass
+def format_key(category_id: str, grouping_id: str, title: str) -> str:
+    return f'{category_id.capitalize()}-{grouping_id.capitalize()}-{title[0].upper()}'
+
+
+# Slotted to drop the per-instance __dict__, which matters with 100k recipes held in memory at once
+@dataclass(slots=True)
 class Recipe:
     title: str
     tags: List[str]
@@ -22,11 +28,72 @@ class Recipe:
     hints: List[str] = field(default_factory=list)
     key: str | None = None
 
+    def __post_init__(self) -> None:
+        # These values repeat across many recipes, share one string object per value
+        self.category = sys.intern(self.category)
+        self.grouping = sys.intern(self.grouping)
+        self.tags = [sys.intern(t) for t in self.tags]
+        self.prep_time = sys.intern(self.prep_time)
+        self.cook_time = sys.intern(self.cook_time)
+
+    def __reduce__(self):
+        # Goes through __init__ when unpickled, so recipes from worker processes are interned as well
+        return (type(self), tuple(getattr(self, f) for f in _FIELD_NAMES))
+
     def set_key(self, category_id:str, grouping_id:str) -> None:
-        self.key = f'{category_id.capitalize()}-{grouping_id.capitalize()}-{self.title[0].upper()}'
+        self.key = format_key(category_id, grouping_id, self.title)
     
     def to_json(self) -> Dict[str, Any]:
-        return asdict(self)
+        # Shares the lists instead of deep copying them like asdict. The linker replaces lists instead of
+        # changing them, so a returned dict stays valid. Keys are in field order, as asdict produced them
+        return {
+            'title': self.title,
+            'tags': self.tags,
+            'category': self.category,
+            'grouping': self.grouping,
+            'prep_time': self.prep_time,
+            'cook_time': self.cook_time,
+            'servings': self.servings,
+            'source_url': self.source_url,
+            'last_modified': self.last_modified,
+            'ingredients': self.ingredients,
+            'steps': self.steps,
+            'hints': self.hints,
+            'key': self.key,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> Recipe:
+        return cls(**data)
+
+    def copy(self) -> Recipe:
+        # Shallow copy that skips __init__, the values are interned already.
+        # Like to_json, the lists are shared, as the linker replaces them instead of changing them
+        r = object.__new__(Recipe)
+        for name in _FIELD_NAMES:
+            setattr(r, name, getattr(self, name))
+        return r
     
     def has_links(self) -> bool:
-        return any(LINK_PATTERN.search(s) for s in (self.ingredients + self.steps + self.hints))
\ No newline at end of file
+        # The substring test skips the regex for the many items without a link
+        return any('[[' in s and LINK_PATTERN.search(s) for s in (self.ingredients + self.steps + self.hints))
+
+    def link_targets(self) -> List[str]:
+        return [m.group(1) for s in (self.ingredients + self.steps + self.hints) if '[[' in s for m in LINK_PATTERN.finditer(s)]
+
+
+# Frontmatter and title of a recipe. Enough to select recipes, generate keys and resolve links to them
+@dataclass(slots=True)
+class RecipeHeader:
+    title: str
+    tags: List[str]
+    category: str
+    grouping: str
+    last_modified: str
+    key: str | None = None
+
+    def set_key(self, category_id:str, grouping_id:str) -> None:
+        self.key = format_key(category_id, grouping_id, self.title)
+
+
+_FIELD_NAMES = tuple(f.name for f in fields(Recipe))
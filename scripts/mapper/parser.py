@@ -1,147 +1,243 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from .models import Recipe
+from itertools import compress, count
+from typing import List, Dict, Any, NamedTuple, Optional
+from .models import Recipe, RecipeHeader
 
 class RecipeParserError(Exception):
-    pass
+    def __init__(self, message: str, source: str = "<memory>", line: Optional[int] = None):
+        super().__init__(message)
+        self.source = source
+        self.line = line
+
+    def __reduce__(self):
+        # Keeps source and line when the error is sent back from a worker process
+        return (type(self), (self.args[0], self.source, self.line))
+
+
+_REQUIRED_PROPERTIES = ('title', 'category', 'grouping', 'servings', 'prep_time', 'cook_time')
+# Numbers that start a step, made once instead of for every step of every recipe
+_STEP_PREFIXES = tuple(f'{n}.' for n in range(100))
+
+
+class Lines(NamedTuple):
+    # Stripped non-blank lines of a document. Their line numbers are only needed for an error,
+    # so they are worked out from the document as given when asked for
+    texts: List[str]
+    source: List[str]
+
+    @property
+    def total(self) -> int:
+        # Number of lines in the document including blank ones, reported for an unexpected EOF
+        return len(self.source)
+
+    def number(self, i: int) -> int:
+        # Line number of texts[i], starting at 1
+        if i >= len(self.texts):
+            return self.total
+        return list(compress(count(1), map(str.strip, self.source)))[i]
+
+
+def tokenize(lines: List[str]) -> Lines:
+    # Strips every line once and drops blank lines
+    # Built by C level iterators only, a loop creating one record object per line is several times slower
+    return Lines(list(filter(None, map(str.strip, lines))), lines)
+
 
 class RecipeParser:
     def __init__(self, lines: List[str], source: str = "<memory>"):
-        self.lines = [l.rstrip("\n") for l in lines]
         self.path = source
+        self.lines = tokenize(lines)
         self.properties: Dict[str, Any] = {"tags": []}
+        # Indices into lines.texts of the opening and the closing '---'
+        self.frontmatter = (0, 0)
         self.ingredients: List[str] = []
         self.steps: List[str] = []
         self.hints: List[str] = []
-        self.line_ptr = 0
+        self.pos = 0
+
+    def _error(self, message: str, line: Optional[int]) -> RecipeParserError:
+        return RecipeParserError(f"{self.path}:{line}: {message}", self.path, line)
 
     def _eof(self) -> bool:
-        return self.line_ptr >= len(self.lines)
-    
+        return self.pos >= len(self.lines.texts)
+
     def _current(self) -> str:
-        while not self._eof() and self.lines[self.line_ptr].strip() == "":
-            self.line_ptr += 1
-        if self._eof():
-            raise RecipeParserError(f"Unexpected EOF in {self.path}")
-        return self.lines[self.line_ptr].strip()
-    
-    def _next(self) -> None:
         if self._eof():
-            raise RecipeParserError(f"Unexpected EOF in {self.path}")
-        self.line_ptr += 1
-
-    def _line_equals(self, equals: str) -> bool:
-        return self._current() == equals.strip()
-    
-    def _line_starts_with(self, starts_with: str) -> bool:
-        return self._current().startswith(starts_with)
-    
+            raise self._error("Unexpected EOF", self.lines.total)
+        return self.lines.texts[self.pos]
+
+    def _line_number(self) -> int:
+        return self.lines.number(self.pos)
+
     def _assert_line_equals(self, equals: str) -> None:
-        if self._line_equals(equals):
-            return
-        raise RecipeParserError(f"Unexpected line in {self.path}. Expected: '{equals}'; Got: '{self._current()}'")
-    
-    def _assert_line_starts_with(self, starts_with: str) -> None:
-        if self._line_starts_with(starts_with):
+        pos = self.pos
+        texts = self.lines.texts
+        if pos < len(texts) and texts[pos] == equals:
             return
-        raise RecipeParserError(f"Unexpected start of line in {self.path}. Expected: '{starts_with}'; Got: '{self._current()}'")
-    
-    def parse(self) -> Recipe:
-        self._expect_and_parse_section('---', self._parse_props)
-        self._assert_required_props()
-        
-        # Title
-        self._assert_line_starts_with('# ')
-        self.properties['title'] = self._current()[2:].strip()
-        self._next()
+        cur = self._current()
+        raise self._error(f"Unexpected line. Expected: '{equals}'; Got: '{cur}'", self._line_number())
 
-        self._expect_and_parse_section('## Zutaten', self._parse_ingredients)
-        self._expect_and_parse_section('## Schritte', self._parse_steps)
-        self._expect_and_parse_section('## Hinweise', self._parse_hints)
+    def _assert_line_starts_with(self, starts_with: str) -> str:
+        pos = self.pos
+        texts = self.lines.texts
+        if pos < len(texts) and texts[pos].startswith(starts_with):
+            return texts[pos]
+        cur = self._current()
+        raise self._error(f"Unexpected start of line. Expected: '{starts_with}'; Got: '{cur}'", self._line_number())
 
-        return Recipe(
+    def parse_header(self) -> RecipeHeader:
+        # Stops after the title, the sections are not checked
+        self._parse_frontmatter_and_title()
+        return RecipeHeader(
             title=self.properties['title'],
             tags=self.properties.get('tags', []),
             category=self.properties['category'],
             grouping=self.properties['grouping'],
-            prep_time=self.properties['prep_time'],
-            cook_time=self.properties['cook_time'],
-            servings=int(self.properties['servings']),
-            source_url=self.properties.get('source_url', ''),
             last_modified=self.properties.get('last_modified', ''),
-            ingredients=self.ingredients,
-            steps=self.steps,
-            hints=self.hints
         )
-    
-    def _expect_and_parse_section(self, header: str, func):
+
+    def parse(self) -> Recipe:
+        self._parse_frontmatter_and_title()
+
+        self._assert_line_equals('## Zutaten')
+        self.pos += 1
+        self._parse_ingredients()
+        self._expect_section('## Schritte')
+        self._parse_steps()
+        self._expect_section('## Hinweise')
+        self._parse_hints()
+
+        # Positional, in the order of the fields, which is measurably faster than by keyword
+        properties = self.properties
+        return Recipe(
+            properties['title'],
+            properties['tags'],
+            properties['category'],
+            properties['grouping'],
+            properties['prep_time'],
+            properties['cook_time'],
+            int(properties['servings']),
+            properties.get('source_url', ''),
+            properties.get('last_modified', ''),
+            self.ingredients,
+            self.steps,
+            self.hints,
+        )
+
+    def _parse_frontmatter_and_title(self):
+        self._assert_line_equals('---')
+        self.pos += 1
+        self._parse_props()
+        self._assert_required_props()
+
+        # Title
+        self.properties['title'] = self._assert_line_starts_with('# ')[2:].strip()
+        self.pos += 1
+
+    def _expect_section(self, header: str) -> None:
+        # The section before ends on the first '## ' heading, which has to be header. Moves past it
+        pos = self.pos
+        texts = self.lines.texts
+        if pos < len(texts) and texts[pos] == header:
+            self.pos = pos + 1
+            return
+        self._assert_line_starts_with('## ')
         self._assert_line_equals(header)
-        func()
 
     def _parse_props(self):
-        self._next()
-        while not self._line_equals('---'):
-            if self._line_starts_with('tags:'):
-                # tags header -> Collect following lines of tags
-                self._next()
-                while self._line_starts_with('- '):
-                    self.properties['tags'].append(self._current()[1:].strip())
-                    self._next()
+        # current line is the one after the opening '---'
+        texts = self.lines.texts
+        properties = self.properties
+        try:
+            end = texts.index('---', self.pos)
+        except ValueError:
+            raise self._error("Unexpected EOF", self.lines.total) from None
+        self.frontmatter = (self.pos - 1, end)
+
+        pos = self.pos
+        while pos < end:
+            key, sep, val = texts[pos].partition(':')
+            pos += 1
+            if not sep:
                 continue
-            if ':' not in self._current():
-                self._next()
+            if key == 'tags':
+                # tags header -> Collect following lines of tags
+                while pos < end and texts[pos].startswith('- '):
+                    properties['tags'].append(texts[pos][1:].strip())
+                    pos += 1
                 continue
 
-            key, val = self._current().split(':', 1)
-            self.properties[key.strip()] = val.strip().strip('"')
-            self._next()
+            key = key.strip()
+            properties[key] = val.strip().strip('"')
 
-        self._assert_line_equals('---')
-        self._next()
+        # closing '---'
+        self.pos = end + 1
+
+    def _property_line(self, key: str) -> int:
+        # Line number of a property, only looked up for an error. The last line of a key is the one in effect
+        start, end = self.frontmatter
+        texts = self.lines.texts
+        for pos in range(end - 1, start, -1):
+            name, sep, _ = texts[pos].partition(':')
+            if sep and name.strip() == key:
+                return self.lines.number(pos)
+        return self.lines.number(start)
 
     def _assert_required_props(self):
-        required = ('title', 'category', 'grouping', 'servings', 'prep_time', 'cook_time')
-        missing = [k for k in required if k not in self.properties]
-        if missing:
-            raise RecipeParserError(f"Missing required properties in recipe at {self.path}: {missing}\nFound only {self.properties}")
-        if not self.properties['servings'].isdigit():
-            raise RecipeParserError(f"Invalid value for servings in recipe at {self.path}: {self.properties['servings']}")
-        
+        properties = self.properties
+        if not all(map(properties.__contains__, _REQUIRED_PROPERTIES)):
+            missing = [k for k in _REQUIRED_PROPERTIES if k not in properties]
+            raise self._error(f"Missing required properties {missing} in recipe\nFound only {properties}", self.lines.number(self.frontmatter[0]))
+        if not properties['servings'].isdigit():
+            raise self._error(f"Invalid value for servings in recipe: {properties['servings']}", self._property_line('servings'))
+
     def _parse_ingredients(self):
-        # current line '## Zutaten'
-        self._next()
-        while not self._eof() and (self._line_starts_with('- ') or self._line_starts_with('### ')):
-            cur = self._current()
-            if self._line_starts_with('### '):
-                cur = '===' + cur[3:]
-            self.ingredients.append(cur)
-            self._next()
+        # current line is the one after '## Zutaten'
+        texts = self.lines.texts
+        ingredients = self.ingredients
+        pos, end = self.pos, len(texts)
+        while pos < end:
+            text = texts[pos]
+            if text.startswith('- '):
+                ingredients.append(text)
+            elif text.startswith('### '):
+                ingredients.append('===' + text[3:])
+            else:
+                break
+            pos += 1
 
-        self._assert_line_starts_with('## ')
+        self.pos = pos
 
     def _parse_steps(self):
-        # current line '## Schritte'
-        self._next()
+        # current line is the one after '## Schritte'
+        texts = self.lines.texts
+        steps = self.steps
         cur_step = 1
-        while not self._eof() and not self._line_starts_with('## '):
-            cur = self._current()
-            if self._line_starts_with(f'{cur_step}.'):
-                cur = '+ ' + cur[len(f'{cur_step}.'):].strip()
-                self.steps.append(cur)
+        prefix = '1.'
+        pos, end = self.pos, len(texts)
+        while pos < end:
+            text = texts[pos]
+            # Numbered lines are the most frequent, checked first
+            if text.startswith(prefix):
+                steps.append('+ ' + text[len(prefix):].strip())
                 cur_step += 1
+                prefix = _STEP_PREFIXES[cur_step] if cur_step < len(_STEP_PREFIXES) else f'{cur_step}.'
+            elif text.startswith('## '):
+                break
+            elif not steps:
+                steps.append(text)
             else:
-                if not self.steps:
-                    self.steps.append(cur)
-                else:
-                    self.steps[-1] += "\n" + cur
-            
-            self._next()
+                steps[-1] += "\n" + text
+            pos += 1
 
-        self._assert_line_starts_with('## ')
+        self.pos = pos
 
     def _parse_hints(self):
-        # current line '## Hinweise'
-        self._next()
-        while not self._eof() and not self._line_starts_with('## '):
-            self.hints.append(self._current())
-            self._next()
\ No newline at end of file
+        # current line is the one after '## Hinweise'
+        texts = self.lines.texts
+        hints = self.hints
+        pos, end = self.pos, len(texts)
+        while pos < end and not texts[pos].startswith('## '):
+            hints.append(texts[pos])
+            pos += 1
+        self.pos = pos
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import List, Tuple
+import hashlib
+import os
+import shutil
+
+from .cache import content_digest
+
+# Bump whenever the key layout changes, so old objects are never returned for new keys
+PDF_CACHE_VERSION = 1
+PDF_CACHE_NAME = '.pdf-cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def sources_digest(typst_dir: Path) -> str:
+    # main.typ and everything below template/, in a stable order and with their relative paths,
+    # so renaming or moving a file changes the digest as well
+    h = hashlib.sha256()
+    files = [typst_dir / 'main.typ', *sorted(p for p in (typst_dir / 'template').rglob('*') if p.is_file())]
+    for f in files:
+        if not f.exists():
+            continue
+        h.update(f.relative_to(typst_dir).as_posix().encode('utf-8') + b'\0')
+        h.update(f.read_bytes() + b'\0')
+    return h.hexdigest()
+
+
+def compile_key(data_file: Path, stamp: str) -> str:
+    # stamp holds the typst inputs and the sources digest, see CompileOptions.stamp
+    return content_digest(f'{PDF_CACHE_VERSION}\0{stamp}\0'.encode('utf-8') + data_file.read_bytes())
+
+
+class PdfCache:
+    # Content-addressed store of compiled PDFs. Once it exceeds max_bytes, the least recently used ones are evicted
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _object(self, key: str) -> Path:
+        return self.root / key[:2] / f'{key}.pdf'
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        obj = self._object(key)
+        try:
+            shutil.copyfile(obj, dest)
+        except FileNotFoundError:
+            return False
+        # The mtime of an object is its last use, atime is not reliable with relatime or noatime mounts
+        os.utime(obj)
+        return True
+
+    def store(self, key: str, src: Path) -> None:
+        obj = self._object(key)
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        # Copy to a temp file first so a concurrent fetch never sees a partial PDF
+        tmp = obj.with_name(f'{obj.name}.{os.getpid()}.tmp')
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, obj)
+
+    def objects(self) -> List[Tuple[int, int, Path]]:
+        # (mtime_ns, size, path) of every object
+        if not self.root.exists():
+            return []
+        result = []
+        for obj in self.root.glob('*/*.pdf'):
+            try:
+                st = obj.stat()
+            except FileNotFoundError:
+                continue
+            result.append((st.st_mtime_ns, st.st_size, obj))
+        return result
+
+    def evict(self) -> int:
+        # Removes the least recently used objects until the cache fits into max_bytes. Returns the number removed
+        objects = sorted(self.objects())
+        total = sum(size for _, size, _ in objects)
+        removed = 0
+        for _, size, obj in objects:
+            if total <= self.max_bytes:
+                break
+            obj.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
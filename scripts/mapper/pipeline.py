@@ -0,0 +1,153 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from .cache import BuildManifest
+from .io import DEFAULT_IGNORE, ScannedRecipe, read_header_lines, read_lines, walk_vault
+from .keygen import KeyRegistry
+from .linker import dependents
+from .models import Recipe, RecipeHeader
+from .parser import RecipeParser, RecipeParserError
+from .timing import Timings
+
+
+@dataclass
+class ParseResult:
+    # Recipes in scan order, independent of the number of workers
+    recipes: List[Tuple[Path, Recipe]] = field(default_factory=list)
+    errors: List[Tuple[Path, RecipeParserError]] = field(default_factory=list)
+    reused: int = 0
+    # Files that were parsed in this run instead of being taken from the manifest
+    fresh: Set[Path] = field(default_factory=set)
+
+
+def _parse(job: Tuple[List[str], str]) -> Tuple[Union[Recipe, RecipeParserError], float, float]:
+    # Runs in a worker process. Errors are returned instead of raised so one bad file does not stop the others
+    # Returns the perf_counter at the start and the duration along with the result
+    lines, source = job
+    start = time.perf_counter()
+    try:
+        r = RecipeParser(lines, source=source).parse()
+    except RecipeParserError as e:
+        r = e
+    return r, start, time.perf_counter() - start
+
+
+def parse_recipes(scanned: Sequence[ScannedRecipe], manifest: Optional[BuildManifest] = None, jobs: int = 1, timings: Optional[Timings] = None) -> ParseResult:
+    result = ParseResult()
+
+    pending: List[Tuple[int, Path, List[str]]] = []
+    slots: List[Optional[Recipe]] = []
+    for p, lines in scanned:
+        r = manifest.cached_recipe(p) if manifest is not None and lines is None else None
+        if r is None:
+            pending.append((len(slots), p, lines))
+        else:
+            result.reused += 1
+        slots.append(r)
+
+    work = [(lines, str(p)) for _, p, lines in pending]
+    if jobs > 1 and len(work) > 1:
+        chunksize = max(1, len(work) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            parsed = list(executor.map(_parse, work, chunksize=chunksize))
+    else:
+        parsed = [_parse(w) for w in work]
+
+    for (i, p, _), (r, start, seconds) in zip(pending, parsed):
+        if timings is not None:
+            timings.file('parse', p.name, start, seconds)
+        if isinstance(r, RecipeParserError):
+            result.errors.append((p, r))
+            continue
+        slots[i] = r
+        result.fresh.add(p)
+        if manifest is not None:
+            manifest.store_recipe(p, r)
+
+    result.recipes = [(s.path, r) for s, r in zip(scanned, slots) if r is not None]
+    return result
+
+
+class LazyRecipe:
+    # Header of a recipe file, read without the body. Every other Recipe attribute parses the whole file on
+    # first access, so listing, key assignment and selection only read the frontmatter and title of every file
+    __slots__ = ('path', 'header', '_recipe')
+
+    def __init__(self, path: Path, header: RecipeHeader):
+        self.path = path
+        self.header = header
+        self._recipe: Optional[Recipe] = None
+
+    title = property(lambda self: self.header.title)
+    tags = property(lambda self: self.header.tags)
+    category = property(lambda self: self.header.category)
+    grouping = property(lambda self: self.header.grouping)
+    last_modified = property(lambda self: self.header.last_modified)
+    key = property(lambda self: self.header.key)
+
+    def set_key(self, category_id: str, grouping_id: str) -> None:
+        self.header.set_key(category_id, grouping_id)
+        if self._recipe is not None:
+            self._recipe.key = self.header.key
+
+    def load(self) -> Recipe:
+        if self._recipe is None:
+            recipe = RecipeParser(read_lines(self.path), source=str(self.path)).parse()
+            recipe.key = self.header.key
+            self._recipe = recipe
+        return self._recipe
+
+    def __getattr__(self, name: str):
+        # Only called for attributes that are not defined above
+        return getattr(self.load(), name)
+
+
+def _read_header(p: Path) -> Optional[LazyRecipe]:
+    # None for notes without the marker
+    lines = read_header_lines(p, p.stat().st_size)
+    if lines is None:
+        return None
+    return LazyRecipe(p, RecipeParser(lines, source=str(p)).parse_header())
+
+
+def scan_headers(parent: Path, ignore: Sequence[str] = DEFAULT_IGNORE, io_threads: int = 1) -> Tuple[List[Tuple[Path, LazyRecipe]], List[Tuple[Path, RecipeParserError]]]:
+    # Lazy recipes of the whole vault in path order, with only the frontmatter and title read from disk
+    headers: List[Tuple[Path, LazyRecipe]] = []
+    errors: List[Tuple[Path, RecipeParserError]] = []
+    for p, res in sorted(walk_vault(parent, _read_header, ignore, io_threads).items()):
+        if isinstance(res, RecipeParserError):
+            errors.append((p, res))
+        elif isinstance(res, Exception):
+            print(f"Could not read {p}: {res}")
+        elif res is not None:
+            headers.append((p, res))
+    return headers, errors
+
+
+def assign_keys(keys: KeyRegistry, categories: Dict[str, Sequence[Union[Recipe, RecipeHeader]]]) -> None:
+    category_keys = keys.category_keys(categories.keys())
+    for cat, rs in categories.items():
+        unique_groupings = set([r.grouping for r in rs])
+        grouping_keys = keys.grouping_keys(cat, unique_groupings)
+
+        for r in rs:
+            r.set_key(category_keys[r.category], grouping_keys[r.grouping])
+
+
+def dirty_categories(manifest: BuildManifest, parsed: ParseResult, members: Dict[str, List[str]], link_index: Dict[str, List[str]], link_texts: Dict[str, Optional[str]], existing: Set[str]) -> Set[str]:
+    # A category has to be linked and exported again if one of its recipes changed, got a new key
+    # or links to a recipe whose title or key changed, or if recipes were added or removed
+    dirty: Set[str] = set()
+    for p, r in parsed.recipes:
+        if p in parsed.fresh or manifest.recipe_key(p) != r.key:
+            dirty.add(p.stem)
+
+    changed_targets = [t for t, text in link_texts.items() if t not in manifest.link_texts or manifest.link_texts[t] != text]
+    dirty |= dependents(link_index, changed_targets)
+
+    return set(cat for cat, names in members.items()
+               if cat not in existing or manifest.members.get(cat) != names or any(n in dirty for n in names))
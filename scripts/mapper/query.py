@@ -0,0 +1,59 @@
+from pathlib import Path
+import argparse
+import json
+import sys
+import time
+
+from .index import RecipeIndex, RecipeIndexError, INDEX_NAME
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search the recipe index written by mapper.cli --index")
+    parser.add_argument("text", nargs="?", help="Full text search over titles, tags, ingredients, steps and hints")
+    parser.add_argument("-o", "--output", default=Path("."), help=f"Output path of mapper.cli, the index is read from <output>/{INDEX_NAME}", type=Path)
+    parser.add_argument("--index", help="Path of the index, overrides --output", type=Path)
+    parser.add_argument("-t", "--tag", action="append", default=[], help="Only recipes with this tag. Can be given multiple times")
+    parser.add_argument("-g", "--ingredient", action="append", default=[], help="Only recipes with an ingredient starting with this word. Can be given multiple times")
+    parser.add_argument("--category", help="Only recipes of this category")
+    parser.add_argument("--grouping", help="Only recipes of this grouping")
+    parser.add_argument("--max-prep", help="Maximum preparation time in minutes", type=int)
+    parser.add_argument("--max-cook", help="Maximum cooking time in minutes", type=int)
+    parser.add_argument("--max-time", help="Maximum preparation and cooking time in minutes", type=int)
+    parser.add_argument("-n", "--limit", help="Maximum number of results", type=int)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    return parser.parse_args(argv)
+
+
+def _minutes(value) -> str:
+    return f'{value} min' if value is not None else '?'
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    try:
+        index = RecipeIndex.open_existing(args.index or args.output / INDEX_NAME)
+    except RecipeIndexError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    try:
+        results = index.search(tags=args.tag, ingredients=args.ingredient, text=args.text, category=args.category,
+                               grouping=args.grouping, max_prep=args.max_prep, max_cook=args.max_cook,
+                               max_total=args.max_time, limit=args.limit)
+    finally:
+        index.close()
+    seconds = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps([r.__dict__ for r in results], indent=2, ensure_ascii=False))
+        return 0
+
+    for r in results:
+        print(f'{r.key or "-":<12} {r.title}\t{r.category} / {r.grouping}\t{_minutes(r.prep_minutes)} + {_minutes(r.cook_minutes)}')
+    print(f'{len(results)} recipes in {seconds * 1000:.1f} ms', file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
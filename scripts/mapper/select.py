@@ -0,0 +1,69 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date
+from typing import List, Optional, Union
+import argparse
+
+from .models import Recipe, RecipeHeader
+
+
+@dataclass
+class RecipeFilter:
+    # A recipe is selected if it matches every given option and any of the values given for one option
+    categories: List[str] = field(default_factory=list)
+    groupings: List[str] = field(default_factory=list)
+    # Compared case insensitive
+    tags: List[str] = field(default_factory=list)
+    # Full keys like 'Br-Sw-P' or prefixes of whole parts like 'Br' or 'Br-Sw'
+    keys: List[str] = field(default_factory=list)
+    # Recipes whose last_modified is on or after this day. Recipes without a valid date are not selected
+    changed_since: Optional[date] = None
+
+    def active(self) -> bool:
+        return bool(self.categories or self.groupings or self.tags or self.keys or self.changed_since)
+
+    def matches(self, r: Union[Recipe, RecipeHeader]) -> bool:
+        if self.categories and r.category not in self.categories:
+            return False
+        if self.groupings and r.grouping not in self.groupings:
+            return False
+        if self.tags:
+            wanted = set(t.casefold() for t in self.tags)
+            if not any(t.casefold() in wanted for t in r.tags):
+                return False
+        if self.keys and not any(_key_matches(r.key, k) for k in self.keys):
+            return False
+        if self.changed_since is not None:
+            modified = parse_date(r.last_modified)
+            if modified is None or modified < self.changed_since:
+                return False
+        return True
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> RecipeFilter:
+        return cls(args.category, args.grouping, args.tag, args.key, args.changed_since)
+
+
+def _key_matches(key: Optional[str], wanted: str) -> bool:
+    return key is not None and (key == wanted or key.startswith(wanted + '-'))
+
+def parse_date(text: str) -> Optional[date]:
+    # Accepts dates like '2025-01-21' and timestamps starting with one
+    try:
+        return date.fromisoformat(text.strip()[:10])
+    except ValueError:
+        return None
+
+def _date_argument(text: str) -> date:
+    d = parse_date(text)
+    if d is None:
+        raise argparse.ArgumentTypeError(f"Invalid date '{text}', expected YYYY-MM-DD")
+    return d
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("selection", "Only export the matching recipes. Links to other recipes are still resolved")
+    group.add_argument("--category", action="append", default=[], help="Only recipes of this category. Can be given multiple times")
+    group.add_argument("--grouping", action="append", default=[], help="Only recipes of this grouping. Can be given multiple times")
+    group.add_argument("--tag", action="append", default=[], help="Only recipes with this tag. Can be given multiple times")
+    group.add_argument("--key", action="append", default=[], help="Only recipes with this key or key prefix like Br or Br-Sw. Can be given multiple times")
+    group.add_argument("--changed-since", type=_date_argument, help="Only recipes whose last_modified is on or after this date (YYYY-MM-DD)")
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import os
+import sys
+import time
+
+from .api import Builder, BuildResult
+from .build import parse_formats
+from .export import EXPORT_FORMATS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local build server that keeps the parsed vault in memory between builds")
+    parser.add_argument("-i", "--input", required=True, help="Parent path where the recipe markdown files are located", type=Path)
+    parser.add_argument("-o", "--output", required=True, help="Output path, the category files are written to <output>/json and the PDFs to <output>/pdf", type=Path)
+    parser.add_argument("-f", "--format", default=["cards"], type=parse_formats, help="Layout of the PDFs, several comma separated like cards,a5")
+    parser.add_argument("-k", "--include-keys", action="store_true", help="Print the recipe keys on the a5 sheets")
+    parser.add_argument("--export-format", default="json", choices=EXPORT_FORMATS, help="Encoding of the category files")
+    parser.add_argument("-j", "--jobs", default=os.cpu_count() or 1, help="Number of parallel typst processes and parser workers", type=int)
+    parser.add_argument("--typst", default="typst", help="Typst executable")
+    parser.add_argument("--no-pdf", action="store_true", help="Only write the category files")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Anyone who can reach it can trigger builds")
+    parser.add_argument("--port", default=8765, type=int)
+
+    return parser.parse_args(argv)
+
+
+class BuildServer(ThreadingHTTPServer):
+    # POST /build runs a build and answers with the BuildResult as JSON, GET /status returns the last one.
+    # A JSON body {"changed": ["vault/Soup.md", ...]} limits the build to those files, see Builder.build
+    daemon_threads = True
+
+    def __init__(self, address, builder: Builder):
+        super().__init__(address, BuildRequestHandler)
+        self.builder = builder
+        self.builds = 0
+        self.last: Optional[BuildResult] = None
+
+    def run_build(self, changed: Optional[List[Path]] = None) -> BuildResult:
+        result = self.builder.build(changed)
+        self.builds += 1
+        self.last = result
+        return result
+
+
+class BuildRequestHandler(BaseHTTPRequestHandler):
+    server: BuildServer
+
+    def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/status':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        last = self.server.last
+        self._send_json(200, {
+            'builds': self.server.builds,
+            'building': self.server.builder.lock.locked(),
+            'last': last.to_json() if last is not None else None,
+        })
+
+    def do_POST(self):
+        if self.path != '/build':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        changed = None
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            try:
+                changed = [Path(p) for p in json.loads(self.rfile.read(length))['changed']]
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json(400, {'error': f'Expected {{"changed": [paths]}}: {e}'})
+                return
+        result = self.server.run_build(changed)
+        status = 'ok' if result.ok else f'FAILED: {result.error or ", ".join(result.failed)}'
+        print(f'Build {self.server.builds}: {status}, {len(result.changed)} categories changed, '
+              f'{len(result.compiled)} compiled in {result.seconds * 1000:.0f} ms', flush=True)
+        self._send_json(200, result.to_json())
+
+    def log_message(self, format, *args):
+        # Builds are reported by do_POST, the access log would only repeat them
+        pass
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    builder = Builder(args.input, args.output, args.format, args.include_keys, args.export_format, args.jobs, args.typst, not args.no_pdf)
+
+    start = time.perf_counter()
+    result = builder.build()
+    print(f'Initial build: {"ok" if result.ok else "FAILED"} in {time.perf_counter() - start:.2f}s')
+    if not result.ok:
+        print(result.log)
+
+    server = BuildServer((args.host, args.port), builder)
+    server.builds, server.last = 1, result
+    host, port = server.server_address[:2]
+    print(f'Listening on http://{host}:{port}, trigger builds with: curl -X POST http://{host}:{port}/build')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .cache import BuildManifest
+from .export import EXPORT_SUFFIXES, CategoryWriter, category_files
+from .io import DEFAULT_IGNORE, read_lines
+from .keygen import KeyGenError, KeyRegistry, REGISTRY_NAME
+from .linker import replace_links
+from .models import Recipe
+from .parser import RecipeParser, RecipeParserError
+from .pipeline import LazyRecipe, assign_keys, scan_headers
+from .select import RecipeFilter
+from .timing import Timings
+
+
+def _parse_file(path: str) -> Union[Recipe, RecipeParserError]:
+    # Runs in a worker process, errors are returned like in pipeline._parse
+    try:
+        return RecipeParser(read_lines(Path(path)), source=path).parse()
+    except RecipeParserError as e:
+        return e
+
+
+def _parsed(paths: Sequence[Path], executor: Optional[ProcessPoolExecutor], jobs: int) -> Iterator[Union[Recipe, RecipeParserError]]:
+    # Results in the order of paths. With workers, at most one category is parsed ahead of the writer
+    if executor is None:
+        return (_parse_file(str(p)) for p in paths)
+    return executor.map(_parse_file, [str(p) for p in paths], chunksize=max(1, len(paths) // (jobs * 4)))
+
+
+def convert_streaming(input_path: Path, output_path: Path, manifest: Optional[BuildManifest] = None, jobs: int = 1,
+                      registry: Optional[KeyRegistry] = None, fmt: str = 'json', selection: Optional[RecipeFilter] = None,
+                      timings: Optional[Timings] = None, ignore: Sequence[str] = DEFAULT_IGNORE, io_threads: int = 1) -> List[str]:
+    # Two passes over the vault. The first one only reads the header of every recipe, the second one parses, links and
+    # appends the recipes of one category after the other to their file. Produces the same files as cli.convert,
+    # but never holds more than the headers and the recipes being written. The manifest only keeps the digests
+    # of the category files, so the next incremental build parses everything again
+    timings = timings if timings is not None else Timings()
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    print('Reading recipe headers...')
+    with timings.stage('headers') as stage:
+        headers, errors = scan_headers(input_path, ignore, io_threads)
+        stage.files = len(headers) + len(errors)
+    if errors:
+        for _, e in errors:
+            print(f"Failed parsing recipe {e}")
+        raise RecipeParserError(f"Failed parsing {len(errors)} of {len(headers) + len(errors)} recipes")
+    print(f'Found {len(headers)} recipe files!')
+
+    with timings.stage('keygen'):
+        grouped: Dict[str, List[Tuple[Path, LazyRecipe]]] = {}
+        for p, h in headers:
+            grouped.setdefault(h.category, []).append((p, h))
+        for entries in grouped.values():
+            entries.sort(key=lambda e: (e[1].grouping, e[1].title))
+        keys = registry if registry is not None else KeyRegistry(output_path / REGISTRY_NAME)
+        try:
+            assign_keys(keys, dict((cat, [h for _, h in entries]) for cat, entries in grouped.items()))
+        except KeyGenError as e:
+            print(f"Failed generating Keys! {e}")
+            raise
+    if keys.conflicts:
+        print('Some new keys differ from a fresh build to keep the registered keys stable:')
+        print(keys.conflict_report())
+
+    link_targets: Dict[str, LazyRecipe] = dict((p.with_suffix('').name, h) for p, h in headers)
+    selective = selection is not None and selection.active()
+    if selective:
+        grouped = dict((cat, [(p, h) for p, h in entries if selection.matches(h)]) for cat, entries in grouped.items())
+        grouped = dict((cat, entries) for cat, entries in grouped.items() if entries)
+        print(f'Selected {sum(len(e) for e in grouped.values())} of {len(headers)} recipes')
+
+    print(f'Exporting {fmt} files to {output_path}...')
+    changed: List[str] = []
+    digests: Dict[str, str] = {}
+    failed: List[RecipeParserError] = []
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    with timings.stage('stream') as stage:
+        try:
+            for category, entries in grouped.items():
+                filename = output_path / f"{category}{EXPORT_SUFFIXES[fmt]}"
+                writer = CategoryWriter(filename, fmt, len(entries))
+                ok = True
+                for (p, h), r in zip(entries, _parsed([p for p, _ in entries], executor, jobs)):
+                    if isinstance(r, RecipeParserError):
+                        failed.append(r)
+                        ok = False
+                        continue
+                    r.key = h.key
+                    replace_links(r, link_targets)
+                    if ok:
+                        writer.append(r)
+                    stage.files += 1
+                if not ok:
+                    writer.abort()
+                    continue
+
+                previous = manifest.categories.get(category) if manifest is not None else None
+                digest, written = writer.close(previous)
+                digests[category] = digest
+                if not written:
+                    print(f'Unchanged {category}')
+                    continue
+                print(f'Writing {category} to {filename}')
+                stage.bytes += filename.stat().st_size
+                for other in category_files(output_path, category):
+                    if other != filename:
+                        other.unlink(missing_ok=True)
+                changed.append(category)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    if failed:
+        for e in failed:
+            print(f"Failed parsing recipe {e}")
+        raise RecipeParserError(f"Failed parsing {len(failed)} of {len(headers)} recipes")
+
+    with timings.stage('save'):
+        if manifest is not None:
+            for category in manifest.categories.keys() - digests.keys():
+                # The files of unselected categories are kept as they are
+                if selective:
+                    digests[category] = manifest.categories[category]
+                    continue
+                for filename in category_files(output_path, category):
+                    if filename.exists():
+                        print(f'Removing stale {filename}')
+                        filename.unlink()
+                changed.append(category)
+            # Parsed recipes, members and links are not kept, so an incremental build starts from scratch
+            manifest.update(files={}, members={}, links={}, link_texts={}, categories=digests, export_format=fmt, servings=None)
+            manifest.save()
+        if registry is not None:
+            registry.save()
+    return changed
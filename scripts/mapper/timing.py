@@ -0,0 +1,124 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import cProfile
+import json
+import os
+import time
+
+TIMING_FORMATS = ('json', 'chrome')
+
+
+def _cpu_time() -> float:
+    # Includes finished child processes, so the CPU time of the parser workers is counted once the pool is shut down
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+@dataclass
+class StageTiming:
+    name: str
+    # Seconds since the Timings were created
+    start: float
+    wall: float = 0.0
+    cpu: float = 0.0
+    files: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class FileTiming:
+    stage: str
+    name: str
+    # Seconds since the Timings were created. time.perf_counter is system wide on Linux and macOS,
+    # so timings taken in worker processes line up with the ones of the main process
+    start: float
+    seconds: float
+
+
+class Timings:
+    def __init__(self, profiler: Optional[cProfile.Profile] = None):
+        self.origin = time.perf_counter()
+        self.stages: List[StageTiming] = []
+        self.files: List[FileTiming] = []
+        # Only enabled inside profile(), which wraps the parser loop
+        self.profiler = profiler
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageTiming]:
+        record = StageTiming(name, time.perf_counter() - self.origin)
+        cpu = _cpu_time()
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter() - self.origin - record.start
+            record.cpu = _cpu_time() - cpu
+            self.stages.append(record)
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        if self.profiler is None:
+            yield
+            return
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+
+    def file(self, stage: str, name: str, start: float, seconds: float) -> None:
+        # start is a time.perf_counter() value
+        self.files.append(FileTiming(stage, name, start - self.origin, seconds))
+
+    def slowest(self, count: int = 10) -> List[FileTiming]:
+        return sorted(self.files, key=lambda f: f.seconds, reverse=True)[:count]
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<10} {'wall':>9} {'cpu':>9} {'files':>8} {'bytes':>12}"]
+        for s in self.stages:
+            lines.append(f"{s.name:<10} {s.wall:>8.3f}s {s.cpu:>8.3f}s {s.files:>8} {s.bytes:>12}")
+        slowest = self.slowest(5)
+        if slowest:
+            lines.append('slowest files:')
+            lines.extend(f'\t{f.seconds * 1000:>8.2f} ms {f.stage} {f.name}' for f in slowest)
+        return '\n'.join(lines)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'stages': [asdict(s) for s in self.stages],
+            'files': [asdict(f) for f in self.files],
+        }
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        # Trace event format, open it in chrome://tracing or https://ui.perfetto.dev
+        # Stages are drawn on the first row, file events on as many rows below as overlap at once
+        us = 1e6
+        events: List[Dict[str, Any]] = []
+        for s in self.stages:
+            events.append({'name': s.name, 'cat': 'stage', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': s.start * us, 'dur': s.wall * us,
+                           'args': {'cpu': s.cpu, 'files': s.files, 'bytes': s.bytes}})
+
+        lanes: List[float] = []
+        for f in sorted(self.files, key=lambda f: f.start):
+            lane = next((i for i, end in enumerate(lanes) if end <= f.start), len(lanes))
+            if lane == len(lanes):
+                lanes.append(0.0)
+            lanes[lane] = f.start + f.seconds
+            events.append({'name': f.name, 'cat': f.stage, 'ph': 'X', 'pid': 0, 'tid': lane + 1,
+                           'ts': f.start * us, 'dur': f.seconds * us})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path: Path, fmt: str = 'json') -> None:
+        data = self.to_chrome_trace() if fmt == 'chrome' else self.to_json()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data, indent=2), encoding='utf-8')
+
+
+def add_timing_arguments(parser, profile: bool = True) -> None:
+    parser.add_argument("--timings", help="Write wall and CPU time, file counts and bytes of every stage and the time of every file to this path", type=Path)
+    parser.add_argument("--timings-format", default="json", choices=TIMING_FORMATS, help="json or the Chrome trace event format")
+    if profile:
+        parser.add_argument("--profile", help="Run the parser under cProfile and write the stats to this path. Parses in this process", type=Path)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+import argparse
+import os
+import threading
+import time
+
+from .build import FORMATS, compile_options, compile_pdfs
+from .cache import BuildManifest, MANIFEST_NAME
+from .cli import convert
+from .export import EXPORT_FORMATS
+from .io import walk_vault
+from .keygen import KeyGenError, KeyRegistry, REGISTRY_NAME
+from .parser import RecipeParserError
+from .pdfcache import PdfCache, PDF_CACHE_NAME
+
+# watchdog is optional. Without it the vault is polled for changes
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+# Time to wait for further events after a change, so saving several files triggers a single rebuild
+DEBOUNCE_SECONDS = 0.1
+# Events that change the vault. Others, like opening or closing a file, leave it as it is
+CHANGE_EVENTS = ('created', 'modified', 'deleted', 'moved')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild recipe json and PDFs whenever the vault changes")
+    parser.add_argument("-i", "--input", required=True, help="Parent path where the recipe markdown files are located", type=Path)
+    parser.add_argument("-o", "--output", required=True, help="Output path for recipe json files", type=Path)
+    parser.add_argument("-p", "--pdf", help="Output path for the PDF files. Only json is written if omitted", type=Path)
+    parser.add_argument("-f", "--format", default="cards", choices=FORMATS, help="Layout of the PDFs")
+    parser.add_argument("-k", "--include-keys", action="store_true", help="Print the recipe keys on the a5 sheets")
+    parser.add_argument("--export-format", default="json", choices=EXPORT_FORMATS, help="Encoding of the category files")
+    parser.add_argument("-j", "--jobs", default=os.cpu_count() or 1, help="Number of parallel typst processes", type=int)
+    parser.add_argument("--interval", default=0.5, help="Polling interval in seconds if watchdog is not installed", type=float)
+    parser.add_argument("--typst", default="typst", help="Typst executable")
+
+    return parser.parse_args(argv)
+
+
+class PollingWatcher:
+    def __init__(self, parent: Path, interval: float):
+        self.parent = parent
+        self.interval = interval
+        self.snapshot = self._snapshot()
+
+    def _snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot: Dict[Path, Tuple[int, int]] = {}
+        for p, stat in walk_vault(self.parent, lambda p: p.stat()).items():
+            if isinstance(stat, OSError):
+                continue
+            snapshot[p] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self) -> Set[Path]:
+        # Returns the files that were added, removed or modified since the last call
+        while True:
+            time.sleep(self.interval)
+            current = self._snapshot()
+            if current != self.snapshot:
+                changed = set(p for p in current.keys() | self.snapshot.keys() if current.get(p) != self.snapshot.get(p))
+                self.snapshot = current
+                return changed
+
+    def stop(self) -> None:
+        pass
+
+
+class ChangeCollector:
+    # Paths of the watchdog events since the last take. A created, removed or moved folder may hold any number
+    # of recipes, then None asks for a scan of the whole vault
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.paths: Optional[Set[Path]] = set()
+
+    def add(self, event) -> None:
+        if event.event_type not in CHANGE_EVENTS:
+            return
+        # A folder is modified whenever a file in it is, which has an event of its own
+        if event.is_directory and event.event_type == 'modified':
+            return
+        paths = [os.fsdecode(event.src_path)]
+        if event.event_type == 'moved':
+            paths.append(os.fsdecode(event.dest_path))
+        recipes = [Path(p) for p in paths if p.endswith('.md')]
+        if not event.is_directory and not recipes:
+            return
+        with self.lock:
+            if event.is_directory:
+                self.paths = None
+            elif self.paths is not None:
+                self.paths.update(recipes)
+        self.changed.set()
+
+    def take(self) -> Optional[Set[Path]]:
+        with self.lock:
+            paths, self.paths = self.paths, set()
+        return paths
+
+
+class NotifyWatcher:
+    def __init__(self, parent: Path):
+        self.collector = collector = ChangeCollector()
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                collector.add(event)
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), str(parent), recursive=True)
+        self.observer.start()
+
+    def wait(self) -> Optional[Set[Path]]:
+        # Returns the changed recipe files, or None if the whole vault has to be scanned again
+        changed = self.collector.changed
+        changed.wait()
+        # Collect the burst of events an editor produces when saving
+        while True:
+            changed.clear()
+            time.sleep(DEBOUNCE_SECONDS)
+            if not changed.is_set():
+                return self.collector.take()
+
+    def stop(self) -> None:
+        self.observer.stop()
+        self.observer.join()
+
+
+def compile_changed(args, cache: Optional[PdfCache]) -> None:
+    # Same options and PDF cache as build.py, so PDFs compiled here are reused by the next full build and the other way round
+    options = compile_options([args.format], args.include_keys, args.typst)
+    compile_pdfs(args.output, args.pdf, options, args.jobs, cache=cache)
+
+
+def rebuild(args, manifest: BuildManifest, cache: Optional[PdfCache], registry: Optional[KeyRegistry] = None,
+            changed_files: Optional[Set[Path]] = None) -> None:
+    # changed_files are the files reported by the watcher, only they are read again. None scans the whole vault
+    start = time.perf_counter()
+    try:
+        changed = convert(args.input, args.output, manifest, registry=registry, fmt=args.export_format,
+                          changed_files=changed_files)
+    except (RecipeParserError, KeyGenError) as e:
+        # Keep watching, the next save hopefully fixes the recipe
+        print(f'Build failed: {e}')
+        return
+
+    if args.pdf is not None and changed:
+        compile_changed(args, cache)
+    print(f'Rebuilt {len(changed)} categories in {time.perf_counter() - start:.2f}s')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    manifest = BuildManifest.load(args.output / MANIFEST_NAME)
+    registry = KeyRegistry.load(args.output / REGISTRY_NAME)
+    cache = PdfCache(args.pdf / PDF_CACHE_NAME) if args.pdf is not None else None
+
+    # The first build compiles every outdated PDF, later builds only the changed categories
+    convert(args.input, args.output, manifest, registry=registry, fmt=args.export_format)
+    if args.pdf is not None:
+        compile_changed(args, cache)
+
+    if Observer is not None:
+        watcher = NotifyWatcher(args.input)
+    else:
+        print('watchdog is not installed, falling back to polling')
+        watcher = PollingWatcher(args.input, args.interval)
+
+    print(f'Watching {args.input} for changes. Press Ctrl+C to stop')
+    try:
+        while True:
+            changed_files = watcher.wait()
+            rebuild(args, manifest, cache, registry, changed_files)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+
+if __name__ == "__main__":
+    main()
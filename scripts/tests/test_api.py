@@ -0,0 +1,109 @@
+import json
+import threading
+import urllib.request
+from pathlib import Path
+
+import pytest
+from mapper import api
+from mapper.server import BuildServer
+from tests.test_build import FAKE_TYPST
+from tests.test_watch import write_recipe
+
+
+@pytest.fixture
+def vault(tmp_path):
+    path = tmp_path / "vault"
+    path.mkdir()
+    write_recipe(path / "Soup.md", "Soup", "Lunch")
+    write_recipe(path / "Cake.md", "Cake", "Dessert")
+    return path
+
+@pytest.fixture
+def typst(tmp_path):
+    path = tmp_path / "typst"
+    path.write_text(FAKE_TYPST, encoding="utf-8")
+    path.chmod(0o755)
+    return str(path)
+
+def test_build_returns_structured_result(tmp_path, vault, typst):
+    result = api.build(vault, tmp_path / "out", format="a5", jobs=1, typst=typst)
+
+    assert result.ok and result.error is None
+    assert sorted(result.changed) == ["Dessert", "Lunch"]
+    assert sorted(result.compiled) == ["Dessert", "Lunch"]
+    assert (tmp_path / "out" / "pdf" / "Lunch.pdf").exists()
+    assert "Exporting json files" in result.log
+    assert [s["name"] for s in result.stages][:2] == ["scan", "parse"]
+
+def test_builder_rebuilds_only_changes(tmp_path, vault, typst):
+    builder = api.Builder(vault, tmp_path / "out", jobs=1, typst=typst)
+    builder.build()
+    assert builder.build().changed == []
+
+    write_recipe(vault / "Stew.md", "Stew", "Lunch")
+    result = builder.build()
+    assert result.changed == ["Lunch"] and result.compiled == ["Lunch"]
+
+def test_build_reports_parse_errors(tmp_path, vault):
+    (vault / "Broken.md").write_text("no frontmatter\n<!-- MARKER FOR MAPPER SCRIPT -->", encoding="utf-8")
+
+    result = api.build(vault, tmp_path / "out", pdf=False)
+    assert not result.ok and "Failed parsing 1 of 3 recipes" in result.error
+
+def test_server_builds_on_request(tmp_path, vault, typst):
+    server = BuildServer(("127.0.0.1", 0), api.Builder(vault, tmp_path / "out", jobs=1, typst=typst))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(f"{url}/build", method="POST")) as response:
+            result = json.load(response)
+        with urllib.request.urlopen(f"{url}/status") as response:
+            status = json.load(response)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result["ok"] and sorted(result["compiled"]) == ["Dessert", "Lunch"]
+    assert status["builds"] == 1 and not status["building"] and status["last"] == result
+
+def test_builder_only_reads_reported_changes(tmp_path, vault, typst):
+    builder = api.Builder(vault, tmp_path / "out", jobs=1, typst=typst)
+    builder.build()
+    result = builder.build(changed=[])
+    assert result.ok and result.changed == [] and result.stages == []
+
+    # Not reported, so not seen
+    write_recipe(vault / "Stew.md", "Stew", "Lunch")
+    assert builder.build(changed=[]).changed == []
+    result = builder.build(changed=[vault / "Stew.md"])
+    assert result.changed == ["Lunch"] and result.compiled == ["Lunch"]
+
+    (vault / "Cake.md").unlink()
+    assert builder.build(changed=[vault / "Cake.md"]).changed == ["Dessert"]
+    assert not (tmp_path / "out" / "json" / "Dessert.json").exists()
+
+def test_builder_scans_everything_after_a_failed_build(tmp_path, vault):
+    builder = api.Builder(vault, tmp_path / "out", pdf=False)
+    (vault / "Broken.md").write_text("no frontmatter\n<!-- MARKER FOR MAPPER SCRIPT -->", encoding="utf-8")
+    assert not builder.build(changed=[]).ok
+
+    (vault / "Broken.md").unlink()
+    assert sorted(builder.build(changed=[]).changed) == ["Dessert", "Lunch"]
+
+def test_build_prints_unless_quiet(tmp_path, vault, capsys):
+    result = api.build(vault, tmp_path / "out", pdf=False, quiet=False)
+
+    assert result.ok and result.log == ""
+    assert "Exporting json files" in capsys.readouterr().out
+
+@pytest.mark.parametrize("relative_vault", [True, False])
+def test_builder_matches_absolute_and_relative_changes(tmp_path, vault, monkeypatch, relative_vault):
+    monkeypatch.chdir(tmp_path)
+    builder = api.Builder(Path("vault") if relative_vault else vault, tmp_path / "out", pdf=False)
+    builder.build()
+
+    write_recipe(vault / "Soup.md", "Hot Soup", "Lunch")
+    changed = vault / "Soup.md" if relative_vault else Path("vault/Soup.md")
+    assert builder.build(changed=[changed]).changed == ["Lunch"]
+    assert "Hot Soup" in (tmp_path / "out" / "json" / "Lunch.json").read_text(encoding="utf-8")
@@ -0,0 +1,239 @@
+import json
+import os
+import pytest
+from mapper import build
+from mapper.build import main, parse_formats, plan_jobs, page_ranges, stamp_options, typst_command, CompileOptions, CompileJob, OPTIONS_FILE
+
+# Stand-in for the typst binary: writes the output file, or fails for categories named "Broken".
+# typst query prints the first page of every category of a batch
+QUERY_OUTPUT = '[{"category": "Dinner", "page": 1}, {"category": "Lunch", "page": 3}]'
+FAKE_TYPST = f"""#!/bin/sh
+if [ "$1" = query ]; then echo '{QUERY_OUTPUT}'; exit 0; fi
+for last; do :; done
+case "$last" in *Broken.pdf) echo "error: broken" >&2; exit 1;; esac
+echo pdf > "$last"
+"""
+
+@pytest.fixture
+def dirs(tmp_path):
+    json_dir = tmp_path / "json"
+    json_dir.mkdir()
+    (json_dir / "Lunch.json").write_text("[]", encoding="utf-8")
+    (json_dir / "Dinner.json").write_text("[]", encoding="utf-8")
+    return json_dir, tmp_path / "pdf"
+
+@pytest.fixture
+def typst(tmp_path):
+    path = tmp_path / "typst"
+    path.write_text(FAKE_TYPST, encoding="utf-8")
+    path.chmod(0o755)
+    return str(path)
+
+def test_typst_command_passes_inputs(tmp_path):
+    options = CompileOptions(format="a5", include_keys=True, typst_dir=tmp_path / "typst")
+    job = CompileJob(tmp_path / "json" / "Lunch.json", tmp_path / "Lunch.pdf")
+
+    cmd = typst_command(job, options)
+
+    assert "--input=format=a5" in cmd
+    assert "--input=includeKeys=1" in cmd
+    assert "--input=jsonPath=/json/Lunch.json" in cmd
+    assert cmd[cmd.index("--root") + 1] == str(tmp_path.resolve())
+
+def test_plan_skips_up_to_date_and_removes_stale(dirs):
+    json_dir, pdf_dir = dirs
+    options = CompileOptions()
+    assert [j.json_file.stem for j in plan_jobs(json_dir, pdf_dir, options)] == ["Dinner", "Lunch"]
+    stamp_options(pdf_dir, options)
+
+    (pdf_dir / "Dinner.pdf").write_text("pdf", encoding="utf-8")
+    (pdf_dir / "Lunch.pdf").write_text("pdf", encoding="utf-8")
+    (pdf_dir / "Removed.pdf").write_text("pdf", encoding="utf-8")
+    stat = (json_dir / "Lunch.json").stat()
+    os.utime(pdf_dir / "Lunch.pdf", ns=(stat.st_atime_ns, stat.st_mtime_ns - 1))
+
+    assert [j.json_file.stem for j in plan_jobs(json_dir, pdf_dir, options)] == ["Lunch"]
+    assert not (pdf_dir / "Removed.pdf").exists()
+
+def test_plan_rebuilds_everything_on_option_change(dirs):
+    json_dir, pdf_dir = dirs
+    plan_jobs(json_dir, pdf_dir, CompileOptions())
+    stamp_options(pdf_dir, CompileOptions())
+    (pdf_dir / "Dinner.pdf").write_text("pdf", encoding="utf-8")
+    (pdf_dir / "Lunch.pdf").write_text("pdf", encoding="utf-8")
+
+    jobs = plan_jobs(json_dir, pdf_dir, CompileOptions(format="a5"))
+
+    assert len(jobs) == 2
+    # The new options are only stamped once their PDFs are compiled
+    assert not (pdf_dir / OPTIONS_FILE).exists()
+
+def test_plan_only_selected_categories(dirs):
+    json_dir, pdf_dir = dirs
+    plan_jobs(json_dir, pdf_dir, CompileOptions())
+    stamp_options(pdf_dir, CompileOptions())
+    (pdf_dir / "Lunch.pdf").write_text("pdf", encoding="utf-8")
+
+    assert [j.json_file.stem for j in plan_jobs(json_dir, pdf_dir, CompileOptions(), only=["Dinner"])] == ["Dinner"]
+    assert (pdf_dir / "Lunch.pdf").exists()
+
+    # Compiled with other options, the PDFs of the other categories are outdated
+    assert [j.json_file.stem for j in plan_jobs(json_dir, pdf_dir, CompileOptions(format="a5"), only=["Dinner"])] == ["Dinner"]
+    assert not (pdf_dir / "Lunch.pdf").exists()
+
+def test_main_compiles_all_categories(dirs, typst):
+    json_dir, pdf_dir = dirs
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "-j", "2", "--typst", typst]) == 0
+    assert (pdf_dir / "Lunch.pdf").exists()
+    assert (pdf_dir / "Dinner.pdf").exists()
+
+def test_main_fails_if_any_compile_fails(dirs, typst):
+    json_dir, pdf_dir = dirs
+    (json_dir / "Broken.json").write_text("[]", encoding="utf-8")
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "-j", "2", "--typst", typst]) == 1
+    assert (pdf_dir / "Lunch.pdf").exists()
+    assert not (pdf_dir / "Broken.pdf").exists()
+
+def test_failed_build_with_new_options_leaves_no_stamp(dirs, typst):
+    json_dir, pdf_dir = dirs
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", typst]) == 0
+    (json_dir / "Broken.json").write_text("[]", encoding="utf-8")
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "-f", "a5", "--typst", typst]) == 1
+
+    # Lunch and Dinner were compiled as a5, yet the build failed, so the next one compiles all of them again
+    assert not (pdf_dir / OPTIONS_FILE).exists()
+    assert len(plan_jobs(json_dir, pdf_dir, CompileOptions(format="a5"))) == 3
+
+def test_interrupted_build_with_new_options_leaves_no_stamp(dirs, typst, monkeypatch):
+    json_dir, pdf_dir = dirs
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", typst]) == 0
+
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(build, "compile_categories", interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            main(["-i", str(json_dir), "-o", str(pdf_dir), "-f", "a5", "--typst", typst])
+
+    # The cards PDFs are still there, but without a stamp they are not taken for up to date a5 ones
+    assert (pdf_dir / "Lunch.pdf").exists() and not (pdf_dir / OPTIONS_FILE).exists()
+    assert len(plan_jobs(json_dir, pdf_dir, CompileOptions(format="a5"))) == 2
+
+def test_main_writes_timings(dirs, typst, tmp_path):
+    json_dir, pdf_dir = dirs
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", typst, "--timings", str(tmp_path / "timings.json")]) == 0
+    data = json.loads((tmp_path / "timings.json").read_text(encoding="utf-8"))
+    assert [s["name"] for s in data["stages"]] == ["plan", "restore", "compile", "store"]
+    assert data["stages"][2]["files"] == 2
+    assert sorted(f["name"] for f in data["files"]) == ["Dinner", "Lunch"]
+
+def test_plan_ignores_hidden_files(dirs):
+    json_dir, pdf_dir = dirs
+    (json_dir / ".manifest.json").write_text("{}", encoding="utf-8")
+
+    assert [j.json_file.stem for j in plan_jobs(json_dir, pdf_dir, CompileOptions())] == ["Dinner", "Lunch"]
+
+def test_page_ranges():
+    # Document order of typst query, an empty category starts on the same page as the next one
+    starts = [{"category": "Empty", "page": 4}, {"category": "Lunch", "page": 4}, {"category": "Dinner", "page": 1}]
+
+    assert page_ranges(starts, 6) == {"Dinner": (1, 3), "Empty": (4, 3), "Lunch": (4, 6)}
+    assert page_ranges(starts[1:], None)["Lunch"] == (4, None)
+
+def test_batch_without_pypdf_compiles_every_category(dirs, typst, tmp_path, monkeypatch):
+    json_dir, pdf_dir = dirs
+    monkeypatch.setattr(build, "PdfReader", None)
+    (json_dir / "Dinner.json").write_text('[{"title": "Stew"}]', encoding="utf-8")
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--experimental-batch", "--typst", typst, "--pdf-cache", str(tmp_path / "cache")]) == 0
+    assert sorted(p.name for p in pdf_dir.glob("*.pdf")) == ["Dinner.pdf", "Lunch.pdf"]
+    assert len(list((tmp_path / "cache").glob("*/*.pdf"))) == 2
+
+class FakeReader:
+    # Stands in for pypdf.PdfReader, the fake typst writes no real PDF
+    def __init__(self, path):
+        self.pages = ["page"] * 4
+
+def test_batch_writes_an_index(dirs, typst, monkeypatch):
+    json_dir, pdf_dir = dirs
+    monkeypatch.setattr(build, "PdfReader", FakeReader)
+    split = []
+    monkeypatch.setattr(build, "split_pdf", lambda pdf_file, ranges, pdf_dir: split.append(ranges))
+
+    main(["-i", str(json_dir), "-o", str(pdf_dir), "--experimental-batch", "--typst", typst])
+    assert split == [{"Dinner": (1, 2), "Lunch": (3, 4)}]
+    index = json.loads((pdf_dir / ".batch-index.json").read_text(encoding="utf-8"))
+    assert [e["category"] for e in index] == ["Dinner", "Lunch"]
+    assert all(e["path"].startswith("/") and e["path"].endswith(".json") for e in index)
+
+@pytest.mark.parametrize("query", ["warning: unknown font", '[{"category": "Dinner"}]'])
+def test_batch_fails_on_unreadable_page_ranges(dirs, tmp_path, monkeypatch, query):
+    json_dir, pdf_dir = dirs
+    monkeypatch.setattr(build, "PdfReader", FakeReader)
+    typst = tmp_path / "typst"
+    typst.write_text(FAKE_TYPST.replace(QUERY_OUTPUT, query), encoding="utf-8")
+    typst.chmod(0o755)
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--experimental-batch", "--typst", str(typst)]) == 1
+    assert not list(pdf_dir.glob("[!a]*.pdf"))
+
+def test_batch_fails_when_split_fails(dirs, typst, monkeypatch):
+    json_dir, pdf_dir = dirs
+    monkeypatch.setattr(build, "PdfReader", FakeReader)
+    def broken_split(pdf_file, ranges, pdf_dir):
+        raise OSError("disk full")
+    monkeypatch.setattr(build, "split_pdf", broken_split)
+
+    report = build.compile_pdfs(json_dir, pdf_dir, [CompileOptions(typst=typst)], batch=True)
+    assert len(report.failed) == 2 and "disk full" in report.failed[0].output
+
+def test_main_restores_pdfs_from_cache(dirs, typst, tmp_path):
+    json_dir, pdf_dir = dirs
+    cache = tmp_path / "cache"
+    (json_dir / "Dinner.json").write_text('[{"title": "Stew"}]', encoding="utf-8")
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", typst, "--pdf-cache", str(cache)]) == 0
+    assert len(list(cache.glob("*/*.pdf"))) == 2
+
+    # Switching the format and back only compiles the first time, even with a typst that always fails
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", typst, "--pdf-cache", str(cache), "-f", "a5"]) == 0
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", "false", "--pdf-cache", str(cache)]) == 0
+    assert (pdf_dir / "Lunch.pdf").read_text(encoding="utf-8") == "pdf\n"
+
+    (json_dir / "Lunch.json").write_text('[{"title": "Soup"}]', encoding="utf-8")
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", "false", "--pdf-cache", str(cache)]) == 1
+
+def test_parse_formats():
+    assert parse_formats("cards") == ["cards"]
+    assert parse_formats("a5, cards,a5") == ["a5", "cards"]
+    with pytest.raises(build.argparse.ArgumentTypeError):
+        parse_formats("cards,letter")
+
+def test_main_compiles_every_format_in_one_pool(dirs, typst, tmp_path):
+    json_dir, pdf_dir = dirs
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "-f", "cards,a5", "-j", "4", "--typst", typst,
+                 "--timings", str(tmp_path / "timings.json")]) == 0
+    for fmt in ("cards", "a5"):
+        assert sorted(p.name for p in (pdf_dir / fmt).glob("*.pdf")) == ["Dinner.pdf", "Lunch.pdf"]
+        assert f"format={fmt} " in (pdf_dir / fmt / OPTIONS_FILE).read_text(encoding="utf-8")
+    data = json.loads((tmp_path / "timings.json").read_text(encoding="utf-8"))
+    assert sorted(f["name"] for f in data["files"]) == ["a5/Dinner", "a5/Lunch", "cards/Dinner", "cards/Lunch"]
+
+    # Each format keeps its own options stamp, so nothing is outdated on the next build
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "-f", "cards,a5", "--typst", "false"]) == 0
+
+def test_switching_layouts_removes_the_other_one(dirs, typst):
+    json_dir, pdf_dir = dirs
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "--typst", typst]) == 0
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "-f", "cards,a5", "--typst", typst]) == 0
+    assert not list(pdf_dir.glob("*.pdf")) and not (pdf_dir / OPTIONS_FILE).exists()
+    assert len(list(pdf_dir.glob("*/*.pdf"))) == 4
+
+    assert main(["-i", str(json_dir), "-o", str(pdf_dir), "-f", "a5", "--typst", typst]) == 0
+    assert sorted(p.name for p in pdf_dir.glob("*.pdf")) == ["Dinner.pdf", "Lunch.pdf"]
+    assert not (pdf_dir / "cards").exists() and not (pdf_dir / "a5").exists()
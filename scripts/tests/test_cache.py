@@ -0,0 +1,101 @@
+import os
+import pytest
+from mapper.cache import BuildManifest
+from mapper.io import scan_recipes, MARKER
+from mapper.models import Recipe
+
+RECIPE = Recipe(
+    title="Pancakes",
+    tags=["easy"],
+    category="Breakfast",
+    grouping="Sweet",
+    prep_time="10 min",
+    cook_time="15 min",
+    servings=4,
+    source_url="",
+    last_modified="",
+    ingredients=["- Flour", "- Milk"],
+    steps=["+ Mix ingredients."],
+    hints=[]
+)
+
+@pytest.fixture
+def vault(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "Pancakes.md").write_text(f"# Pancakes\n{MARKER}", encoding="utf-8")
+    (vault / "Note.md").write_text("Just a note", encoding="utf-8")
+    return vault
+
+def test_manifest_roundtrip(vault, tmp_path):
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    found = scan_recipes(vault, manifest)
+    assert [s.path for s in found] == [vault / "Pancakes.md"]
+
+    manifest.store_recipe(found[0].path, RECIPE)
+    manifest.categories = {"Breakfast": "abc"}
+    manifest.save()
+
+    loaded = BuildManifest.load(tmp_path / "manifest.json")
+    assert loaded.cached_recipe(vault / "Pancakes.md") == RECIPE
+    assert loaded.categories == {"Breakfast": "abc"}
+    assert not loaded.files[str(vault / "Note.md")].is_recipe
+
+def test_unchanged_file_is_not_read_again(vault, tmp_path, monkeypatch):
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    path = scan_recipes(vault, manifest)[0].path
+    manifest.store_recipe(path, RECIPE)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file should not be read")
+    monkeypatch.setattr("pathlib.Path.open", fail)
+
+    assert scan_recipes(vault, manifest) == [(path, None)]
+
+def test_changed_file_drops_cached_recipe(vault, tmp_path):
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    path = scan_recipes(vault, manifest)[0].path
+    manifest.store_recipe(path, RECIPE)
+
+    path.write_text(f"# Pancakes 2\n\n{MARKER}", encoding="utf-8")
+    scanned = scan_recipes(vault, manifest)
+
+    assert scanned == [(path, ["# Pancakes 2", "", MARKER])]
+    assert manifest.cached_recipe(path) is None
+
+def test_deleted_file_is_pruned(vault, tmp_path):
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    scan_recipes(vault, manifest)
+
+    (vault / "Note.md").unlink()
+    scan_recipes(vault, manifest)
+
+    assert str(vault / "Note.md") not in manifest.files
+
+def test_version_mismatch_discards_manifest(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text('{"version": -1, "files": {"x": {}}}', encoding="utf-8")
+
+    assert BuildManifest.load(path).files == {}
+
+def test_unchanged_manifest_is_not_written_again(tmp_path):
+    from mapper.cli import convert
+    from tests.test_watch import write_recipe
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault / "Soup.md", "Soup", "Lunch")
+    out = tmp_path / "out"
+    convert(vault, out, BuildManifest.load(out / ".manifest.json"))
+    # Back dated, so a rewrite is visible even on file systems with a coarse mtime
+    path = out / ".manifest.json"
+    old = path.stat().st_mtime_ns - 10**9
+    os.utime(path, ns=(old, old))
+
+    manifest = BuildManifest.load(path)
+    assert convert(vault, out, manifest) == []
+    assert not manifest.dirty
+    assert path.stat().st_mtime_ns == old
+
+    write_recipe(vault / "Stew.md", "Stew", "Dinner")
+    convert(vault, out, BuildManifest.load(path))
+    assert path.stat().st_mtime_ns != old
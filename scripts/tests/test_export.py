@@ -0,0 +1,77 @@
+import json
+import pytest
+from mapper.export import write_category, cbor_encode, classify_markup, typst_json
+from mapper.models import Recipe
+
+def make_recipe(title, key=None):
+    return Recipe(
+        title=title,
+        tags=["easy"],
+        category="Breakfast",
+        grouping="Süß",
+        prep_time="10 min",
+        cook_time="15 min",
+        servings=4,
+        source_url="",
+        last_modified="",
+        ingredients=["- Flour", "- Milk"],
+        steps=["+ Mix\nwell"],
+        hints=[],
+        key=key
+    )
+
+RECIPES = [make_recipe("Pancakes", "B-S-P"), make_recipe("Waffles")]
+
+@pytest.mark.parametrize("recipes", [RECIPES, []])
+def test_json_matches_json_dumps(tmp_path, recipes):
+    path = tmp_path / "Breakfast.json"
+    write_category(path, recipes)
+
+    assert path.read_text(encoding="utf-8") == json.dumps([typst_json(r) for r in recipes], indent=2)
+
+def test_compact_json(tmp_path):
+    path = tmp_path / "Breakfast.json"
+    write_category(path, RECIPES, "json-compact")
+
+    assert path.read_text(encoding="utf-8") == json.dumps([typst_json(r) for r in RECIPES], separators=(",", ":"))
+
+def test_cbor_encoding():
+    assert cbor_encode({"a": [1, -2, "ß", None, 500]}) == bytes.fromhex("a1 61 61 85 01 21 62 c3 9f f6 19 01 f4")
+
+def test_unchanged_file_is_not_replaced(tmp_path):
+    path = tmp_path / "Breakfast.cbor"
+    digest, written = write_category(path, RECIPES, "cbor")
+    assert written
+    mtime = path.stat().st_mtime_ns
+
+    assert write_category(path, RECIPES, "cbor", digest) == (digest, False)
+    assert path.stat().st_mtime_ns == mtime
+    assert [p.name for p in tmp_path.iterdir()] == ["Breakfast.cbor"]
+
+@pytest.mark.parametrize("text,plain", [
+    ("- 400 g Mehl", "400 g Mehl"),
+    ("+ Mehl, Eier und Milch (ref. Br-Sw-P) vermischen.", "Mehl, Eier und Milch (ref. Br-Sw-P) vermischen."),
+    ("- Salz ~ Pfeffer", None),
+    ("- *viel* Butter", None),
+    ("- [[Pancakes]]", None),
+    ("- 1/2 TL Salz -5 Grad", None),
+    ("- Geht's?", None),
+    ("- Warten...", None),
+    ("+ Mix\nwell", None),
+    ("- - nested", None),
+    ("-  two spaces", None),
+    ("=== Teig", None),
+    ("Some hint", None),
+    ("- ", None),
+])
+def test_classify_markup(text, plain):
+    expected = text if plain is None else {"item": text[0], "text": plain}
+    assert classify_markup(text) == expected
+
+def test_typst_json_keeps_recipe(tmp_path):
+    r = RECIPES[0]
+    data = typst_json(r)
+
+    assert data["ingredients"] == [{"item": "-", "text": "Flour"}, {"item": "-", "text": "Milk"}]
+    assert data["steps"] == ["+ Mix\nwell"]
+    assert r.ingredients == ["- Flour", "- Milk"]
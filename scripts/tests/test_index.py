@@ -0,0 +1,74 @@
+import pytest
+from mapper.index import RecipeIndex, RecipeIndexError, parse_minutes
+from mapper.models import Recipe
+from mapper import query
+
+def make_recipe(title, tags=(), prep="10 min", cook="15 min", ingredients=("- 200 g Mehl",), category="Breakfast"):
+    return Recipe(
+        title=title,
+        tags=list(tags),
+        category=category,
+        grouping="Süß",
+        prep_time=prep,
+        cook_time=cook,
+        servings=2,
+        source_url="",
+        last_modified="",
+        ingredients=list(ingredients),
+        steps=["+ Mix"],
+        hints=[],
+        key=f"B-S-{title[0]}",
+    )
+
+RECIPES = [
+    ("Pancakes", make_recipe("Pancakes", ["sweet", "quick"], "10 min", "15 min", ["- 200 g Mehl", "- 2 Eier"])),
+    ("Waffles", make_recipe("Waffles", ["sweet"], "15 min", "1 h", ["- 250 g Mehl", "- Butter"])),
+    ("Omelette", make_recipe("Omelette", ["Quick"], "5 min", "5 min", ["- 3 Eier", "- Tomaten"], "Lunch")),
+]
+
+@pytest.mark.parametrize("text,minutes", [
+    ("10 min", 10), ("1 h 30 min", 90), ("1,5 Std", 90), ("1:30", 90), ("45", 45), ("2 Stunden", 120), ("", None), ("kurz", None),
+])
+def test_parse_minutes(text, minutes):
+    assert parse_minutes(text) == minutes
+
+@pytest.fixture
+def index(tmp_path):
+    index = RecipeIndex.open(tmp_path / "index.sqlite")
+    index.update(RECIPES)
+    yield index
+    index.close()
+
+def titles(results):
+    return [r.title for r in results]
+
+def test_search_filters(index):
+    assert titles(index.search()) == ["Pancakes", "Waffles", "Omelette"]
+    assert titles(index.search(tags=["quick"])) == ["Pancakes", "Omelette"]
+    assert titles(index.search(tags=["sweet", "quick"])) == ["Pancakes"]
+    assert titles(index.search(ingredients=["ei"])) == ["Pancakes", "Omelette"]
+    assert titles(index.search(ingredients=["mehl", "butter"])) == ["Waffles"]
+    assert titles(index.search(max_cook=15)) == ["Pancakes", "Omelette"]
+    assert titles(index.search(max_total=20)) == ["Omelette"]
+    assert titles(index.search(text="tomaten", category="Lunch")) == ["Omelette"]
+    # Query syntax in user input is searched for literally
+    assert titles(index.search(text='Mehl" OR "Eier')) == []
+
+def test_update_is_incremental(index):
+    changed = make_recipe("Waffles", ["sweet"], "15 min", "20 min")
+    update = index.update([RECIPES[0], ("Waffles", changed), ("Toast", make_recipe("Toast"))])
+
+    assert (update.added, update.updated, update.removed, update.unchanged) == (1, 1, 1, 1)
+    assert titles(index.search()) == ["Pancakes", "Toast", "Waffles"]
+    assert titles(index.search(max_total=40)) == ["Pancakes", "Toast", "Waffles"]
+    assert titles(index.search(ingredients=["eier"])) == ["Pancakes"]
+    assert index.db.execute("SELECT COUNT(*) FROM tags").fetchone()[0] == 3
+
+def test_query_cli(tmp_path, index, capsys):
+    assert query.main(["--index", str(tmp_path / "index.sqlite"), "-t", "sweet", "--max-time", "30", "--json"]) == 0
+    assert '"title": "Pancakes"' in capsys.readouterr().out
+
+def test_missing_index(tmp_path):
+    with pytest.raises(RecipeIndexError):
+        RecipeIndex.open_existing(tmp_path / "missing.sqlite")
+    assert query.main(["-o", str(tmp_path)]) == 1
@@ -0,0 +1,90 @@
+import json
+import pytest
+
+from mapper.cache import BuildManifest
+from mapper.cli import convert
+from mapper.ingredients import Ingredient, IngredientTable, format_ingredient, parse_ingredient, scale_recipes, shopping_list
+from tests.test_models import make_recipe
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("- 200 g Mehl", Ingredient(200, "g", "Mehl")),
+    ("- 400g Zucker", Ingredient(400, "g", "Zucker")),
+    ("- 1,5 kg Kartoffeln", Ingredient(1500, "g", "Kartoffeln")),
+    ("- 1/2 TL Salz", Ingredient(0.5, "TL", "Salz")),
+    ("- 1 1/2 l Milch", Ingredient(1500, "ml", "Milch")),
+    ("- 1½ el Öl", Ingredient(1.5, "EL", "Öl")),
+    ("- 3 Eier", Ingredient(3, "", "Eier")),
+    ("- 2-3 EL Zucker", None),
+    ("- Salz", None),
+    ("- 2 EL", None),
+    ("===Teig", None),
+])
+def test_parse_ingredient(text, expected):
+    assert parse_ingredient(text) == expected
+
+def test_format_ingredient():
+    assert format_ingredient(1500, "g", "Mehl") == "- 1,5 kg Mehl"
+    assert format_ingredient(1 / 3, "TL", "Salz") == "- 0,33 TL Salz"
+    assert format_ingredient(12.4, "", "Eier") == "- 12 Eier"
+
+def test_table_scales_and_sums_by_name_and_unit():
+    pancakes = make_recipe(key="Br-Sw-P", servings=4, ingredients=["- 200 g Mehl", "- 2 Eier", "- Salz"])
+    bread = make_recipe(key="Ba-Br-B", category="Baking", servings=1, ingredients=["- 1 kg Mehl", "- 1 Pck. Hefe"])
+    table = IngredientTable.from_recipes([pancakes, bread])
+
+    assert len(table) == 4
+    assert list(table.select(categories=["Baking"])) == [0, 1]
+    factors = table.factors(8, table.select(keys=["Br-Sw-P"]))
+    assert list(factors) == [2.0, 1.0]
+    assert list(table.scaled(factors)) == [400, 4, 1000, 1]
+    assert table.totals(table.scaled(factors)) == [("Eier", 4, ""), ("Hefe", 1, "Pck."), ("Mehl", 1400, "g")]
+    assert table.totals(selected=table.select(keys=["Ba-Br-B"])) == [("Hefe", 1, "Pck."), ("Mehl", 1000, "g")]
+
+def test_scale_recipes_copies_the_scaled_ones():
+    pancakes = make_recipe(servings=2, ingredients=["===Teig", "- 125 g Mehl", "- [[Sirup]]"])
+    same = make_recipe(servings=6, ingredients=["- 1 Ei"])
+    scaled = scale_recipes([pancakes, same], 6)
+
+    assert scaled[0].ingredients == ["===Teig", "- 375 g Mehl", "- [[Sirup]]"]
+    assert scaled[0].servings == 6
+    assert pancakes.ingredients[1] == "- 125 g Mehl"
+    assert scaled[1] is same
+
+def test_shopping_list():
+    recipes = [make_recipe(servings=2, ingredients=["- 500 ml Milch"]), make_recipe(servings=4, ingredients=["- 1 l Milch"])]
+
+    assert shopping_list(recipes, 4) == [{"name": "Milch", "quantity": 2000, "unit": "ml", "text": "2 l Milch"}]
+
+def test_convert_scales_and_rescales(tmp_path):
+    from benchmarks.vault import VaultSpec, generate_vault
+    vault = tmp_path / "vault"
+    generate_vault(vault, VaultSpec(recipes=10, categories=1, link_density=0.0, noise_files=0))
+    out = tmp_path / "out"
+    def exported():
+        return json.loads(next(out.glob("[!.]*.json")).read_text(encoding="utf-8"))
+
+    convert(vault, out, BuildManifest.load(out / ".manifest.json"), servings=12, shopping_list_path=tmp_path / "list.json")
+    assert all(r["servings"] == 12 for r in exported())
+    assert json.loads((tmp_path / "list.json").read_text(encoding="utf-8"))[0]["quantity"] > 0
+
+    # Exporting as written has to rewrite the scaled file, even though no recipe changed
+    assert len(convert(vault, out, BuildManifest.load(out / ".manifest.json"))) == 1
+    assert any(r["servings"] != 12 for r in exported())
+
+def test_shopping_list_is_the_same_for_cached_recipes(tmp_path):
+    from tests.test_watch import write_recipe
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault / "Teig.md", "Teig", "Backen")
+    write_recipe(vault / "Pizza.md", "Pizza", "Kochen")
+    pizza = vault / "Pizza.md"
+    pizza.write_text(pizza.read_text(encoding="utf-8").replace("- Water", "- 1 Stück [[Teig]]"), encoding="utf-8")
+    out = tmp_path / "out"
+
+    lists = []
+    for _ in range(2):
+        convert(vault, out, BuildManifest.load(out / ".manifest.json"), shopping_list_path=tmp_path / "list.json")
+        lists.append(json.loads((tmp_path / "list.json").read_text(encoding="utf-8")))
+    assert lists[0] == lists[1]
+    assert [i["name"] for i in lists[0]] == ["Teig (ref. B-M-T)"]
@@ -0,0 +1,37 @@
+import pytest
+from mapper.io import scan_recipes, search_recipes, has_marker, DEFAULT_IGNORE, MARKER, TAIL_SIZE
+
+@pytest.mark.parametrize("content,expected", [
+    (f"# Recipe\n{MARKER}", True),
+    (f"# Recipe\n{MARKER}\n", True),
+    (f"# Recipe\n  {MARKER}  ", True),
+    (f"# Recipe\n{MARKER}\n\n", False),
+    (f"{MARKER}\n# Recipe", False),
+    ("", False),
+    ("ä" * TAIL_SIZE + f"\n{MARKER}", True),
+    ("x" * TAIL_SIZE * 10, False),
+])
+def test_has_marker(tmp_path, content, expected):
+    path = tmp_path / "file.md"
+    path.write_text(content, encoding="utf-8")
+
+    assert has_marker(path) == expected
+
+def test_scan_reads_recipe_lines(tmp_path):
+    (tmp_path / "Recipe.md").write_text(f"# Recipe\n- Flour\n{MARKER}", encoding="utf-8")
+    (tmp_path / "Note.md").write_text("# Note", encoding="utf-8")
+
+    assert search_recipes(tmp_path) == [tmp_path / "Recipe.md"]
+    assert scan_recipes(tmp_path) == [(tmp_path / "Recipe.md", ["# Recipe", "- Flour", MARKER])]
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_scan_skips_ignored_and_nested(tmp_path, jobs):
+    recipe = f"# Recipe\n{MARKER}"
+    for rel in ["Recipe.md", "a/b/c/Deep.md", ".obsidian/Plugin.md", "sub/.trash/Old.md", "Archive/Old.md", "Attachments/Old.md", "notes/Attachments/Old.md"]:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(recipe, encoding="utf-8")
+
+    found = [s.path.relative_to(tmp_path).as_posix() for s in scan_recipes(tmp_path, jobs=jobs, ignore=DEFAULT_IGNORE + ("Archive/*", "Attachments"))]
+    assert found == ["Recipe.md", "a/b/c/Deep.md"]
+    assert len(search_recipes(tmp_path, jobs=jobs)) == 5
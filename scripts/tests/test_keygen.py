@@ -1,5 +1,5 @@
 import pytest
-from mapper.keygen import get_unique_keys_from_set, KeyGenError, MAX_KEY_LENGTH
+from mapper.keygen import get_unique_keys_from_set, get_stable_keys_from_set, KeyGenError, KeyRegistry, MAX_KEY_LENGTH
 
 def test_unique_keys_normal():
     items = ["Apple", "Banana", "Carrot"]
@@ -45,4 +45,56 @@ def test_common_prefix_within_max_key_length():
 def test_items_too_short_raises_error():
     items = ["A", "A"]
     with pytest.raises(KeyGenError):
-        get_unique_keys_from_set(items)
\ No newline at end of file
+        get_unique_keys_from_set(items)
+
+def test_earlier_key_is_extended_on_hard_conflict():
+    items = ["Brot", "Braten", "Suppe"]
+    key_map = get_unique_keys_from_set(items)
+
+    assert key_map == {"Brot": "Bro", "Braten": "Bra", "Suppe": "S"}
+    assert list(key_map.keys()) == ["Brot", "Braten", "Suppe"]
+
+def test_large_set_of_distinct_prefixes():
+    items = [a + b + c + "x" for a in "ABCDEFGHIJ" for b in "abcdefghij" for c in "klmnopqrst"]
+    key_map = get_unique_keys_from_set(items)
+
+    assert len(key_map) == 1000
+    assert all(key == item[:3] for item, key in key_map.items())
+
+
+def test_stable_keys_without_registered_keys_match_unique_keys():
+    items = ["Apple", "Apricot", "Banana"]
+    key_map, conflicts = get_stable_keys_from_set(items, {})
+
+    assert key_map == get_unique_keys_from_set(items)
+    assert conflicts == []
+
+def test_registered_keys_are_kept_when_new_items_are_added():
+    reserved = {"Brot": "B", "Suppe": "S"}
+    key_map, conflicts = get_stable_keys_from_set(["Brot", "Braten", "Suppe", "Kuchen"], reserved, "Backen")
+
+    assert key_map == {"Brot": "B", "Suppe": "S", "Braten": "Br", "Kuchen": "K"}
+    assert len(conflicts) == 1
+    assert (conflicts[0].item, conflicts[0].wanted, conflicts[0].holder, conflicts[0].assigned) == ("Braten", "B", "Brot", "Br")
+
+def test_removed_items_keep_their_key_reserved():
+    key_map, _ = get_stable_keys_from_set(["Kekse"], {"Kuchen": "K"})
+
+    assert key_map == {"Kekse": "Ke"}
+
+def test_new_item_without_free_key_raises_error():
+    with pytest.raises(KeyGenError):
+        get_stable_keys_from_set(["Bro"], {"Brot": "B", "Braten": "Br", "Brei": "Bro"})
+
+def test_registry_roundtrip_and_lookup(tmp_path):
+    registry = KeyRegistry.load(tmp_path / "keys.json")
+    assert registry.category_keys(["Breakfast", "Lunch"]) == {"Breakfast": "B", "Lunch": "L"}
+    assert registry.grouping_keys("Breakfast", ["Sweet", "Savory"]) == {"Sweet": "Sw", "Savory": "Sa"}
+    registry.save()
+
+    loaded = KeyRegistry.load(tmp_path / "keys.json")
+    assert loaded.category_keys(["Brunch", "Breakfast"]) == {"Breakfast": "B", "Brunch": "Br"}
+    assert loaded.lookup("B-Sw-P") == ("Breakfast", "Sweet")
+    assert loaded.lookup("Br") == ("Brunch", None)
+    assert loaded.lookup("X") is None
+    assert "'Brunch' got key 'Br'" in loaded.conflict_report()
@@ -1,6 +1,6 @@
 import pytest
 from mapper.models import Recipe
-from mapper.linker import link_buffer, replace_links
+from mapper.linker import link_buffer, replace_links, build_link_index, dangling_links, resolve_link_texts, dependents
 
 BASE_RECIPE = Recipe(
     title="BaseRecipe",
@@ -46,4 +46,28 @@ def test_replace_links():
     assert LINKING_RECIPE.steps[0] == f"+ Prepare {expanded_link}"
     assert LINKING_RECIPE.steps[1] == "+ Add Sugar"
 
-    assert LINKING_RECIPE.hints[0] == f"- See {expanded_link}"
\ No newline at end of file
+    assert LINKING_RECIPE.hints[0] == f"- See {expanded_link}"
+
+def test_link_index_and_dangling_links():
+    linking = Recipe(
+        title="Linking",
+        tags=[],
+        category="Cat",
+        grouping="Grp",
+        prep_time="",
+        cook_time="",
+        servings=1,
+        source_url="",
+        last_modified="",
+        ingredients=["- [[BaseRecipe]]", "- [[Missing]]"],
+        steps=["+ Prepare [[BaseRecipe]]"],
+        hints=[]
+    )
+    mapper = {"BaseRecipe": BASE_RECIPE, "Linking": linking}
+
+    index = build_link_index(mapper)
+
+    assert index == {"BaseRecipe": ["Linking"], "Missing": ["Linking"]}
+    assert dangling_links(index, mapper) == {"Missing": ["Linking"]}
+    assert resolve_link_texts(index, mapper) == {"BaseRecipe": f"BaseRecipe (ref. {BASE_RECIPE.key})", "Missing": None}
+    assert dependents(index, ["BaseRecipe", "Unknown"]) == {"Linking"}
@@ -0,0 +1,44 @@
+# tests/test_models.py
+from dataclasses import asdict
+import pickle
+
+from mapper.models import Recipe
+
+
+def make_recipe(**kwargs):
+    values = dict(
+        title="Pancakes", tags=["sweet"], category="Breakfast", grouping="Sweet",
+        prep_time="10 min", cook_time="15 min", servings=4, source_url="", last_modified="",
+        ingredients=["- Flour"], steps=["+ Mix"], hints=[],
+    )
+    values.update(kwargs)
+    return Recipe(**values)
+
+
+def test_recipe_is_slotted():
+    assert not hasattr(make_recipe(), "__dict__")
+
+
+def test_to_json_matches_asdict():
+    r = make_recipe(key="Br-Sw-P")
+    data = r.to_json()
+
+    assert data == asdict(r)
+    assert list(data) == list(asdict(r))
+    assert Recipe.from_json(data) == r
+
+
+def test_repeated_values_are_interned():
+    # Built at runtime so the literals are not shared by the compiler already
+    a = make_recipe(category="".join(["Break", "fast"]), tags=["".join(["sw", "eet"])])
+    b = make_recipe(category="".join(["Brea", "kfast"]), tags=["".join(["swe", "et"])])
+
+    assert a.category is b.category
+    assert a.tags[0] is b.tags[0]
+
+
+def test_pickle_keeps_interning():
+    r = pickle.loads(pickle.dumps(make_recipe(category="".join(["Break", "fast"]))))
+
+    assert r == make_recipe()
+    assert r.category is make_recipe().category
@@ -1,5 +1,5 @@
 # tests/test_parser.py
-from mapper.parser import RecipeParser
+from mapper.parser import RecipeParser, RecipeParserError
 import pytest
 
 # region Testdata
@@ -254,3 +254,22 @@ def test_parse_recipe_with_tags():
     assert recipe.hints == ["- Hint 1", "- Hint 2"]
 
     assert recipe.tags == ["easy", "quick", "vegetarian"]
+
+
+@pytest.mark.parametrize("lines,line", [
+    # Wrong section header after the ingredients
+    (RECIPE_1.replace("## Schritte", "## Steps").splitlines(), 18),
+    # Invalid servings are reported on the line of the property
+    (RECIPE_1.replace("servings: 4", "servings: four").splitlines(), 8),
+    # Missing properties are reported on the opening '---'
+    (RECIPE_1.replace("category: Breakfast\n", "").splitlines(), 1),
+    # Unexpected EOF is reported on the last line
+    (RECIPE_1.splitlines()[:16], 16),
+])
+def test_parse_errors_report_line(lines, line):
+    with pytest.raises(RecipeParserError) as e:
+        RecipeParser(lines, "recipes/Pancakes.md").parse()
+
+    assert e.value.source == "recipes/Pancakes.md"
+    assert e.value.line == line
+    assert str(e.value).startswith(f"recipes/Pancakes.md:{line}: ")
@@ -0,0 +1,50 @@
+import os
+
+from mapper.pdfcache import PdfCache, compile_key, sources_digest
+
+
+def test_key_depends_on_data_and_stamp(tmp_path):
+    data = tmp_path / "Lunch.json"
+    data.write_text("[]", encoding="utf-8")
+    key = compile_key(data, "format=cards includeKeys=0 sources=a")
+
+    assert compile_key(data, "format=cards includeKeys=0 sources=a") == key
+    assert compile_key(data, "format=a5 includeKeys=0 sources=a") != key
+    assert compile_key(data, "format=cards includeKeys=0 sources=b") != key
+    data.write_text("[{}]", encoding="utf-8")
+    assert compile_key(data, "format=cards includeKeys=0 sources=a") != key
+
+def test_sources_digest_covers_templates(tmp_path):
+    (tmp_path / "template" / "components").mkdir(parents=True)
+    (tmp_path / "main.typ").write_text("main", encoding="utf-8")
+    part = tmp_path / "template" / "components" / "part.typ"
+    part.write_text("v1", encoding="utf-8")
+    digest = sources_digest(tmp_path)
+
+    part.write_text("v2", encoding="utf-8")
+    assert sources_digest(tmp_path) != digest
+    part.write_text("v1", encoding="utf-8")
+    assert sources_digest(tmp_path) == digest
+
+def test_fetch_and_store(tmp_path):
+    cache = PdfCache(tmp_path / "cache")
+    pdf = tmp_path / "Lunch.pdf"
+    pdf.write_bytes(b"pdf")
+
+    assert not cache.fetch("ab12", tmp_path / "out.pdf")
+    cache.store("ab12", pdf)
+    assert cache.fetch("ab12", tmp_path / "out.pdf")
+    assert (tmp_path / "out.pdf").read_bytes() == b"pdf"
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PdfCache(tmp_path / "cache", max_bytes=250)
+    pdf = tmp_path / "in.pdf"
+    pdf.write_bytes(b"x" * 100)
+    for i, key in enumerate(["aa", "bb", "cc"]):
+        cache.store(key, pdf)
+        os.utime(cache._object(key), ns=(i * 10**9, i * 10**9))
+    # Using the oldest one makes "bb" the least recently used
+    assert cache.fetch("aa", tmp_path / "out.pdf")
+
+    assert cache.evict() == 1
+    assert sorted(p.stem for _, _, p in cache.objects()) == ["aa", "cc"]
@@ -0,0 +1,84 @@
+import pytest
+from pathlib import Path
+from mapper.io import ScannedRecipe
+from mapper.pipeline import parse_recipes
+
+def recipe_lines(title, category="Lunch"):
+    return f"""---
+title: {title}
+tags:
+category: {category}
+grouping: Main
+prep_time: 5 min
+cook_time: 5 min
+servings: 1
+---
+# {title}
+
+## Zutaten
+- Water
+
+## Schritte
+1. Boil water.
+
+## Hinweise
+
+## Versionshistory
+- 2025-01-01: Erstellt""".splitlines()
+
+BROKEN = ["---", "title: Broken", "---"]
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_parse_keeps_scan_order(jobs):
+    scanned = [ScannedRecipe(Path(f"{t}.md"), recipe_lines(t)) for t in ["C", "A", "B", "D"]]
+
+    result = parse_recipes(scanned, jobs=jobs)
+
+    assert [p.name for p, _ in result.recipes] == ["C.md", "A.md", "B.md", "D.md"]
+    assert [r.title for _, r in result.recipes] == ["C", "A", "B", "D"]
+    assert result.errors == []
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_parse_collects_all_errors(jobs):
+    scanned = [
+        ScannedRecipe(Path("Bad1.md"), BROKEN),
+        ScannedRecipe(Path("Good.md"), recipe_lines("Good")),
+        ScannedRecipe(Path("Bad2.md"), BROKEN),
+    ]
+
+    result = parse_recipes(scanned, jobs=jobs)
+
+    assert [p.name for p, _ in result.errors] == ["Bad1.md", "Bad2.md"]
+    assert [r.title for _, r in result.recipes] == ["Good"]
+
+def test_synthetic_vault_parses_without_errors(tmp_path):
+    from benchmarks.vault import VaultSpec, generate_vault
+    from mapper.io import scan_recipes
+
+    generate_vault(tmp_path, VaultSpec(recipes=50, noise_files=5, link_density=0.5))
+    scanned = scan_recipes(tmp_path)
+    result = parse_recipes(scanned)
+
+    assert len(scanned) == 50
+    assert result.errors == []
+    assert len(set(r.category for _, r in result.recipes)) == 8
+
+def test_lazy_recipe_reads_only_the_header(tmp_path):
+    from mapper.io import MARKER, read_header_lines
+    from mapper.pipeline import scan_headers
+    path = tmp_path / "Soup.md"
+    path.write_text("\n".join([*recipe_lines("Soup"), MARKER]), encoding="utf-8")
+    (tmp_path / "Note.md").write_text("# Note", encoding="utf-8")
+
+    lines = read_header_lines(path, path.stat().st_size)
+    assert lines[-1] == "# Soup" and "## Zutaten" not in lines
+
+    headers, errors = scan_headers(tmp_path)
+    assert errors == [] and [p for p, _ in headers] == [path]
+    lazy = headers[0][1]
+    lazy.set_key("L", "M")
+    assert (lazy.title, lazy.category, lazy.key) == ("Soup", "Lunch", "L-M-S")
+    assert lazy._recipe is None
+
+    assert lazy.ingredients == ["- Water"]
+    assert lazy.load().key == "L-M-S" and lazy.servings == 1
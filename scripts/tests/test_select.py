@@ -0,0 +1,93 @@
+import json
+from datetime import date
+import pytest
+from mapper.cache import BuildManifest, MANIFEST_NAME
+from mapper.cli import convert
+from mapper.io import MARKER
+from mapper.keygen import KeyRegistry
+from mapper.models import RecipeHeader
+from mapper.select import RecipeFilter
+from mapper.stream import convert_streaming
+
+def header(**kwargs):
+    values = dict(title="Pancakes", tags=["Sweet"], category="Breakfast", grouping="Quick", last_modified="2025-03-01", key="Br-Qu-P")
+    values.update(kwargs)
+    return RecipeHeader(**values)
+
+@pytest.mark.parametrize("selection,selected", [
+    (RecipeFilter(), True),
+    (RecipeFilter(categories=["Lunch", "Breakfast"]), True),
+    (RecipeFilter(categories=["Lunch"]), False),
+    (RecipeFilter(groupings=["Quick"], tags=["sweet"]), True),
+    (RecipeFilter(groupings=["Quick"], tags=["savory"]), False),
+    (RecipeFilter(keys=["Br"]), True),
+    (RecipeFilter(keys=["Br-Qu-P"]), True),
+    (RecipeFilter(keys=["B"]), False),
+    (RecipeFilter(changed_since=date(2025, 3, 1)), True),
+    (RecipeFilter(changed_since=date(2025, 3, 2)), False),
+])
+def test_filter_matches(selection, selected):
+    assert selection.matches(header()) == selected
+
+def test_changed_since_skips_invalid_dates():
+    assert not RecipeFilter(changed_since=date(2000, 1, 1)).matches(header(last_modified=""))
+
+def write_recipe(folder, title, category, tags=(), ingredient="- Water"):
+    tag_lines = "".join(f"\n- {t}" for t in tags)
+    (folder / f"{title}.md").write_text(f"""---
+title: {title}
+tags:{tag_lines}
+category: {category}
+grouping: Main
+prep_time: 5 min
+cook_time: 5 min
+servings: 1
+---
+# {title}
+
+## Zutaten
+{ingredient}
+
+## Schritte
+1. Cook.
+
+## Hinweise
+
+{MARKER}""", encoding="utf-8")
+
+def test_selection_resolves_links_to_unselected_recipes(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault, "Soup", "Lunch", ["quick"], "- [[Bread]]")
+    write_recipe(vault, "Salad", "Lunch")
+    write_recipe(vault, "Bread", "Dinner")
+
+    full = KeyRegistry(tmp_path / "keys.json")
+    convert(vault, tmp_path / "full", registry=full)
+    bread_key = json.loads((tmp_path / "full" / "Dinner.json").read_text(encoding="utf-8"))[0]["key"]
+
+    registry = KeyRegistry.load(tmp_path / "keys.json")
+    convert(vault, tmp_path / "selection", registry=registry, selection=RecipeFilter(tags=["quick"]))
+
+    assert sorted(p.name for p in (tmp_path / "selection").glob("*.json")) == ["Lunch.json"]
+    recipes = json.loads((tmp_path / "selection" / "Lunch.json").read_text(encoding="utf-8"))
+    assert [r["title"] for r in recipes] == ["Soup"]
+    assert recipes[0]["ingredients"] == [{"item": "-", "text": f"Bread (ref. {bread_key})"}]
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_selection_keeps_unselected_categories(tmp_path, streaming):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault, "Soup", "Lunch", ["quick"])
+    write_recipe(vault, "Bread", "Dinner")
+    out = tmp_path / "out"
+    build = convert_streaming if streaming else convert
+    build(vault, out, BuildManifest.load(out / MANIFEST_NAME))
+
+    build(vault, out, BuildManifest.load(out / MANIFEST_NAME), selection=RecipeFilter(tags=["quick"]))
+    assert sorted(p.name for p in out.glob("[!.]*.json")) == ["Dinner.json", "Lunch.json"]
+
+    # A later full build still knows the unselected category, so it leaves the file alone
+    dinner = (out / "Dinner.json").stat().st_mtime_ns
+    build(vault, out, BuildManifest.load(out / MANIFEST_NAME))
+    assert (out / "Dinner.json").stat().st_mtime_ns == dinner
@@ -0,0 +1,52 @@
+import pytest
+from mapper.cache import BuildManifest
+from mapper.cli import convert
+from mapper.io import MARKER
+from mapper.parser import RecipeParserError
+from mapper.select import RecipeFilter
+from mapper.stream import convert_streaming
+
+
+@pytest.fixture
+def vault(tmp_path):
+    from benchmarks.vault import VaultSpec, generate_vault
+    path = tmp_path / "vault"
+    generate_vault(path, VaultSpec(recipes=60, categories=3, link_density=0.5, noise_files=5))
+    return path
+
+def files(path):
+    return dict((f.name, f.read_bytes()) for f in path.iterdir() if not f.name.startswith("."))
+
+@pytest.mark.parametrize("fmt,jobs", [("json", 1), ("cbor", 2)])
+def test_streaming_writes_the_same_files(tmp_path, vault, fmt, jobs):
+    convert(vault, tmp_path / "full", fmt=fmt)
+    convert_streaming(vault, tmp_path / "stream", jobs=jobs, fmt=fmt)
+
+    assert files(tmp_path / "stream") == files(tmp_path / "full")
+    assert len(files(tmp_path / "stream")) == 3
+
+def test_streaming_selection_and_stale_categories(tmp_path, vault):
+    out = tmp_path / "out"
+    manifest = BuildManifest.load(out / ".manifest.json")
+    assert len(convert_streaming(vault, out, manifest)) == 3
+    # Nothing changed, so no file is written again
+    assert convert_streaming(vault, out, BuildManifest.load(out / ".manifest.json")) == []
+
+    # A selection leaves the other categories alone
+    category = sorted(files(out))[0].removesuffix(".json")
+    changed = convert_streaming(vault, out, BuildManifest.load(out / ".manifest.json"), selection=RecipeFilter(categories=[category]))
+    assert len(files(out)) == 3
+    assert changed == []
+
+    # Only a full build removes the file of a category without recipes. Links into it change the other ones
+    for p in vault.rglob("*.md"):
+        if f"category: {category}\n" in p.read_text(encoding="utf-8"):
+            p.unlink()
+    assert category in convert_streaming(vault, out, BuildManifest.load(out / ".manifest.json"))
+    assert len(files(out)) == 2
+
+def test_streaming_reports_parse_errors(tmp_path, vault):
+    (vault / "Broken.md").write_text(f"---\ntags:\n---\n# Broken\n{MARKER}", encoding="utf-8")
+
+    with pytest.raises(RecipeParserError):
+        convert_streaming(vault, tmp_path / "out")
@@ -0,0 +1,60 @@
+import json
+import time
+from pathlib import Path
+from mapper.io import ScannedRecipe
+from mapper.pipeline import parse_recipes
+from mapper.timing import Timings
+
+RECIPE = """---
+title: {title}
+tags:
+category: Lunch
+grouping: Main
+prep_time: 5 min
+cook_time: 5 min
+servings: 1
+---
+# {title}
+
+## Zutaten
+- Water
+
+## Schritte
+1. Boil water.
+
+## Hinweise
+"""
+
+def test_stage_records_wall_time_and_counters():
+    timings = Timings()
+    with timings.stage("scan") as stage:
+        stage.files, stage.bytes = 3, 120
+        time.sleep(0.01)
+
+    [scan] = timings.stages
+    assert (scan.name, scan.files, scan.bytes) == ("scan", 3, 120)
+    assert scan.wall >= 0.01
+    assert scan.cpu >= 0
+
+def test_parse_records_every_file():
+    timings = Timings()
+    scanned = [ScannedRecipe(Path(f"{t}.md"), RECIPE.format(title=t).splitlines()) for t in ["A", "B"]]
+    parse_recipes(scanned, timings=timings)
+
+    assert sorted(f.name for f in timings.files) == ["A.md", "B.md"]
+    assert all(f.stage == "parse" and f.seconds >= 0 for f in timings.files)
+
+def test_chrome_trace_puts_overlapping_files_on_separate_rows(tmp_path):
+    timings = Timings()
+    with timings.stage("parse"):
+        pass
+    origin = timings.origin
+    timings.file("parse", "a", origin + 0.0, 0.2)
+    timings.file("parse", "b", origin + 0.1, 0.2)
+    timings.file("parse", "c", origin + 0.3, 0.1)
+    timings.write(tmp_path / "trace.json", "chrome")
+
+    events = json.loads((tmp_path / "trace.json").read_text(encoding="utf-8"))["traceEvents"]
+    rows = dict((e["name"], e["tid"]) for e in events)
+    assert rows == {"parse": 0, "a": 1, "b": 2, "c": 1}
+    assert events[1]["dur"] == 0.2 * 1e6
@@ -0,0 +1,138 @@
+import threading
+from argparse import Namespace
+from pathlib import Path
+from types import SimpleNamespace
+from mapper.cache import BuildManifest
+from mapper.watch import ChangeCollector, PollingWatcher, rebuild
+from mapper.io import MARKER
+
+def write_recipe(path, title, category):
+    path.write_text(f"""---
+title: {title}
+tags:
+category: {category}
+grouping: Main
+prep_time: 5 min
+cook_time: 5 min
+servings: 1
+---
+# {title}
+
+## Zutaten
+- Water
+
+## Schritte
+1. Boil water.
+
+## Hinweise
+
+{MARKER}""", encoding="utf-8")
+
+def test_polling_watcher_detects_changes(tmp_path):
+    write_recipe(tmp_path / "Soup.md", "Soup", "Lunch")
+    watcher = PollingWatcher(tmp_path, interval=0.01)
+
+    changed = []
+    thread = threading.Thread(target=lambda: changed.append(watcher.wait()))
+    thread.start()
+    write_recipe(tmp_path / "Cake.md", "Cake", "Dessert")
+    thread.join(timeout=5)
+
+    assert changed == [{tmp_path / "Cake.md"}]
+
+def event(event_type, src_path, dest_path="", is_directory=False):
+    # Stands in for a watchdog event
+    return SimpleNamespace(event_type=event_type, src_path=src_path, dest_path=dest_path, is_directory=is_directory)
+
+def test_change_collector_keeps_paths_of_changes_only():
+    collector = ChangeCollector()
+    collector.add(event("opened", "/vault/Soup.md"))
+    collector.add(event("closed", "/vault/Soup.md"))
+    collector.add(event("modified", "/vault/notes.txt"))
+    collector.add(event("modified", "/vault", is_directory=True))
+    assert not collector.changed.is_set()
+
+    collector.add(event("modified", "/vault/Soup.md"))
+    collector.add(event("moved", "/vault/Cake.md", "/vault/Desserts/Cake.md"))
+    collector.add(event("deleted", b"/vault/Old.md"))
+
+    assert collector.changed.is_set()
+    assert collector.take() == {Path("/vault/Soup.md"), Path("/vault/Cake.md"), Path("/vault/Desserts/Cake.md"), Path("/vault/Old.md")}
+    assert collector.take() == set()
+
+def test_change_collector_rescans_after_folder_changes():
+    collector = ChangeCollector()
+    collector.add(event("modified", "/vault/Soup.md"))
+    collector.add(event("moved", "/vault/Old", "/vault/New", is_directory=True))
+    collector.add(event("modified", "/vault/Cake.md"))
+
+    assert collector.take() is None
+    assert collector.take() == set()
+
+def test_rebuild_only_writes_changed_categories(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault / "Soup.md", "Soup", "Lunch")
+    write_recipe(vault / "Cake.md", "Cake", "Dessert")
+    args = Namespace(input=vault, output=tmp_path / "json", pdf=None, jobs=1, export_format="json")
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    rebuild(args, manifest, None)
+    dessert_mtime = (args.output / "Dessert.json").stat().st_mtime_ns
+
+    write_recipe(vault / "Soup.md", "Soups", "Lunch")
+    rebuild(args, manifest, None)
+
+    assert "Soups" in (args.output / "Lunch.json").read_text(encoding="utf-8")
+    assert (args.output / "Dessert.json").stat().st_mtime_ns == dessert_mtime
+
+def test_rebuild_only_reads_changed_files(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault / "Soup.md", "Soup", "Lunch")
+    write_recipe(vault / "Cake.md", "Cake", "Dessert")
+    args = Namespace(input=vault, output=tmp_path / "json", pdf=None, jobs=1, export_format="json")
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    rebuild(args, manifest, None)
+
+    # Only the files the watcher reported are read, Cake.md is taken from the manifest
+    write_recipe(vault / "Soup.md", "Soups", "Lunch")
+    write_recipe(vault / "Cake.md", "Cakes", "Dessert")
+    rebuild(args, manifest, None, changed_files={vault / "Soup.md"})
+
+    assert "Soups" in (args.output / "Lunch.json").read_text(encoding="utf-8")
+    assert "Cakes" not in (args.output / "Dessert.json").read_text(encoding="utf-8")
+
+def test_rebuild_relinks_dependents_of_renamed_recipe(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault / "Soup.md", "Soup", "Lunch")
+    write_recipe(vault / "Cake.md", "Cake", "Dessert")
+    (vault / "Cake.md").write_text((vault / "Cake.md").read_text(encoding="utf-8").replace("- Water", "- [[Soup]]"), encoding="utf-8")
+    args = Namespace(input=vault, output=tmp_path / "json", pdf=None, jobs=1, export_format="json")
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    rebuild(args, manifest, None)
+    assert manifest.links == {"Soup": ["Cake"]}
+
+    write_recipe(vault / "Soup.md", "Hot Soup", "Lunch")
+    rebuild(args, manifest, None)
+
+    assert '"text": "Hot Soup (ref. L-M-H)"' in (args.output / "Dessert.json").read_text(encoding="utf-8")
+
+def test_rebuild_compiles_like_build_py(tmp_path):
+    from mapper.build import OPTIONS_FILE
+    from mapper.pdfcache import PdfCache
+    from tests.test_build import FAKE_TYPST
+    typst = tmp_path / "typst"
+    typst.write_text(FAKE_TYPST, encoding="utf-8")
+    typst.chmod(0o755)
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    write_recipe(vault / "Soup.md", "Soup", "Lunch")
+    args = Namespace(input=vault, output=tmp_path / "json", pdf=tmp_path / "pdf", jobs=1, export_format="json",
+                     format="cards", include_keys=False, typst=str(typst))
+    cache = PdfCache(tmp_path / "cache")
+    rebuild(args, BuildManifest(tmp_path / "manifest.json"), cache)
+
+    assert (args.pdf / "Lunch.pdf").exists()
+    assert "sources=" in (args.pdf / OPTIONS_FILE).read_text(encoding="utf-8")
+    assert len(list((tmp_path / "cache").glob("*/*.pdf"))) == 1
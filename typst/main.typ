@@ -1,25 +1,57 @@
-#{
-let recipes = json(sys.inputs.at("jsonPath", default:"recipes.json"))
-  .map(r => {
-    r.ingredients = r.ingredients.map(i => eval(i, mode: "markup"))
-    r.steps = r.steps.map(i => eval(i, mode: "markup"))
-    r.hints = r.hints.map(i => eval(i, mode: "markup"))
-    return r
-  });
-
-  let format = sys.inputs.at("format", default: "cards")
-  let includeKeys = false
-  if(sys.inputs.at("includeKeys", default: "0") == "1") {
-    includeKeys = true
+// The mapper exports list and enum items of plain text as (item: "-" or "+", text: ...), which need no eval.
+// Only the remaining strings contain markup
+#let toContent(entry) = {
+  if type(entry) == str {
+    eval(entry, mode: "markup")
+  } else if entry.item == "+" {
+    enum.item(entry.text)
+  } else {
+    list.item(entry.text)
   }
+}
+
+#let loadRecipes(dataPath) = {
+  let data = if dataPath.ends-with(".cbor") { cbor(dataPath) } else { json(dataPath) }
+  data.map(r => {
+    r.ingredients = r.ingredients.map(toContent)
+    r.steps = r.steps.map(toContent)
+    r.hints = r.hints.map(toContent)
+    return r
+  })
+}
 
+// start is placed after the page setup of the template, so it ends up on the first page of the recipes
+#let printRecipes(recipes, format, includeKeys, start: none) = {
   if(format == "a5") {
     import "template/a5.typ": printA5
-    printA5(recipes: recipes, allowMultiplePagesPerRecipe: false, includeKeys: includeKeys)
+    printA5(recipes: recipes, allowMultiplePagesPerRecipe: false, includeKeys: includeKeys, start: start)
   }else if(format == "cards") {
     import "template/cards.typ": printCards
-    printCards(recipes: recipes)
+    printCards(recipes: recipes, start: start)
   }else {
+    start
   }
 }
 
+#{
+  let format = sys.inputs.at("format", default: "cards")
+  let includeKeys = false
+  if(sys.inputs.at("includeKeys", default: "0") == "1") {
+    includeKeys = true
+  }
+
+  // Batch mode: all categories of the index in one document. Every category starts on a new page,
+  // whose number is stored in a <batch-page> metadata element for typst query to split the PDF afterwards.
+  // The element is placed by the template, after a set page rule that may start another page
+  let batchPath = sys.inputs.at("batchPath", default: none)
+  if(batchPath != none) {
+    for entry in json(batchPath) {
+      pagebreak(weak: true)
+      let start = context [#metadata((category: entry.category, page: here().page())) <batch-page>]
+      printRecipes(loadRecipes(entry.path), format, includeKeys, start: start)
+    }
+  } else {
+    let dataPath = sys.inputs.at("jsonPath", default:"recipes.json")
+    printRecipes(loadRecipes(dataPath), format, includeKeys)
+  }
+}
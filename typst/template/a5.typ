@@ -6,7 +6,7 @@
   return val;
 }
 
-#let printA5(recipes: array, allowMultiplePagesPerRecipe: false, includeKeys: false) = {
+#let printA5(recipes: array, allowMultiplePagesPerRecipe: false, includeKeys: false, start: none) = {
 
   import "components/recipe-sheet.typ": recipeSheet
   set page(
@@ -19,6 +19,8 @@
       margin: (y: 1cm, outside: 1cm, inside: 1.5cm)
     )
   }
+  // Marks the first page of the recipes in batch mode
+  start
 
   let i = 0
   for recipe in recipes {
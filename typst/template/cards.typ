@@ -1,4 +1,4 @@
-#let printCards(recipes: array) = {
+#let printCards(recipes: array, start: none) = {
 
   import "@preview/quick-cards:0.1.0": *
   import "components/quick-cards/card-templates.typ": recipe-card-template
@@ -11,6 +11,8 @@
     parse-body: true                  // enable Auto mode
 
   )
+  // Marks the first page of the cards in batch mode
+  start
 
   for recipe in recipes {
     recipe-card(